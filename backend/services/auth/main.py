@@ -4,15 +4,24 @@
 支援 US-001: 會員註冊與登入
 """
 
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import FastAPI, Depends, File, HTTPException, Request, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 import os
+import uuid
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from jose import jwk, jwt
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from backend.shared.auth import passwords
+from backend.shared.auth.dependencies import create_token_dependency
+from backend.shared.auth.revocation import RevocationFilter
+from backend.shared.auth.verifier import build_token_verifier
+from backend.services.auth.roster_import import BulkRegisterResponse, import_roster
+from backend.shared.database.redis_client import redis_manager
+from backend.shared.utils.process_pool import BoundedProcessPool, PoolSaturatedError
 
 # 應用設定
 app = FastAPI(
@@ -35,11 +44,44 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-here")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_HOURS = int(os.getenv("JWT_EXPIRATION_HOURS", "24"))
 
-# 密碼加密
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 非對稱簽章（選用）：設定私鑰檔與 kid 後改以私鑰簽發，其他服務以公鑰驗證
+SIGNING_KEY_FILE = os.getenv("JWT_SIGNING_KEY_FILE")
+SIGNING_KEY_ID = os.getenv("JWT_SIGNING_KEY_ID")
+SIGNING_KEY = SECRET_KEY
+if SIGNING_KEY_FILE and SIGNING_KEY_ID:
+    with open(SIGNING_KEY_FILE, encoding="utf-8") as f:
+        SIGNING_KEY = f.read()
+
+# 密碼雜湊程序池設定
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+# 密碼加密（bcrypt 在獨立程序執行，避免阻塞事件迴圈）
+password_pool = BoundedProcessPool(
+    name="password_hash",
+    max_workers=PASSWORD_HASH_WORKERS,
+    max_queue=PASSWORD_HASH_MAX_QUEUE,
+)
+
+# 模擬用戶（密碼雜湊於啟動時建立）
+TEST_USER_EMAIL = "test@example.com"
+TEST_USER_PASSWORD_HASH: Optional[str] = None
 
-# Bearer Token 認證
-security = HTTPBearer()
+# Token 撤銷清單（Redis + 本地 Bloom filter）
+revocation_filter = RevocationFilter(redis_client_getter=lambda: redis_manager.client)
+
+# Bearer Token 認證（含已驗證 Token 快取）
+token_verifier = build_token_verifier(
+    redis_client_getter=lambda: redis_manager.client,
+    is_revoked=revocation_filter.is_revoked,
+)
+if SIGNING_KEY_FILE and SIGNING_KEY_ID:
+    token_verifier.keyring.add_key(
+        SIGNING_KEY_ID,
+        ALGORITHM,
+        jwk.construct(SIGNING_KEY, ALGORITHM).public_key().to_pem().decode("utf-8"),
+    )
+verify_token = create_token_dependency(token_verifier)
 
 
 # Pydantic 模型
@@ -72,15 +114,47 @@ class UserResponse(BaseModel):
     created_at: str
 
 
+# 生命週期事件
+@app.on_event("startup")
+async def startup():
+    """啟動密碼雜湊程序池與撤銷清單同步"""
+    global TEST_USER_PASSWORD_HASH
+    try:
+        redis_manager.connect()
+    except Exception:
+        pass  # 無 Redis 時撤銷清單僅在本程序生效
+    revocation_filter.start()
+    password_pool.start()
+    TEST_USER_PASSWORD_HASH = await get_password_hash("password")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """關閉密碼雜湊程序池與撤銷清單同步"""
+    password_pool.shutdown()
+    revocation_filter.stop()
+    redis_manager.disconnect()
+
+
+@app.exception_handler(PoolSaturatedError)
+async def pool_saturated_handler(request: Request, exc: PoolSaturatedError):
+    """程序池佇列已滿時返回 503"""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server is busy, please retry later"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 # 工具函數
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """驗證密碼"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return await password_pool.submit(passwords.verify_password, plain_password, hashed_password)
 
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """密碼加密"""
-    return pwd_context.hash(password)
+    return await password_pool.submit(passwords.hash_password, password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -91,31 +165,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
     
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
+    headers = {"kid": SIGNING_KEY_ID} if SIGNING_KEY_FILE and SIGNING_KEY_ID else None
+    encoded_jwt = jwt.encode(to_encode, SIGNING_KEY, algorithm=ALGORITHM, headers=headers)
     return encoded_jwt
 
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """驗證 JWT Token"""
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return payload
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-
 # API 端點
 @app.post("/auth/register", response_model=UserResponse)
 async def register(user_data: UserRegister):
@@ -139,7 +194,7 @@ async def register(user_data: UserRegister):
         )
     
     # 密碼加密
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash(user_data.password)
     
     # 這裡應該連接資料庫儲存用戶
     # 暫時返回模擬資料
@@ -155,6 +210,36 @@ async def register(user_data: UserRegister):
     return user_response
 
 
+@app.post("/auth/bulk-register", response_model=BulkRegisterResponse)
+async def bulk_register(
+    file: UploadFile = File(...),
+    token_data: dict = Depends(verify_token)
+):
+    """
+    批次註冊班級名冊（老師專用）
+    支援 CSV（首列為欄位名稱）與 JSONL，欄位同 /auth/register，role 預設為 student；
+    雜湊程序池忙碌時該批列標記為 retryable，其餘列照常寫入
+    """
+    if token_data.get("role") not in ("teacher", "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only teachers can import rosters"
+        )
+    
+    filename = (file.filename or "").lower()
+    if filename.endswith((".jsonl", ".ndjson")) or file.content_type in ("application/x-ndjson", "application/jsonl"):
+        fmt = "jsonl"
+    elif filename.endswith(".csv") or file.content_type in ("text/csv", "application/vnd.ms-excel"):
+        fmt = "csv"
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Roster must be a CSV or JSONL file"
+        )
+    
+    return await import_roster(file, fmt, password_pool)
+
+
 @app.post("/auth/login", response_model=Token)
 async def login(user_credentials: UserLogin):
     """
@@ -163,7 +248,10 @@ async def login(user_credentials: UserLogin):
     """
     # 這裡應該從資料庫驗證用戶
     # 暫時使用模擬邏輯
-    if user_credentials.email == "test@example.com" and user_credentials.password == "password":
+    if (
+        user_credentials.email == TEST_USER_EMAIL
+        and await verify_password(user_credentials.password, TEST_USER_PASSWORD_HASH)
+    ):
         # 建立 JWT Token
         access_token_expires = timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
         access_token = create_access_token(
@@ -194,6 +282,7 @@ async def login(user_credentials: UserLogin):
 async def refresh_token(token_data: dict = Depends(verify_token)):
     """
     刷新 JWT Token
+    舊 Token 在新 Token 簽發後即撤銷
     """
     # 建立新的 Token
     access_token_expires = timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
@@ -202,12 +291,27 @@ async def refresh_token(token_data: dict = Depends(verify_token)):
         expires_delta=access_token_expires
     )
     
+    if token_data.get("jti"):
+        revocation_filter.revoke(token_data["jti"], token_data.get("exp"))
+    
     return {
         "access_token": new_token,
         "expires_in": ACCESS_TOKEN_EXPIRE_HOURS * 3600
     }
 
 
+@app.post("/auth/logout", response_model=dict)
+async def logout(token_data: dict = Depends(verify_token)):
+    """
+    登出
+    撤銷目前的 Token
+    """
+    if token_data.get("jti"):
+        revocation_filter.revoke(token_data["jti"], token_data.get("exp"))
+    
+    return {"message": "Logged out"}
+
+
 @app.get("/auth/profile", response_model=dict)
 async def get_profile(token_data: dict = Depends(verify_token)):
     """
@@ -225,10 +329,22 @@ async def get_profile(token_data: dict = Depends(verify_token)):
     }
 
 
+@app.get("/auth/metrics")
+async def metrics():
+    """Prometheus 監控指標"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/auth/health")
 async def health_check():
     """健康檢查端點"""
-    return {"status": "healthy", "service": "auth", "timestamp": datetime.utcnow().isoformat()}
+    return {
+        "status": "healthy",
+        "service": "auth",
+        "timestamp": datetime.utcnow().isoformat(),
+        "token_cache": token_verifier.cache.stats(),
+        "revocation": revocation_filter.stats()
+    }
 
 
 if __name__ == "__main__":
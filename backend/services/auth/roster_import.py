@@ -0,0 +1,276 @@
+"""
+班級名冊批次匯入
+串流解析 CSV / JSONL 名冊，平行雜湊密碼，並以多列 INSERT 分批寫入 users 表
+"""
+
+import asyncio
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from fastapi import UploadFile
+from pydantic import BaseModel, EmailStr, ValidationError
+from sqlalchemy import or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from starlette.concurrency import run_in_threadpool
+
+from backend.shared.auth import passwords
+from backend.shared.database.postgresql import SessionLocal
+from backend.shared.models.user import User, UserRole
+from backend.shared.utils.process_pool import BoundedProcessPool, PoolSaturatedError
+
+READ_CHUNK_SIZE = 64 * 1024
+INSERT_BATCH_SIZE = 500
+HASH_CHUNK_SIZE = 8
+
+
+class RosterEntry(BaseModel):
+    """名冊中的一位用戶"""
+    username: str
+    email: EmailStr
+    password: str
+    role: str = "student"
+    grade: Optional[int] = None
+
+
+class BulkRegisterRowResult(BaseModel):
+    row: int
+    email: Optional[str] = None
+    status: str  # created, duplicate, invalid, error, retryable（程序池忙碌，未寫入，可重送）
+    user_id: Optional[str] = None
+    detail: Optional[str] = None
+
+
+class BulkRegisterResponse(BaseModel):
+    total: int
+    created: int
+    failed: int
+    results: List[BulkRegisterRowResult]
+
+
+async def _iter_lines(file: UploadFile) -> AsyncIterator[str]:
+    """逐行讀取上傳檔案，不一次載入整個檔案"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    while True:
+        chunk = await file.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def iter_roster_rows(file: UploadFile, fmt: str) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """解析名冊，產生 (列號, 資料, 錯誤訊息)"""
+    header: Optional[List[str]] = None
+    row_number = 0
+
+    async for line in _iter_lines(file):
+        if not line.strip():
+            continue
+
+        if fmt == "csv" and header is None:
+            header = [name.strip() for name in next(csv.reader([line]))]
+            continue
+
+        row_number += 1
+        try:
+            if fmt == "jsonl":
+                data = json.loads(line)
+                if not isinstance(data, dict):
+                    raise ValueError("Each line must be a JSON object")
+            else:
+                values = next(csv.reader([line]))
+                data = {key: value.strip() for key, value in zip(header, values) if value.strip()}
+            yield row_number, data, None
+        except (ValueError, StopIteration) as e:
+            yield row_number, None, f"Malformed row: {e}"
+
+
+def _validate(data: dict) -> Tuple[Optional[RosterEntry], Optional[str]]:
+    """驗證名冊資料（規則同 /auth/register）"""
+    try:
+        entry = RosterEntry.model_validate(data)
+    except ValidationError as e:
+        return None, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+    if entry.role not in ("student", "parent", "teacher"):
+        return None, "Invalid role. Must be one of: student, parent, teacher"
+    if entry.role == "student" and not entry.grade:
+        return None, "Grade is required for student role"
+    return entry, None
+
+
+def _find_existing(entries: List[RosterEntry]) -> Tuple[Set[str], Set[str]]:
+    """查詢資料庫中已存在的 email / username"""
+    emails = [entry.email for entry in entries]
+    usernames = [entry.username for entry in entries]
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(User.email, User.username).where(
+                or_(User.email.in_(emails), User.username.in_(usernames))
+            )
+        ).all()
+    return {row.email for row in rows}, {row.username for row in rows}
+
+
+def _insert_users(rows: List[dict]) -> Dict[str, str]:
+    """多列 INSERT，衝突列略過；返回 email -> user_id"""
+    stmt = (
+        pg_insert(User)
+        .values(rows)
+        .on_conflict_do_nothing()
+        .returning(User.id, User.email)
+    )
+    with SessionLocal() as db:
+        inserted = {row.email: str(row.id) for row in db.execute(stmt)}
+        db.commit()
+    return inserted
+
+
+async def _hash_all(pool: BoundedProcessPool, plain_passwords: List[str]) -> List[Optional[str]]:
+    """分塊送入雜湊程序池；同時最多佔用 max_workers 個名額，保留佇列給一般登入
+
+    程序池已滿時該塊返回 None，不影響其他塊。
+    """
+    semaphore = asyncio.Semaphore(pool.max_workers)
+
+    async def hash_chunk(chunk: List[str]) -> List[Optional[str]]:
+        async with semaphore:
+            try:
+                return await pool.submit(passwords.hash_passwords, chunk)
+            except PoolSaturatedError:
+                return [None] * len(chunk)
+
+    chunks = [
+        plain_passwords[i:i + HASH_CHUNK_SIZE]
+        for i in range(0, len(plain_passwords), HASH_CHUNK_SIZE)
+    ]
+    hashed_chunks = await asyncio.gather(*(hash_chunk(chunk) for chunk in chunks))
+    return [hashed for chunk in hashed_chunks for hashed in chunk]
+
+
+async def _process_batch(
+    pool: BoundedProcessPool,
+    batch: List[Tuple[int, RosterEntry]],
+    results: List[BulkRegisterRowResult],
+):
+    """處理一批名冊：排除已存在用戶、雜湊密碼、寫入資料庫"""
+    entries = [entry for _, entry in batch]
+    existing_emails, existing_usernames = await run_in_threadpool(_find_existing, entries)
+
+    pending: List[Tuple[int, RosterEntry]] = []
+    for row_number, entry in batch:
+        if entry.email in existing_emails or entry.username in existing_usernames:
+            results.append(BulkRegisterRowResult(
+                row=row_number, email=entry.email, status="duplicate",
+                detail="Email or username already registered"
+            ))
+        else:
+            pending.append((row_number, entry))
+
+    if not pending:
+        return
+
+    hashed = await _hash_all(pool, [entry.password for _, entry in pending])
+    hashed_pending = []
+    for (row_number, entry), password_hash in zip(pending, hashed):
+        if password_hash is None:
+            results.append(BulkRegisterRowResult(
+                row=row_number, email=entry.email, status="retryable",
+                detail="Password hashing is busy; account not created, resubmit this row"
+            ))
+        else:
+            hashed_pending.append((row_number, entry, password_hash))
+    pending = [(row_number, entry) for row_number, entry, _ in hashed_pending]
+    if not pending:
+        return
+
+    rows = [
+        {
+            "username": entry.username,
+            "email": entry.email,
+            "password_hash": password_hash,
+            "role": UserRole(entry.role),
+            "grade": entry.grade,
+        }
+        for _, entry, password_hash in hashed_pending
+    ]
+
+    try:
+        inserted = await run_in_threadpool(_insert_users, rows)
+    except Exception as e:
+        for row_number, entry in pending:
+            results.append(BulkRegisterRowResult(
+                row=row_number, email=entry.email, status="error", detail=str(e)
+            ))
+        return
+
+    for row_number, entry in pending:
+        user_id = inserted.get(entry.email)
+        if user_id:
+            results.append(BulkRegisterRowResult(
+                row=row_number, email=entry.email, status="created", user_id=user_id
+            ))
+        else:
+            # 與其他請求同時寫入而衝突
+            results.append(BulkRegisterRowResult(
+                row=row_number, email=entry.email, status="duplicate",
+                detail="Email or username already registered"
+            ))
+
+
+async def import_roster(file: UploadFile, fmt: str, pool: BoundedProcessPool) -> BulkRegisterResponse:
+    """匯入名冊並返回逐列結果"""
+    results: List[BulkRegisterRowResult] = []
+    batch: List[Tuple[int, RosterEntry]] = []
+    seen_emails: Set[str] = set()
+    seen_usernames: Set[str] = set()
+    total = 0
+
+    async for row_number, data, error in iter_roster_rows(file, fmt):
+        total += 1
+        entry = None
+        if error is None:
+            entry, error = _validate(data)
+        if entry is None:
+            # 無效列的 email 可能不是字串（JSON 數字、陣列等），此時不回傳
+            email = data.get("email") if isinstance(data, dict) else None
+            results.append(BulkRegisterRowResult(
+                row=row_number, email=email if isinstance(email, str) else None,
+                status="invalid", detail=error
+            ))
+            continue
+
+        # 同一份名冊內重複的資料只保留第一筆
+        if entry.email in seen_emails or entry.username in seen_usernames:
+            results.append(BulkRegisterRowResult(
+                row=row_number, email=entry.email, status="duplicate",
+                detail="Duplicate email or username in roster"
+            ))
+            continue
+        seen_emails.add(entry.email)
+        seen_usernames.add(entry.username)
+
+        batch.append((row_number, entry))
+        if len(batch) >= INSERT_BATCH_SIZE:
+            await _process_batch(pool, batch, results)
+            batch = []
+
+    if batch:
+        await _process_batch(pool, batch, results)
+
+    results.sort(key=lambda result: result.row)
+    created = sum(1 for result in results if result.status == "created")
+    return BulkRegisterResponse(
+        total=total,
+        created=created,
+        failed=total - created,
+        results=results,
+    )
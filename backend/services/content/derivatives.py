@@ -0,0 +1,97 @@
+"""
+圖片衍生檔（縮圖 / WebP）
+依預設寬度在程序池中產生 WebP，磁碟快取鍵為「內容雜湊 + 版本名稱」；
+首次請求時才產生，同一衍生檔的並行請求只會觸發一次編碼
+"""
+
+import asyncio
+import os
+import uuid
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from backend.shared.utils.process_pool import BoundedProcessPool
+
+# 版本名稱 -> (最大寬度, WebP 品質)
+VARIANT_PRESETS: Dict[str, Tuple[int, int]] = {
+    "thumb": (160, 70),
+    "w320": (320, 80),
+    "w640": (640, 80),
+    "w1280": (1280, 82),
+}
+
+# 上傳後預先產生的版本
+EAGER_VARIANTS = ("thumb", "w640")
+
+IMAGE_CONTENT_TYPES = {"image/jpeg", "image/png", "image/gif"}
+
+
+def render_variant(source_path: str, dest_path: str, width: int, quality: int) -> int:
+    """產生等比例縮小的 WebP（於子程序執行），返回輸出大小"""
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+
+        # 先寫暫存檔再改名，避免讀到寫一半的檔案
+        temp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            image.save(temp_path, "WEBP", quality=quality, method=4)
+            os.replace(temp_path, dest_path)
+        except BaseException:
+            # 寫入失敗時不留下暫存檔
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+    return os.path.getsize(dest_path)
+
+
+class DerivativeService:
+    """衍生檔產生與快取"""
+
+    def __init__(self, root: str, pool: BoundedProcessPool):
+        self.root = root
+        self.pool = pool
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    def path_for(self, sha256: str, variant: str) -> str:
+        return os.path.join(self.root, "derivatives", sha256[:2], sha256, f"{variant}.webp")
+
+    async def _render(self, source_path: str, dest_path: str, variant: str) -> str:
+        width, quality = VARIANT_PRESETS[variant]
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        await self.pool.submit(render_variant, source_path, dest_path, width, quality)
+        return dest_path
+
+    async def ensure(self, source_path: str, sha256: str, variant: str) -> str:
+        """取得衍生檔路徑，不存在時產生（single-flight）"""
+        dest_path = self.path_for(sha256, variant)
+        if os.path.exists(dest_path):
+            return dest_path
+
+        key = (sha256, variant)
+        task = self._inflight.get(key)
+        if task is None:
+            # 編碼以獨立 task 執行，第一個請求中斷不會影響其他等待者
+            task = asyncio.ensure_future(self._render(source_path, dest_path, variant))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        return await asyncio.shield(task)
+
+    async def pregenerate(self, source_path: str, sha256: str, content_type: Optional[str]):
+        """上傳後於背景產生常用版本（失敗不影響上傳結果）"""
+        if content_type not in IMAGE_CONTENT_TYPES:
+            return
+        for variant in EAGER_VARIANTS:
+            try:
+                await self.ensure(source_path, sha256, variant)
+            except Exception as e:
+                print(f"衍生檔產生失敗 {sha256}/{variant}: {e}")
@@ -0,0 +1,78 @@
+"""
+題庫匯出
+以 question_id keyset 分批讀取 questions 集合（可依 updated_at 增量匯出），串流輸出 NDJSON；
+下次匯出的浮水印取本次範圍內最大的 updated_at 減去安全重疊，相鄰兩次匯出可能重複同一題
+
+命令列：python -m backend.services.content.exports -o questions.ndjson.gz --since 2024-01-01T00:00:00
+"""
+
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from backend.shared.utils.ndjson import export_watermark, parse_since, write_ndjson
+
+from .pagination import find_keyset_page
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def _since_query(since: Optional[datetime]) -> dict:
+    return {"updated_at": {"$gte": since}} if since else {}
+
+
+async def question_export_watermark(collection, since: Optional[datetime] = None) -> Optional[datetime]:
+    """本次匯出範圍內最新的 updated_at 減去安全重疊（匯出開始前計算）"""
+    latest = await collection.find_one(
+        _since_query(since), {"_id": 0, "updated_at": 1}, sort=[("updated_at", -1)]
+    )
+    return export_watermark(latest.get("updated_at") if latest else None, since)
+
+
+async def iter_question_batches(
+    collection,
+    since: Optional[datetime] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[List[dict]]:
+    """逐批讀取題目，since 指定時只匯出 updated_at >= since 的題目"""
+    query = _since_query(since)
+    after = None
+    while True:
+        batch = await find_keyset_page(collection, query, ("question_id",), after, batch_size, {"_id": 0})
+        if batch:
+            yield batch
+        if len(batch) < batch_size:
+            return
+        after = [batch[-1]["question_id"]]
+
+
+async def _main():
+    import argparse
+
+    from backend.shared.database.mongodb import mongodb_manager
+
+    parser = argparse.ArgumentParser(description="匯出題庫（NDJSON）")
+    parser.add_argument("-o", "--output", required=True, help="輸出檔案，.gz 結尾時以 gzip 壓縮")
+    parser.add_argument("--since", help="只匯出此時間（ISO 8601）之後更新的題目")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    since = parse_since(args.since) if args.since else None
+    await mongodb_manager.connect()
+    try:
+        collection = mongodb_manager.get_collection("questions")
+        watermark = await question_export_watermark(collection, since)
+        count = await write_ndjson(
+            args.output,
+            iter_question_batches(collection, since, args.batch_size),
+            compress=args.output.endswith(".gz"),
+        )
+    finally:
+        await mongodb_manager.disconnect()
+    print(f"已匯出 {count} 題")
+    if watermark is not None:
+        print(f"下次增量匯出可使用 --since {watermark.isoformat()}（與本次重疊，可能重複匯出部分題目）")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
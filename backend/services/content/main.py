@@ -4,12 +4,54 @@
 支援 US-004: 錯題相關資源
 """
 
-from fastapi import FastAPI, HTTPException, status, UploadFile, File
+from fastapi import BackgroundTasks, FastAPI, Depends, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, TypeAdapter
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+import asyncio
 import uuid
+import os
+
+from backend.shared.auth.dependencies import create_token_dependency
+from backend.shared.auth.revocation import RevocationFilter
+from backend.shared.auth.verifier import build_token_verifier
+from backend.shared.database.mongodb import change_streams_unsupported, mongodb_manager
+from backend.shared.database.redis_client import redis_manager
+from backend.shared.utils.ndjson import ndjson_stream, parse_since
+from backend.shared.utils.process_pool import BoundedProcessPool, PoolSaturatedError
+from backend.services.content.derivatives import IMAGE_CONTENT_TYPES, VARIANT_PRESETS, DerivativeService
+from backend.services.content.exports import iter_question_batches, question_export_watermark
+from backend.services.content.media_store import MediaStore, MongoMediaMetadata
+from backend.services.content.pagination import (
+    InvalidCursorError,
+    decode_cursor,
+    encode_cursor,
+    filters_fingerprint,
+    find_keyset_page,
+    seek_sorted,
+)
+from backend.services.content.question_import import ImportProgress, detect_format, import_questions
+from backend.services.content.question_index import SORT_FIELDS, QuestionIndex, sort_key
+from backend.services.content.resource_index import MAX_RELATED, ResourceIndex, resource_sort_key
+from backend.services.content.schemas import QuestionResponse
+from backend.services.content.search_index import SearchIndex
+from backend.services.content.response_cache import (
+    ResponseCache,
+    cached_response,
+    etag_matches,
+    make_etag,
+    normalize_query,
+    not_modified,
+)
+from backend.services.content.range_response import RangeFileResponse, RangeNotSatisfiable, parse_range
+from backend.services.content.uploads import (
+    DEFAULT_MAX_FILE_SIZE,
+    UploadLimits,
+    parse_size_limits,
+    receive_upload,
+)
 
 # 應用設定
 app = FastAPI(
@@ -27,16 +69,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 上傳設定（個別類型可用 UPLOAD_SIZE_LIMITS 覆寫大小限制）
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL", "")
+upload_limits = UploadLimits(
+    allowed_types={
+        "image/jpeg", "image/png", "image/gif",
+        "video/mp4", "video/avi",
+        "application/pdf", "application/msword",
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    },
+    default_max_size=int(os.getenv("MAX_FILE_SIZE", str(DEFAULT_MAX_FILE_SIZE))),
+    per_type=parse_size_limits(os.getenv("UPLOAD_SIZE_LIMITS", "video/mp4=524288000,video/avi=524288000")),
+)
+
+# 內容定址媒體儲存（MongoDB 連接後改用 MongoDB 中繼資料）
+media_store = MediaStore(UPLOAD_DIR)
+
+# 圖片衍生檔（縮圖 / WebP）程序池
+image_pool = BoundedProcessPool(
+    name="image_derivatives",
+    max_workers=int(os.getenv("IMAGE_WORKERS", "2")),
+    max_queue=int(os.getenv("IMAGE_MAX_QUEUE", "32")),
+)
+derivative_service = DerivativeService(UPLOAD_DIR, image_pool)
+
+# 題庫匯入（驗證於程序池中進行，同時只執行一個匯入工作）
+IMPORT_CHECKPOINT_DIR = os.getenv("IMPORT_CHECKPOINT_DIR", os.path.join(UPLOAD_DIR, "import_checkpoints"))
+import_limits = UploadLimits(
+    allowed_types={
+        "application/x-ndjson", "application/jsonl", "application/json",
+        "text/csv", "application/vnd.ms-excel", "text/plain", "application/octet-stream"
+    },
+    default_max_size=int(os.getenv("IMPORT_MAX_FILE_SIZE", str(2 * 1024 * 1024 * 1024))),
+    per_type={},
+)
+import_pool = BoundedProcessPool(
+    name="question_import",
+    max_workers=int(os.getenv("IMPORT_WORKERS", "2")),
+    max_queue=int(os.getenv("IMPORT_MAX_QUEUE", "4")),
+)
+import_jobs: Dict[str, ImportProgress] = {}
+
+# 本地 Token 驗證（金鑰環 + 撤銷清單，不需呼叫認證服務）
+revocation_filter = RevocationFilter(redis_client_getter=lambda: redis_manager.client)
+token_verifier = build_token_verifier(
+    redis_client_getter=lambda: redis_manager.client,
+    is_revoked=revocation_filter.is_revoked,
+)
+verify_token = create_token_dependency(token_verifier)
+
 # Pydantic 模型
-class QuestionResponse(BaseModel):
-    question_id: str
-    content: str
-    type: str
-    subject: str
-    grade: int
-    difficulty: str
-    topic: str
-    tags: List[str]
+class QuestionSearchHit(QuestionResponse):
+    score: float
 
 
 class LearningResourceResponse(BaseModel):
@@ -49,15 +134,55 @@ class LearningResourceResponse(BaseModel):
     file_size: Optional[int] = None
 
 
+_question_list = TypeAdapter(List[QuestionResponse])
+_search_hits = TypeAdapter(List[QuestionSearchHit])
+_resource_list = TypeAdapter(List[LearningResourceResponse])
+
+
 class UploadResponse(BaseModel):
     file_id: str
     filename: str
     file_url: str
     file_size: int
     content_type: str
+    sha256: str
+    deduplicated: bool = False
 
 
-# 模擬資料
+# 模擬資料（MongoDB 無法連接時使用）
+SAMPLE_QUESTIONS = [
+    {
+        "question_id": "q001",
+        "content": "解方程式 2x + 3 = 7",
+        "type": "multiple_choice",
+        "subject": "mathematics",
+        "grade": 7,
+        "difficulty": "medium",
+        "topic": "algebra",
+        "tags": ["equation", "algebra", "basic"]
+    },
+    {
+        "question_id": "q002",
+        "content": "計算半徑為 5 的圓面積",
+        "type": "short_answer",
+        "subject": "mathematics",
+        "grade": 7,
+        "difficulty": "medium",
+        "topic": "geometry",
+        "tags": ["circle", "area", "geometry"]
+    },
+    {
+        "question_id": "q003",
+        "content": "化簡 3x + 2x - x",
+        "type": "short_answer",
+        "subject": "mathematics",
+        "grade": 7,
+        "difficulty": "easy",
+        "topic": "algebra",
+        "tags": ["simplify", "algebra", "basic"]
+    }
+]
+
 SAMPLE_RESOURCES = [
     {
         "resource_id": "res_001",
@@ -67,7 +192,9 @@ SAMPLE_RESOURCES = [
         "description": "詳細解說一元一次方程式的解法",
         "duration": 300,
         "subject": "mathematics",
-        "topic": "algebra"
+        "topic": "algebra",
+        "tags": ["equation", "algebra"],
+        "question_ids": ["q001"]
     },
     {
         "resource_id": "res_002",
@@ -77,7 +204,8 @@ SAMPLE_RESOURCES = [
         "description": "代數基礎概念整理筆記",
         "file_size": 2048000,
         "subject": "mathematics",
-        "topic": "algebra"
+        "topic": "algebra",
+        "tags": ["algebra", "basic"]
     },
     {
         "resource_id": "res_003",
@@ -87,24 +215,315 @@ SAMPLE_RESOURCES = [
         "description": "圓面積公式的圖解說明",
         "file_size": 512000,
         "subject": "mathematics",
-        "topic": "geometry"
+        "topic": "geometry",
+        "tags": ["circle", "area", "geometry"],
+        "question_ids": ["q002"]
     }
 ]
 
 
+# 列表回應快取（依題庫 / 資源版本失效）
+response_cache = ResponseCache(max_entries=int(os.getenv("LISTING_CACHE_SIZE", "1024")))
+
+# 題庫記憶體索引
+question_index = QuestionIndex()
+QUESTION_PROJECTION = {
+    "question_id": 1, "content": 1, "type": 1, "subject": 1,
+    "grade": 1, "difficulty": 1, "topic": 1, "tags": 1
+}
+RESOURCE_SORT_FIELDS = ("subject", "topic", "resource_id")
+
+# 題目全文檢索（slot 與題庫索引共用）
+search_index = SearchIndex()
+
+# 學習資源關聯索引
+resource_index = ResourceIndex()
+_background_tasks: List[asyncio.Task] = []
+
+# 變更追蹤：change stream 中斷時的重試退避、不支援時的輪詢與 _id 比對間隔（秒）
+CHANGE_RETRY_MIN_SECONDS = 1.0
+CHANGE_RETRY_MAX_SECONDS = 300.0
+CHANGE_POLL_SECONDS = float(os.getenv("CHANGE_POLL_SECONDS", "10"))
+CHANGE_RECONCILE_SECONDS = float(os.getenv("CHANGE_RECONCILE_SECONDS", "600"))
+
+# 題庫版本合併遞增的間隔（秒）
+QUESTION_BANK_PUBLISH_SECONDS = float(os.getenv("QUESTION_BANK_PUBLISH_SECONDS", "1"))
+_question_bank_changed = False
+
+
+def _mark_question_bank_changed():
+    """標記題庫已異動；版本由 publish_question_bank_version 合併遞增"""
+    global _question_bank_changed
+    _question_bank_changed = True
+
+
+def _flush_question_bank_version():
+    """有異動時遞增一次題庫版本，通知其他服務（無 Redis 時略過）"""
+    global _question_bank_changed
+    if not _question_bank_changed:
+        return
+    _question_bank_changed = False
+    try:
+        redis_manager.bump_question_bank_version()
+    except Exception:
+        pass
+
+
+async def publish_question_bank_version():
+    """每 QUESTION_BANK_PUBLISH_SECONDS 秒至多遞增一次題庫版本，大量匯入時不會逐題遞增"""
+    while True:
+        await asyncio.sleep(QUESTION_BANK_PUBLISH_SECONDS)
+        _flush_question_bank_version()
+
+
+def _stored_question(doc: dict) -> dict:
+    return {field: value for field, value in doc.items() if field != "_id"}
+
+
+def build_question_indexes(docs: List[dict]):
+    """以整批題目重建所有題庫索引；內容與目前索引相同時不通知版本異動"""
+    unchanged = len(docs) == len(question_index) and all(
+        question_index.get(doc["question_id"]) == _stored_question(doc) for doc in docs
+    )
+    question_index.build(docs)
+    search_index.build(question_index.items())
+    resource_index.forget_questions()
+    if not unchanged:
+        _mark_question_bank_changed()
+
+
+def apply_question_upsert(doc: dict):
+    """題目新增或更新時同步所有索引"""
+    previous = question_index.get(doc["question_id"])
+    if previous is not None and previous == _stored_question(doc):
+        return
+    slot = question_index.upsert(doc)
+    search_index.update(slot, previous, question_index.doc_at(slot))
+    resource_index.forget_question(doc["question_id"])
+    _mark_question_bank_changed()
+
+
+def apply_question_remove(question_id: str):
+    """題目刪除時同步所有索引"""
+    previous = question_index.get(question_id)
+    slot = question_index.remove(question_id)
+    if slot is not None:
+        search_index.remove(slot, previous)
+    resource_index.forget_question(question_id)
+    _mark_question_bank_changed()
+
+
+def apply_question_delete_event(object_id):
+    question_id = question_index.question_id_for(object_id)
+    if question_id:
+        apply_question_remove(question_id)
+
+
+def apply_resource_delete_event(object_id):
+    resource_id = resource_index.resource_id_for(object_id)
+    if resource_id:
+        resource_index.remove(resource_id)
+
+
+async def load_questions(batch_size: int = 5000):
+    """從 MongoDB 分批（keyset）載入題庫並重建索引"""
+    collection = mongodb_manager.get_collection("questions")
+    docs = []
+    after = None
+    while True:
+        batch = await find_keyset_page(
+            collection, {}, SORT_FIELDS, after, batch_size, QUESTION_PROJECTION
+        )
+        docs.extend(batch)
+        if len(batch) < batch_size:
+            break
+        after = [batch[-1].get(field) for field in SORT_FIELDS]
+    build_question_indexes(docs)
+    print(f"題庫索引已建立，共 {len(question_index)} 題")
+
+
+async def load_resources(batch_size: int = 5000):
+    """從 MongoDB 分批載入學習資源並重建關聯索引"""
+    collection = mongodb_manager.get_collection("learning_resources")
+    resources = []
+    after = None
+    while True:
+        batch = await find_keyset_page(collection, {}, RESOURCE_SORT_FIELDS, after, batch_size)
+        resources.extend(batch)
+        if len(batch) < batch_size:
+            break
+        after = [batch[-1].get(field) for field in RESOURCE_SORT_FIELDS]
+    resource_index.build(resources)
+    print(f"學習資源索引已建立，共 {len(resource_index)} 筆")
+
+
+async def follow_changes(collection_name: str, on_upsert, on_delete, reload, known_ids, projection=None,
+                         loaded: bool = True):
+    """追蹤集合變更並增量更新索引
+
+    change stream 中斷時以指數退避重試並重新載入；部署不支援 change stream（單機 MongoDB）時
+    改為輪詢 updated_at，之後不再嘗試 change stream。
+    loaded 為 False（啟動時載入失敗）時先以指數退避重試載入，成功後才開始追蹤。
+    """
+    backoff = CHANGE_RETRY_MIN_SECONDS
+    while not loaded:
+        await asyncio.sleep(backoff)
+        try:
+            await reload()
+            loaded = True
+        except Exception as e:
+            backoff = min(backoff * 2, CHANGE_RETRY_MAX_SECONDS)
+            print(f"{collection_name} 重新載入失敗，{backoff:g} 秒後重試: {e}")
+    backoff = CHANGE_RETRY_MIN_SECONDS
+    while True:
+        try:
+            async for operation, object_id, doc in mongodb_manager.watch_changes(collection_name):
+                backoff = CHANGE_RETRY_MIN_SECONDS
+                if operation == "upsert":
+                    on_upsert(doc)
+                else:
+                    on_delete(object_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if change_streams_unsupported(e):
+                print(f"{collection_name} 不支援變更追蹤，改為每 {CHANGE_POLL_SECONDS:g} 秒輪詢 updated_at")
+                break
+            print(f"{collection_name} 變更追蹤中斷，{backoff:g} 秒後重新載入: {e}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, CHANGE_RETRY_MAX_SECONDS)
+            try:
+                await reload()
+            except Exception as reload_error:
+                print(f"{collection_name} 重新載入失敗: {reload_error}")
+
+    while True:
+        try:
+            async for operation, object_id, doc in mongodb_manager.poll_changes(
+                collection_name, known_ids, projection, CHANGE_POLL_SECONDS, CHANGE_RECONCILE_SECONDS
+            ):
+                if operation == "upsert":
+                    on_upsert(doc)
+                else:
+                    on_delete(object_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"{collection_name} 輪詢失敗，{CHANGE_RETRY_MAX_SECONDS:g} 秒後重試: {e}")
+            await asyncio.sleep(CHANGE_RETRY_MAX_SECONDS)
+
+
+# 生命週期事件
+@app.on_event("startup")
+async def startup():
+    """連接資料庫、建立題庫索引並啟動撤銷清單同步"""
+    image_pool.start()
+    import_pool.start()
+    try:
+        redis_manager.connect()
+    except Exception:
+        pass  # 無 Redis 時撤銷清單僅在本程序生效
+    revocation_filter.start()
+    _background_tasks.append(asyncio.create_task(publish_question_bank_version()))
+    
+    try:
+        await mongodb_manager.connect()
+    except Exception as e:
+        # 無 MongoDB 時使用模擬題庫與資源
+        print(f"MongoDB 連接失敗，改用模擬題庫與資源: {e}")
+        build_question_indexes(SAMPLE_QUESTIONS)
+        resource_index.build(SAMPLE_RESOURCES)
+        return
+    media_store.metadata = MongoMediaMetadata(
+        mongodb_manager.get_collection("media_objects"),
+        mongodb_manager.get_collection("media_files")
+    )
+    
+    # 題庫與資源各自載入，一邊失敗不影響另一邊；失敗的一邊由追蹤任務在背景重試
+    questions_loaded = resources_loaded = True
+    try:
+        await load_questions()
+    except Exception as e:
+        questions_loaded = False
+        print(f"題庫載入失敗，背景重試: {e}")
+    try:
+        await load_resources()
+    except Exception as e:
+        resources_loaded = False
+        print(f"學習資源載入失敗，背景重試: {e}")
+    _background_tasks.append(asyncio.create_task(follow_changes(
+        "questions", apply_question_upsert, apply_question_delete_event, load_questions,
+        question_index.object_ids, QUESTION_PROJECTION, loaded=questions_loaded
+    )))
+    _background_tasks.append(asyncio.create_task(follow_changes(
+        "learning_resources", resource_index.upsert, apply_resource_delete_event, load_resources,
+        resource_index.object_ids, loaded=resources_loaded
+    )))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """關閉連接"""
+    for task in _background_tasks:
+        task.cancel()
+    _flush_question_bank_version()
+    image_pool.shutdown()
+    import_pool.shutdown()
+    revocation_filter.stop()
+    redis_manager.disconnect()
+    await mongodb_manager.disconnect()
+
+
+@app.exception_handler(PoolSaturatedError)
+async def pool_saturated_handler(request: Request, exc: PoolSaturatedError):
+    """程序池佇列已滿時返回 503"""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server is busy, please retry later"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _decode_keyset_cursor(cursor: str, fingerprint: str, key_types: tuple):
+    """解碼游標並檢查排序鍵型別"""
+    try:
+        after = decode_cursor(cursor, fingerprint)
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if after is not None and (
+        len(after) != len(key_types)
+        or not all(isinstance(value, key_type) for value, key_type in zip(after, key_types))
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return after
+
+
 # API 端點
 @app.get("/content/questions", response_model=List[QuestionResponse])
 async def get_questions(
+    request: Request,
     subject: Optional[str] = None,
     grade: Optional[int] = None,
     difficulty: Optional[str] = None,
     topic: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None),
+    tag_mode: str = "all",
     page: int = 1,
-    page_size: int = 20
+    page_size: int = 20,
+    cursor: Optional[str] = None
 ):
     """
     查詢題庫
-    支援多條件過濾和分頁
+    支援多條件過濾（含標籤 AND / OR）和分頁
+    分頁有兩種模式：page/page_size 位移分頁，或帶 cursor（首頁傳空字串）的游標分頁，
+    游標模式依 (subject, grade, question_id) 排序，下一頁游標放在 X-Next-Cursor 標頭
+    回應帶題庫版本 ETag，序列化結果依查詢字串快取
     """
     # 驗證分頁參數
     if page < 1:
@@ -119,72 +538,133 @@ async def get_questions(
             detail="Page size must be between 1 and 100"
         )
     
-    # 模擬題庫查詢
-    questions = [
-        QuestionResponse(
-            question_id="q001",
-            content="解方程式 2x + 3 = 7",
-            type="multiple_choice",
-            subject="mathematics",
-            grade=7,
-            difficulty="medium",
-            topic="algebra",
-            tags=["equation", "algebra", "basic"]
-        ),
-        QuestionResponse(
-            question_id="q002",
-            content="計算半徑為 5 的圓面積",
-            type="short_answer",
-            subject="mathematics",
-            grade=7,
-            difficulty="medium",
-            topic="geometry",
-            tags=["circle", "area", "geometry"]
-        ),
-        QuestionResponse(
-            question_id="q003",
-            content="化簡 3x + 2x - x",
-            type="short_answer",
-            subject="mathematics",
-            grade=7,
-            difficulty="easy",
-            topic="algebra",
-            tags=["simplify", "algebra", "basic"]
+    if tag_mode not in ("all", "any"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Tag mode must be one of: all, any"
         )
-    ]
     
-    # 應用過濾條件
-    filtered_questions = questions
+    # 條件式請求與快取
+    query_key = normalize_query(request)
+    version = question_index.generation
+    etag = make_etag("questions", version, query_key)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    cached = response_cache.get("questions", version, query_key)
+    if cached is not None:
+        return cached_response(cached, request)
     
-    if subject:
-        filtered_questions = [q for q in filtered_questions if q.subject == subject]
+    # 以點陣圖交集求出符合條件的題目
+    matched = question_index.query(
+        subject=subject,
+        grade=grade,
+        difficulty=difficulty,
+        topic=topic,
+        tags=tags,
+        tag_mode=tag_mode
+    )
     
-    if grade:
-        filtered_questions = [q for q in filtered_questions if q.grade == grade]
+    # 游標分頁
+    headers = {}
+    if cursor is not None:
+        fingerprint = filters_fingerprint({
+            "subject": subject, "grade": grade, "difficulty": difficulty,
+            "topic": topic, "tags": tags, "tag_mode": tag_mode
+        })
+        after = _decode_keyset_cursor(cursor, fingerprint, (str, int, str))
+        docs = question_index.seek(matched, after, page_size + 1)
+        if len(docs) > page_size:
+            docs = docs[:page_size]
+            headers["X-Next-Cursor"] = encode_cursor(sort_key(docs[-1]), fingerprint)
+    else:
+        # 位移分頁（只實體化目前頁面）
+        docs = question_index.page(matched, offset=(page - 1) * page_size, limit=page_size)
     
-    if difficulty:
-        filtered_questions = [q for q in filtered_questions if q.difficulty == difficulty]
+    body = _question_list.dump_json(_question_list.validate_python(docs))
+    entry = response_cache.put("questions", version, query_key, body, headers)
+    return cached_response(entry, request)
+
+
+@app.get("/content/questions/search", response_model=List[QuestionSearchHit])
+async def search_questions(
+    request: Request,
+    q: str,
+    subject: Optional[str] = None,
+    grade: Optional[int] = None,
+    difficulty: Optional[str] = None,
+    topic: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None),
+    tag_mode: str = "all",
+    limit: int = 20
+):
+    """
+    全文檢索題目內容與標籤
+    中文以二元組、英數以整詞比對，依 BM25 分數排序，可搭配題庫過濾條件
+    """
+    if not q.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Query must not be empty"
+        )
     
-    if topic:
-        filtered_questions = [q for q in filtered_questions if q.topic == topic]
+    if not 1 <= limit <= 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Limit must be between 1 and 100"
+        )
     
-    # 分頁處理
-    start_index = (page - 1) * page_size
-    end_index = start_index + page_size
+    if tag_mode not in ("all", "any"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Tag mode must be one of: all, any"
+        )
+    
+    # 條件式請求與快取
+    query_key = normalize_query(request)
+    version = question_index.generation
+    etag = make_etag("search", version, query_key)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    cached = response_cache.get("search", version, query_key)
+    if cached is not None:
+        return cached_response(cached, request)
+    
+    bitmap = None
+    if any(value is not None for value in (subject, grade, difficulty, topic)) or tags:
+        bitmap = question_index.query(
+            subject=subject,
+            grade=grade,
+            difficulty=difficulty,
+            topic=topic,
+            tags=tags,
+            tag_mode=tag_mode
+        )
     
-    return filtered_questions[start_index:end_index]
+    hits = [
+        {**question_index.doc_at(slot), "score": round(score, 4)}
+        for slot, score in search_index.search(q, bitmap, limit)
+    ]
+    body = _search_hits.dump_json(_search_hits.validate_python(hits))
+    entry = response_cache.put("search", version, query_key, body)
+    return cached_response(entry, request)
 
 
 @app.get("/content/learning-resources", response_model=List[LearningResourceResponse])
 async def get_learning_resources(
+    request: Request,
     question_id: Optional[str] = None,
     subject: Optional[str] = None,
     topic: Optional[str] = None,
-    type: Optional[str] = None
+    type: Optional[str] = None,
+    page_size: int = 20,
+    cursor: Optional[str] = None
 ):
     """
     獲取學習資源 (US-004)
     提供與錯題相關的影片、筆記、圖片等學習資源
+    帶 question_id 時返回該題的相關資源（依關聯度排序，過濾後取前 page_size 筆，上限 MAX_RELATED）；
+    帶 cursor（首頁傳空字串）時改為游標分頁，下一頁游標放在 X-Next-Cursor 標頭
+    回應帶資源版本 ETag，序列化結果依查詢字串快取
     """
     # 驗證資源類型
     if type and type not in ["video", "document", "image"]:
@@ -193,81 +673,428 @@ async def get_learning_resources(
             detail="Type must be one of: video, document, image"
         )
     
-    # 模擬資源查詢
-    resources = []
+    if question_id and not 1 <= page_size <= MAX_RELATED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Page size must be between 1 and {MAX_RELATED} when question_id is given"
+        )
+    if cursor is not None and not 1 <= page_size <= 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Page size must be between 1 and 100"
+        )
+    
+    version = resource_index.generation
+    question = None
+    if question_id:
+        if cursor is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor pagination is not supported with question_id"
+            )
+        question = question_index.get(question_id)
+        if question is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Question not found"
+            )
+        # 相關資源的排序也取決於題目內容
+        version = f"{version}/{question_index.generation}"
     
-    for resource_data in SAMPLE_RESOURCES:
+    # 條件式請求與快取
+    kind = "related_resources" if question is not None else "resources"
+    query_key = normalize_query(request)
+    etag = make_etag(kind, version, query_key)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    cached = response_cache.get(kind, version, query_key)
+    if cached is not None:
+        return cached_response(cached, request)
+    
+    def matches(resource_data: dict) -> bool:
         # 應用過濾條件
         if subject and resource_data.get("subject") != subject:
-            continue
-        
+            return False
         if topic and resource_data.get("topic") != topic:
-            continue
-        
+            return False
         if type and resource_data["type"] != type:
-            continue
-        
-        resource = LearningResourceResponse(
-            resource_id=resource_data["resource_id"],
-            title=resource_data["title"],
-            type=resource_data["type"],
-            url=resource_data["url"],
-            description=resource_data["description"],
-            duration=resource_data.get("duration"),
-            file_size=resource_data.get("file_size")
-        )
-        resources.append(resource)
+            return False
+        return True
     
-    return resources
+    headers = {}
+    if question is not None:
+        # 錯題相關資源：直接查關聯索引，先過濾再截斷，避免被其他類型的資源擠掉
+        selected = []
+        for resource_id in resource_index.related(question):
+            resource_data = resource_index.get(resource_id)
+            if matches(resource_data):
+                selected.append(resource_data)
+                if len(selected) >= page_size:
+                    break
+    elif cursor is not None:
+        # 游標分頁
+        fingerprint = filters_fingerprint({"subject": subject, "topic": topic, "type": type})
+        after = _decode_keyset_cursor(cursor, fingerprint, (str, str, str))
+        ordered = resource_index.candidates(subject, topic)
+        keys = [resource_sort_key(resource_data) for resource_data in ordered]
+        positions = seek_sorted(keys, after, lambda i: matches(ordered[i]), page_size + 1)
+        if len(positions) > page_size:
+            positions = positions[:page_size]
+            headers["X-Next-Cursor"] = encode_cursor(keys[positions[-1]], fingerprint)
+        selected = [ordered[i] for i in positions]
+    else:
+        selected = [
+            resource_data for resource_data in resource_index.candidates(subject, topic)
+            if matches(resource_data)
+        ]
+    
+    body = _resource_list.dump_json(_resource_list.validate_python(selected))
+    entry = response_cache.put(kind, version, query_key, body, headers)
+    return cached_response(entry, request)
 
 
-@app.post("/content/upload", response_model=UploadResponse)
-async def upload_file(file: UploadFile = File(...)):
+@app.post(
+    "/content/upload",
+    response_model=UploadResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"]
+                    }
+                }
+            }
+        }
+    }
+)
+async def upload_file(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    token_data: dict = Depends(verify_token)
+):
     """
     上傳多媒體內容
     支援圖片、影片、文檔等格式
+    檔案以串流方式寫入 UPLOAD_DIR，超過該類型的大小限制時立即中止
     """
-    # 驗證檔案類型
-    allowed_types = {
-        "image/jpeg", "image/png", "image/gif",
-        "video/mp4", "video/avi",
-        "application/pdf", "application/msword",
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    upload = await receive_upload(request, UPLOAD_DIR, upload_limits)
+    
+    # 以內容雜湊儲存，重複內容只新增中繼資料
+    record = await media_store.add(upload, uploaded_by=token_data.get("sub"))
+    
+    # 圖片於背景預先產生常用尺寸
+    background_tasks.add_task(
+        derivative_service.pregenerate,
+        media_store.object_path(record["sha256"]),
+        record["sha256"],
+        record["content_type"]
+    )
+    
+    return UploadResponse(
+        file_id=record["file_id"],
+        filename=record["filename"],
+        file_url=f"{MEDIA_BASE_URL}/content/files/{record['file_id']}",
+        file_size=record["size"],
+        content_type=record["content_type"],
+        sha256=record["sha256"],
+        deduplicated=record["deduplicated"]
+    )
+
+
+@app.api_route("/content/files/{file_id}", methods=["GET", "HEAD"])
+async def download_file(file_id: str, request: Request):
+    """
+    下載多媒體內容
+    支援 Range（影片拖曳播放）與 If-None-Match（ETag 為內容雜湊）
+    """
+    record = await media_store.get(file_id)
+    path = media_store.object_path(record["sha256"]) if record else None
+    if record is None or not os.path.exists(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    
+    size = os.path.getsize(path)
+    etag = f'"{record["sha256"]}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        # 內容定址：同一檔案 ID 的內容永遠不變
+        "Cache-Control": "public, max-age=31536000, immutable",
     }
     
-    if file.content_type not in allowed_types:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    # If-Range 與目前版本不符時回傳完整內容
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        range_header = None
+    
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={**headers, "Content-Range": f"bytes */{size}"}
+        )
+    
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, status.HTTP_200_OK
+    else:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    
+    return RangeFileResponse(
+        path,
+        start,
+        end,
+        status_code=status_code,
+        headers=headers,
+        media_type=record["content_type"],
+        send_body=request.method != "HEAD"
+    )
+
+
+@app.get("/content/files/{file_id}/variants/{variant}")
+async def download_variant(file_id: str, variant: str, request: Request):
+    """
+    下載圖片衍生檔（thumb、w320、w640、w1280，WebP 格式）
+    首次請求時產生並快取於磁碟
+    """
+    if variant not in VARIANT_PRESETS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Variant must be one of: {', '.join(VARIANT_PRESETS)}"
+        )
+    
+    record = await media_store.get(file_id)
+    source_path = media_store.object_path(record["sha256"]) if record else None
+    if record is None or not os.path.exists(source_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    
+    if record["content_type"] not in IMAGE_CONTENT_TYPES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File type {file.content_type} not allowed"
+            detail="Variants are only available for images"
         )
     
-    # 驗證檔案大小 (10MB 限制)
-    max_size = 10 * 1024 * 1024  # 10MB
-    file_content = await file.read()
+    etag = f'"{record["sha256"]}-{variant}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
     
-    if len(file_content) > max_size:
+    try:
+        path = await derivative_service.ensure(source_path, record["sha256"], variant)
+    except PoolSaturatedError:
+        raise
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Unable to render image"
+        )
+    
+    return RangeFileResponse(
+        path,
+        0,
+        os.path.getsize(path) - 1,
+        headers=headers,
+        media_type="image/webp"
+    )
+
+
+@app.delete("/content/files/{file_id}", response_model=dict)
+async def delete_file(
+    file_id: str,
+    token_data: dict = Depends(verify_token)
+):
+    """
+    刪除多媒體內容
+    最後一個參照被刪除時才移除實體檔案
+    """
+    record = await media_store.get(file_id)
+    if record is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    
+    if record.get("uploaded_by") != token_data.get("sub") and token_data.get("role") not in ("teacher", "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not allowed to delete this file"
+        )
+    
+    await media_store.delete(file_id)
+    return {"message": "File deleted", "file_id": file_id}
+
+
+async def run_question_import(temp_path: str, fmt: str, progress: ImportProgress):
+    """執行匯入工作，完成後重建題庫索引"""
+    try:
+        await import_questions(
+            temp_path, fmt, mongodb_manager.get_collection("questions"),
+            import_pool, IMPORT_CHECKPOINT_DIR, progress=progress
+        )
+        print(f"題庫匯入完成 {progress.job_id}：{progress.written} 筆，{progress.records_per_second} 筆/秒")
+        await load_questions()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"題庫匯入失敗 {progress.job_id}: {e}")
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _import_running() -> bool:
+    return any(job.status in ("pending", "running") for job in import_jobs.values())
+
+
+@app.post(
+    "/content/import/questions",
+    status_code=status.HTTP_202_ACCEPTED,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"]
+                    }
+                }
+            }
+        }
+    }
+)
+async def import_question_bank(
+    request: Request,
+    token_data: dict = Depends(verify_token)
+):
+    """
+    批次匯入題庫（JSONL 或 CSV，CSV 的 tags / options 以分號分隔）
+    於背景執行並立即返回工作編號，進度以 GET /content/import/questions/{job_id} 查詢；
+    同一檔案匯入失敗後重新上傳會從檢查點繼續
+    """
+    if token_data.get("role") not in ("teacher", "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only teachers can import question banks"
+        )
+    
+    if mongodb_manager.database is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Question database unavailable"
+        )
+    
+    if _import_running():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Another import is already running"
+        )
+    
+    upload = await receive_upload(request, UPLOAD_DIR, import_limits)
+    fmt = detect_format(upload.filename, upload.content_type)
+    if fmt is None or _import_running():
+        os.remove(upload.temp_path)
+        if fmt is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Question bank must be a CSV or JSONL file"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Another import is already running"
+        )
+    
+    progress = ImportProgress(uuid.uuid4().hex, upload.sha256)
+    import_jobs[progress.job_id] = progress
+    _background_tasks.append(asyncio.create_task(run_question_import(upload.temp_path, fmt, progress)))
+    return progress.to_dict()
+
+
+@app.get("/content/import/questions/{job_id}")
+async def get_question_import(
+    job_id: str,
+    token_data: dict = Depends(verify_token)
+):
+    """查詢匯入進度（含每秒處理筆數）"""
+    progress = import_jobs.get(job_id)
+    if progress is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import job not found"
+        )
+    return progress.to_dict()
+
+
+@app.get("/content/export/questions")
+async def export_questions(
+    since: Optional[str] = None,
+    compress: bool = False,
+    token_data: dict = Depends(verify_token)
+):
+    """
+    串流匯出題庫（NDJSON，compress=true 時為 gzip）
+    since 為 ISO 8601 時間，只匯出之後更新的題目；下次增量匯出的浮水印放在 X-Export-Watermark 標頭，
+    為本次最新 updated_at 減去安全重疊，相鄰兩次匯出可能重複同一題（依 question_id 去重）
+    """
+    if token_data.get("role") not in ("teacher", "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only teachers can export question banks"
+        )
+    
+    try:
+        since_time = parse_since(since) if since else None
+    except ValueError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="File size exceeds 10MB limit"
+            detail="Invalid since timestamp"
         )
     
-    # 模擬檔案儲存
-    file_id = str(uuid.uuid4())
-    file_url = f"https://storage.example.com/uploads/{file_id}_{file.filename}"
+    if mongodb_manager.database is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Question database unavailable"
+        )
     
-    return UploadResponse(
-        file_id=file_id,
-        filename=file.filename,
-        file_url=file_url,
-        file_size=len(file_content),
-        content_type=file.content_type
+    collection = mongodb_manager.get_collection("questions")
+    watermark = await question_export_watermark(collection, since_time)
+    filename = "questions.ndjson.gz" if compress else "questions.ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if watermark is not None:
+        headers["X-Export-Watermark"] = watermark.isoformat()
+    return StreamingResponse(
+        ndjson_stream(iter_question_batches(collection, since_time), compress=compress),
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers=headers
     )
 
 
 @app.get("/content/health")
 async def health_check():
     """健康檢查端點"""
-    return {"status": "healthy", "service": "content", "timestamp": datetime.utcnow().isoformat()}
+    return {
+        "status": "healthy",
+        "service": "content",
+        "timestamp": datetime.utcnow().isoformat(),
+        "listing_cache": response_cache.stats()
+    }
 
 
 if __name__ == "__main__":
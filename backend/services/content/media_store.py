@@ -0,0 +1,174 @@
+"""
+內容定址媒體儲存
+檔案以 SHA-256 為鍵存放於 UPLOAD_DIR/objects，相同內容只存一份並以參照計數管理；
+重複上傳只新增一筆檔案中繼資料
+"""
+
+import os
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+
+import aiofiles.os
+from pymongo import ReturnDocument
+
+from .uploads import StoredUpload
+
+
+class MemoryMediaMetadata:
+    """記憶體中繼資料（MongoDB 無法連接時使用，僅適用單一程序）"""
+
+    def __init__(self):
+        self._objects: Dict[str, dict] = {}
+        self._files: Dict[str, dict] = {}
+
+    async def acquire_object(self, sha256: str, size: int, content_type: str) -> bool:
+        obj = self._objects.get(sha256)
+        if obj is None:
+            self._objects[sha256] = {"size": size, "content_type": content_type, "refcount": 1}
+            return True
+        obj["refcount"] += 1
+        return obj["refcount"] == 1
+
+    async def release_object(self, sha256: str) -> bool:
+        obj = self._objects.get(sha256)
+        if obj is None:
+            return False
+        obj["refcount"] -= 1
+        return obj["refcount"] <= 0
+
+    async def drop_object(self, sha256: str) -> bool:
+        obj = self._objects.get(sha256)
+        if obj is None or obj["refcount"] > 0:
+            return False
+        del self._objects[sha256]
+        return True
+
+    async def insert_file(self, record: dict):
+        self._files[record["file_id"]] = record
+
+    async def get_file(self, file_id: str) -> Optional[dict]:
+        return self._files.get(file_id)
+
+    async def delete_file(self, file_id: str) -> Optional[dict]:
+        return self._files.pop(file_id, None)
+
+
+class MongoMediaMetadata:
+    """MongoDB 中繼資料：media_objects 存參照計數，media_files 存每次上傳"""
+
+    def __init__(self, objects_collection, files_collection):
+        self.objects = objects_collection
+        self.files = files_collection
+
+    async def acquire_object(self, sha256: str, size: int, content_type: str) -> bool:
+        """參照計數 +1，返回是否為新物件（含參照計數已歸零、實體檔案可能正被刪除者）"""
+        before = await self.objects.find_one_and_update(
+            {"_id": sha256},
+            {
+                "$inc": {"refcount": 1},
+                "$setOnInsert": {
+                    "size": size,
+                    "content_type": content_type,
+                    "created_at": datetime.utcnow(),
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+        return before is None or before["refcount"] <= 0
+
+    async def release_object(self, sha256: str) -> bool:
+        """參照計數 -1，返回物件是否已無人參照"""
+        after = await self.objects.find_one_and_update(
+            {"_id": sha256},
+            {"$inc": {"refcount": -1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        return after is not None and after["refcount"] <= 0
+
+    async def drop_object(self, sha256: str) -> bool:
+        """參照計數仍為 0 時刪除物件（條件刪除，與 acquire_object 互斥），返回是否已刪除"""
+        result = await self.objects.delete_one({"_id": sha256, "refcount": {"$lte": 0}})
+        return result.deleted_count == 1
+
+    async def insert_file(self, record: dict):
+        await self.files.insert_one(dict(record))
+
+    async def get_file(self, file_id: str) -> Optional[dict]:
+        return await self.files.find_one({"file_id": file_id}, {"_id": 0})
+
+    async def delete_file(self, file_id: str) -> Optional[dict]:
+        return await self.files.find_one_and_delete({"file_id": file_id}, {"_id": 0})
+
+
+class MediaStore:
+    """內容定址媒體儲存"""
+
+    def __init__(self, root: str, metadata=None):
+        self.root = root
+        self.metadata = metadata or MemoryMediaMetadata()
+
+    def object_path(self, sha256: str) -> str:
+        """物件路徑：objects/ab/cd/<sha256>"""
+        return os.path.join(self.root, "objects", sha256[:2], sha256[2:4], sha256)
+
+    async def add(self, upload: StoredUpload, uploaded_by: Optional[str] = None) -> dict:
+        """保存上傳檔案；內容已存在時只寫入中繼資料"""
+        is_new = await self.metadata.acquire_object(upload.sha256, upload.size, upload.content_type)
+        path = self.object_path(upload.sha256)
+
+        # 新物件一律放入本次上傳：舊的實體檔案可能正被刪除（內容相同，覆蓋無妨）
+        if is_new or not os.path.exists(path):
+            await aiofiles.os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(upload.temp_path, path)
+        else:
+            await aiofiles.os.remove(upload.temp_path)
+
+        record = {
+            "file_id": str(uuid.uuid4()),
+            "sha256": upload.sha256,
+            "filename": upload.filename,
+            "content_type": upload.content_type,
+            "size": upload.size,
+            "uploaded_by": uploaded_by,
+            "created_at": datetime.utcnow(),
+        }
+        try:
+            await self.metadata.insert_file(record)
+        except Exception:
+            await self._release(upload.sha256)
+            raise
+        record["deduplicated"] = not is_new
+        return record
+
+    async def get(self, file_id: str) -> Optional[dict]:
+        return await self.metadata.get_file(file_id)
+
+    async def delete(self, file_id: str) -> Optional[dict]:
+        """刪除檔案中繼資料；最後一個參照被移除時刪除實體檔案"""
+        record = await self.metadata.delete_file(file_id)
+        if record is None:
+            return None
+        await self._release(record["sha256"])
+        return record
+
+    async def _release(self, sha256: str):
+        """釋放一個參照；歸零時刪除實體檔案
+
+        先將檔案改名移出，再以條件刪除確認參照計數仍為 0；期間若有新的上傳取得參照則搬回原處，
+        內容相同，即使新上傳已放入檔案也不會遺失。
+        """
+        if not await self.metadata.release_object(sha256):
+            return
+        path = self.object_path(sha256)
+        trash = f"{path}.{uuid.uuid4().hex}.deleting"
+        try:
+            os.replace(path, trash)
+        except FileNotFoundError:
+            await self.metadata.drop_object(sha256)
+            return
+        if await self.metadata.drop_object(sha256):
+            await aiofiles.os.remove(trash)
+        else:
+            os.replace(trash, path)
@@ -0,0 +1,99 @@
+"""
+Keyset（游標）分頁
+以穩定的複合排序鍵定位下一頁，不使用 skip()，深頁與淺頁延遲相同
+"""
+
+import base64
+import hashlib
+import json
+from bisect import bisect_right
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+class InvalidCursorError(Exception):
+    """游標格式錯誤或與查詢條件不符"""
+
+
+def filters_fingerprint(filters: Dict[str, Any]) -> str:
+    """查詢條件指紋，避免游標被用於不同條件的查詢"""
+    normalized = json.dumps(
+        {key: value for key, value in filters.items() if value is not None},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12]
+
+
+def encode_cursor(key: Sequence[Any], fingerprint: str) -> str:
+    """將最後一筆的排序鍵編碼為不透明游標"""
+    raw = json.dumps({"k": list(key), "f": fingerprint}, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, fingerprint: str) -> Optional[Tuple[Any, ...]]:
+    """解碼游標，空字串代表第一頁"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        key = tuple(data["k"])
+        cursor_fingerprint = data["f"]
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursorError("Invalid cursor")
+    if cursor_fingerprint != fingerprint:
+        raise InvalidCursorError("Cursor does not match the query filters")
+    return key
+
+
+def seek_sorted(
+    keys: Sequence[Tuple[Any, ...]],
+    after: Optional[Tuple[Any, ...]],
+    predicate: Callable[[int], bool],
+    limit: int,
+) -> List[int]:
+    """在已排序的鍵清單中，從 after 之後找出前 limit 個符合條件的位置"""
+    start = bisect_right(keys, after) if after is not None else 0
+    positions = []
+    for position in range(start, len(keys)):
+        if predicate(position):
+            positions.append(position)
+            if len(positions) >= limit:
+                break
+    return positions
+
+
+def mongo_seek_filter(sort_fields: Sequence[str], after: Optional[Sequence[Any]]) -> dict:
+    """產生「排序鍵大於 after」的 MongoDB 條件（字典序比較）
+
+    例如 (subject, grade, question_id) 會展開為
+    subject > a OR (subject = a AND grade > b) OR (subject = a AND grade = b AND question_id > c)
+    """
+    if after is None:
+        return {}
+    clauses = []
+    for i, field in enumerate(sort_fields):
+        clause = {prev: after[j] for j, prev in enumerate(sort_fields[:i])}
+        clause[field] = {"$gt": after[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+async def find_keyset_page(
+    collection,
+    query: dict,
+    sort_fields: Sequence[str],
+    after: Optional[Sequence[Any]],
+    limit: int,
+    projection: Optional[dict] = None,
+) -> List[dict]:
+    """以 keyset 方式從 MongoDB 取得一頁（需有對應 sort_fields 的複合索引）"""
+    seek = mongo_seek_filter(sort_fields, after)
+    condition = {"$and": [query, seek]} if query and seek else (query or seek)
+    cursor = (
+        collection.find(condition, projection)
+        .sort([(field, 1) for field in sort_fields])
+        .limit(limit)
+    )
+    return await cursor.to_list(length=limit)
@@ -0,0 +1,333 @@
+"""
+題庫批次匯入
+串流讀取 JSONL / CSV，於程序池中依 QuestionResponse 驗證，
+以無序 bulk_write 依 question_id upsert 至 questions 集合；
+進度依檔案內容雜湊寫入檢查點，失敗後重新匯入同一檔案會從檢查點繼續
+
+命令列：python -m backend.services.content.question_import questions.jsonl
+"""
+
+import asyncio
+import codecs
+import csv
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Callable, Deque, List, Optional, Tuple
+
+import aiofiles
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from backend.shared.utils.process_pool import BoundedProcessPool
+from .schemas import QuestionResponse
+
+READ_CHUNK_SIZE = 1024 * 1024
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+# CSV 中以分號分隔的多值欄位
+CSV_LIST_FIELDS = ("tags", "options")
+
+
+def detect_format(filename: str, content_type: Optional[str] = None) -> Optional[str]:
+    """依副檔名或類型判斷格式"""
+    filename = (filename or "").lower()
+    if filename.endswith((".jsonl", ".ndjson")) or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "jsonl"
+    if filename.endswith(".csv") or content_type in ("text/csv", "application/vnd.ms-excel"):
+        return "csv"
+    return None
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _parse_record(fmt: str, header: Optional[List[str]], line: str) -> dict:
+    if fmt == "jsonl":
+        data = json.loads(line)
+        if not isinstance(data, dict):
+            raise ValueError("Each line must be a JSON object")
+        return data
+
+    values = next(csv.reader([line]))
+    data = {key: value.strip() for key, value in zip(header, values) if value.strip()}
+    for field in CSV_LIST_FIELDS:
+        if field in data:
+            data[field] = [item.strip() for item in data[field].split(";") if item.strip()]
+    return data
+
+
+def validate_batch(
+    fmt: str,
+    header: Optional[List[str]],
+    rows: List[Tuple[int, str]],
+) -> Tuple[List[Tuple[int, dict]], List[Tuple[int, str]]]:
+    """解析並驗證一批資料（於子程序執行），返回 (有效題目, 錯誤)
+
+    題目需符合 QuestionResponse；選項、答案、解析等額外欄位原樣保留。
+    """
+    valid = []
+    errors = []
+    for row_number, line in rows:
+        try:
+            data = _parse_record(fmt, header, line)
+            question = QuestionResponse.model_validate(data)
+        except ValidationError as e:
+            errors.append((row_number, "; ".join(
+                f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+            )))
+            continue
+        except (ValueError, StopIteration) as e:
+            errors.append((row_number, f"Malformed row: {e}"))
+            continue
+        data.pop("_id", None)
+        valid.append((row_number, {**data, **question.model_dump()}))
+    return valid, errors
+
+
+class ImportCheckpoint:
+    """匯入檢查點：記錄已寫入的資料筆數（依檔案內容雜湊）"""
+
+    def __init__(self, directory: str, source_sha256: str):
+        self.path = os.path.join(directory, f"{source_sha256}.json")
+
+    def load(self) -> int:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return int(json.load(f).get("records", 0))
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def save(self, records: int):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"records": records, "updated_at": datetime.utcnow().isoformat()}, f)
+        os.replace(temp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ImportProgress:
+    """匯入進度"""
+
+    def __init__(self, job_id: str, source_sha256: str):
+        self.job_id = job_id
+        self.source_sha256 = source_sha256
+        self.status = "pending"  # pending, running, completed, failed
+        self.resumed_from = 0
+        self.processed = 0
+        self.written = 0
+        self.invalid = 0
+        self.errors: List[dict] = []
+        self.detail: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def record_error(self, row: int, detail: str):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "detail": detail})
+
+    @property
+    def records_per_second(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return round(self.processed / elapsed, 1) if elapsed > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "source_sha256": self.source_sha256,
+            "resumed_from": self.resumed_from,
+            "processed": self.processed,
+            "written": self.written,
+            "invalid": self.invalid,
+            "records_per_second": self.records_per_second,
+            "errors": self.errors,
+            "detail": self.detail,
+        }
+
+
+async def _iter_lines(path: str) -> AsyncIterator[str]:
+    """分塊讀取檔案並逐行產生"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async with aiofiles.open(path, "rb") as f:
+        while True:
+            chunk = await f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            buffer += decoder.decode(chunk)
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def _write_batch(collection, valid: List[Tuple[int, dict]], progress: ImportProgress):
+    """以 question_id upsert 一批題目"""
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"question_id": doc["question_id"]},
+            {"$set": {**doc, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+            upsert=True,
+        )
+        for _, doc in valid
+    ]
+    try:
+        await collection.bulk_write(operations, ordered=False)
+        progress.written += len(operations)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        for error in write_errors:
+            progress.record_error(valid[error["index"]][0], error.get("errmsg", "Write failed"))
+        progress.written += len(operations) - len(write_errors)
+
+
+async def import_questions(
+    path: str,
+    fmt: str,
+    collection,
+    pool: BoundedProcessPool,
+    checkpoint_dir: str,
+    progress: Optional[ImportProgress] = None,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    on_progress: Optional[Callable[[ImportProgress], None]] = None,
+) -> ImportProgress:
+    """匯入題庫檔案
+
+    驗證與寫入重疊進行：最多 2 × max_workers 批同時驗證，寫入依檔案順序進行，
+    每批寫入後更新檢查點。upsert 為冪等操作，從檢查點重做最後一批不會產生重複資料。
+    """
+    if progress is None:
+        progress = ImportProgress(uuid.uuid4().hex, await asyncio.to_thread(file_sha256, path))
+    checkpoint = ImportCheckpoint(checkpoint_dir, progress.source_sha256)
+    done = checkpoint.load()
+    progress.resumed_from = done
+    progress.status = "running"
+    progress.started_at = time.time()
+
+    in_flight = max(1, min(pool.max_workers * 2, pool.max_workers + pool.max_queue))
+    pending: Deque[Tuple[int, int, asyncio.Future]] = deque()
+
+    async def flush_oldest():
+        last_record, size, future = pending.popleft()
+        valid, errors = await future
+        for row_number, detail in errors:
+            progress.record_error(row_number, detail)
+        if valid:
+            await _write_batch(collection, valid, progress)
+        progress.processed += size
+        checkpoint.save(last_record)
+        if on_progress is not None:
+            on_progress(progress)
+
+    header: Optional[List[str]] = None
+    record_number = 0
+    batch: List[Tuple[int, str]] = []
+    try:
+        async for line in _iter_lines(path):
+            if not line.strip():
+                continue
+            if fmt == "csv" and header is None:
+                header = [name.strip() for name in next(csv.reader([line]))]
+                continue
+
+            record_number += 1
+            if record_number <= done:
+                continue
+            batch.append((record_number, line))
+            if len(batch) >= batch_size:
+                pending.append((record_number, len(batch), asyncio.ensure_future(
+                    pool.submit(validate_batch, fmt, header, batch)
+                )))
+                batch = []
+                if len(pending) >= in_flight:
+                    await flush_oldest()
+
+        if batch:
+            pending.append((record_number, len(batch), asyncio.ensure_future(
+                pool.submit(validate_batch, fmt, header, batch)
+            )))
+        while pending:
+            await flush_oldest()
+    except BaseException as e:
+        for _, _, future in pending:
+            future.cancel()
+        progress.status = "failed"
+        progress.detail = str(e) or type(e).__name__
+        progress.finished_at = time.time()
+        raise
+
+    checkpoint.clear()
+    progress.status = "completed"
+    progress.finished_at = time.time()
+    return progress
+
+
+async def _main():
+    import argparse
+
+    from backend.shared.database.mongodb import mongodb_manager
+
+    parser = argparse.ArgumentParser(description="匯入題庫（JSONL / CSV）")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("jsonl", "csv"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--checkpoint-dir", default=os.getenv("IMPORT_CHECKPOINT_DIR", "./uploads/import_checkpoints"))
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+    if fmt is None:
+        parser.error("無法判斷檔案格式，請指定 --format")
+
+    pool = BoundedProcessPool(name="question_import", max_workers=args.workers, max_queue=args.workers)
+    pool.start()
+    await mongodb_manager.connect()
+
+    def report(progress: ImportProgress):
+        print(
+            f"\r已處理 {progress.resumed_from + progress.processed} 筆，"
+            f"寫入 {progress.written}，無效 {progress.invalid}，"
+            f"{progress.records_per_second} 筆/秒",
+            end="", flush=True
+        )
+
+    try:
+        progress = await import_questions(
+            args.path, fmt, mongodb_manager.get_collection("questions"), pool,
+            args.checkpoint_dir, batch_size=args.batch_size, on_progress=report
+        )
+        print()
+        for error in progress.errors:
+            print(f"第 {error['row']} 筆: {error['detail']}")
+        print(f"匯入完成：寫入 {progress.written} 筆，無效 {progress.invalid} 筆，{progress.records_per_second} 筆/秒")
+    finally:
+        pool.shutdown()
+        await mongodb_manager.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
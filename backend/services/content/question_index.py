@@ -0,0 +1,297 @@
+"""
+題庫點陣圖索引
+每個過濾欄位的每個值各有一個點陣圖（以 Python int 表示），
+過濾條件以點陣圖交集 / 聯集求得，只有目前頁面的題目會被實體化
+"""
+
+import heapq
+import sys
+import uuid
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .pagination import seek_sorted
+
+# 建立點陣圖的欄位（tags 為多值欄位）
+FILTER_FIELDS = ("subject", "grade", "difficulty", "topic")
+TAG_FIELD = "tags"
+
+# Keyset 分頁的排序鍵，與 MongoDB 複合索引 (subject, grade, question_id) 一致
+SORT_FIELDS = ("subject", "grade", "question_id")
+
+
+def sort_key(doc: dict) -> Tuple[str, int, str]:
+    """題目的排序鍵（缺值以可比較的預設值代替）"""
+    grade = doc.get("grade")
+    return (doc.get("subject") or "", grade if grade is not None else -1, doc["question_id"])
+
+
+def _bitmap_from_slots(slots: Iterable[int]) -> int:
+    """由 slot 清單一次建立點陣圖（避免逐位元重建大整數）"""
+    slots = list(slots)
+    if not slots:
+        return 0
+    bits = bytearray(max(slots) // 8 + 1)
+    for slot in slots:
+        bits[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(bits, "little")
+
+
+def iter_set_bits(bitmap: int, skip: int = 0) -> Iterator[int]:
+    """由低到高列出點陣圖中為 1 的位置，先略過前 skip 個
+
+    以 64 位元字為單位掃描，整字 popcount 快速跳過 offset。
+    """
+    if bitmap <= 0:
+        return
+    nbytes = (bitmap.bit_length() + 63) // 64 * 8
+    words = memoryview(bitmap.to_bytes(nbytes, sys.byteorder)).cast("Q")
+    for i, word in enumerate(words):
+        if not word:
+            continue
+        if skip:
+            count = word.bit_count()
+            if skip >= count:
+                skip -= count
+                continue
+        base = i * 64
+        while word:
+            low = word & -word
+            if skip:
+                skip -= 1
+            else:
+                yield base + low.bit_length() - 1
+            word ^= low
+
+
+class QuestionIndex:
+    """題庫記憶體索引
+
+    題目以 slot 編號存放，刪除的 slot 會被重複使用；
+    每次異動都會遞增 version，供快取失效判斷。
+    """
+
+    # 位移分頁的順序取決於 slot 配置，不同程序間不可比較，故版本加上程序識別
+    _epoch = uuid.uuid4().hex[:8]
+
+    def __init__(self):
+        self._docs: List[Optional[dict]] = []
+        self._slots: Dict[str, int] = {}
+        self._object_ids: Dict[Any, str] = {}
+        self._free: List[int] = []
+        self._alive = 0
+        self._order: List[Tuple[str, int, str]] = []
+        self._postings: Dict[str, Dict[Any, int]] = {
+            field: {} for field in FILTER_FIELDS + (TAG_FIELD,)
+        }
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @property
+    def generation(self) -> str:
+        """索引版本識別（ETag 用）"""
+        return f"{self._epoch}.{self.version}"
+
+    @staticmethod
+    def _doc_values(doc: dict):
+        """列出題目在各欄位的值"""
+        for field in FILTER_FIELDS:
+            value = doc.get(field)
+            if value is not None:
+                yield field, value
+        for tag in set(doc.get(TAG_FIELD) or ()):
+            yield TAG_FIELD, tag
+
+    def build(self, docs: Iterable[dict]):
+        """以整批題目重建索引"""
+        self._docs = []
+        self._slots = {}
+        self._object_ids = {}
+        self._free = []
+        slot_lists: Dict[str, Dict[Any, List[int]]] = {
+            field: {} for field in self._postings
+        }
+
+        for doc in docs:
+            question_id = doc["question_id"]
+            if question_id in self._slots:
+                slot = self._slots[question_id]
+            else:
+                slot = len(self._docs)
+                self._docs.append(None)
+                self._slots[question_id] = slot
+            self._docs[slot] = self._store(doc)
+
+        for slot, doc in enumerate(self._docs):
+            for field, value in self._doc_values(doc):
+                slot_lists[field].setdefault(value, []).append(slot)
+
+        self._postings = {
+            field: {value: _bitmap_from_slots(slots) for value, slots in values.items()}
+            for field, values in slot_lists.items()
+        }
+        self._alive = _bitmap_from_slots(range(len(self._docs)))
+        self._order = sorted(sort_key(doc) for doc in self._docs)
+        self.version += 1
+
+    def _store(self, doc: dict) -> dict:
+        """保存題目（_id 僅用於對應刪除事件）"""
+        doc = dict(doc)
+        object_id = doc.pop("_id", None)
+        if object_id is not None:
+            self._object_ids[object_id] = doc["question_id"]
+        return doc
+
+    def _unlink(self, slot: int, doc: dict):
+        key = sort_key(doc)
+        position = bisect_left(self._order, key)
+        if position < len(self._order) and self._order[position] == key:
+            del self._order[position]
+
+        mask = ~(1 << slot)
+        for field, value in self._doc_values(doc):
+            postings = self._postings[field]
+            remaining = postings.get(value, 0) & mask
+            if remaining:
+                postings[value] = remaining
+            else:
+                postings.pop(value, None)
+
+    def upsert(self, doc: dict) -> int:
+        """新增或更新題目，返回 slot"""
+        question_id = doc["question_id"]
+        slot = self._slots.get(question_id)
+        if slot is None:
+            slot = self._free.pop() if self._free else len(self._docs)
+            if slot == len(self._docs):
+                self._docs.append(None)
+            self._slots[question_id] = slot
+            self._alive |= 1 << slot
+        else:
+            self._unlink(slot, self._docs[slot])
+
+        stored = self._store(doc)
+        self._docs[slot] = stored
+        insort(self._order, sort_key(stored))
+        bit = 1 << slot
+        for field, value in self._doc_values(stored):
+            postings = self._postings[field]
+            postings[value] = postings.get(value, 0) | bit
+
+        self.version += 1
+        return slot
+
+    def remove(self, question_id: str) -> Optional[int]:
+        """刪除題目，返回原本的 slot"""
+        slot = self._slots.pop(question_id, None)
+        if slot is None:
+            return None
+        self._unlink(slot, self._docs[slot])
+        self._docs[slot] = None
+        self._alive &= ~(1 << slot)
+        self._free.append(slot)
+        self.version += 1
+        return slot
+
+    def question_id_for(self, object_id: Any) -> Optional[str]:
+        """由 Mongo _id 取得 question_id"""
+        return self._object_ids.get(object_id)
+
+    def object_ids(self) -> List[Any]:
+        """目前題目的 Mongo _id"""
+        # 同一題目重新建立時 _id 會改變，以最後一次對應為準
+        current = {question_id: object_id for object_id, question_id in self._object_ids.items()}
+        return [object_id for question_id, object_id in current.items() if question_id in self._slots]
+
+    def get(self, question_id: str) -> Optional[dict]:
+        slot = self._slots.get(question_id)
+        return self._docs[slot] if slot is not None else None
+
+    def items(self) -> Iterator[Tuple[int, dict]]:
+        """列出所有 (slot, 題目)"""
+        for slot, doc in enumerate(self._docs):
+            if doc is not None:
+                yield slot, doc
+
+    def slot_of(self, question_id: str) -> Optional[int]:
+        return self._slots.get(question_id)
+
+    def doc_at(self, slot: int) -> Optional[dict]:
+        return self._docs[slot] if 0 <= slot < len(self._docs) else None
+
+    def query(
+        self,
+        subject: Optional[str] = None,
+        grade: Optional[int] = None,
+        difficulty: Optional[str] = None,
+        topic: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        tag_mode: str = "all",
+    ) -> int:
+        """以過濾條件求出符合題目的點陣圖
+
+        tag_mode 為 "all" 時需同時具備所有標籤，"any" 時具備任一標籤即可。
+        """
+        bitmap = self._alive
+        for field, value in (
+            ("subject", subject),
+            ("grade", grade),
+            ("difficulty", difficulty),
+            ("topic", topic),
+        ):
+            if value is not None:
+                bitmap &= self._postings[field].get(value, 0)
+                if not bitmap:
+                    return 0
+
+        if tags:
+            tag_postings = self._postings[TAG_FIELD]
+            if tag_mode == "any":
+                union = 0
+                for tag in tags:
+                    union |= tag_postings.get(tag, 0)
+                bitmap &= union
+            else:
+                for tag in tags:
+                    bitmap &= tag_postings.get(tag, 0)
+                    if not bitmap:
+                        return 0
+
+        return bitmap
+
+    def page(self, bitmap: int, offset: int, limit: int) -> List[dict]:
+        """只實體化指定頁面的題目"""
+        docs = []
+        for slot in iter_set_bits(bitmap, skip=offset):
+            docs.append(self._docs[slot])
+            if len(docs) >= limit:
+                break
+        return docs
+
+    @staticmethod
+    def count(bitmap: int) -> int:
+        return bitmap.bit_count()
+
+    def seek(self, bitmap: int, after: Optional[Tuple[Any, ...]], limit: int) -> List[dict]:
+        """Keyset 分頁：依排序鍵取出 after 之後前 limit 個符合的題目"""
+        if not bitmap:
+            return []
+
+        start = bisect_right(self._order, after) if after is not None else 0
+        if bitmap.bit_count() * 16 < len(self._order) - start:
+            # 符合的題目遠少於待掃描範圍時，直接取出後部分排序
+            keyed = [(sort_key(self._docs[slot]), slot) for slot in iter_set_bits(bitmap)]
+            if after is not None:
+                keyed = [item for item in keyed if item[0] > after]
+            return [self._docs[slot] for _, slot in heapq.nsmallest(limit, keyed)]
+
+        bits = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+
+        def matches(position: int) -> bool:
+            slot = self._slots[self._order[position][2]]
+            return (slot >> 3) < len(bits) and bool(bits[slot >> 3] >> (slot & 7) & 1)
+
+        positions = seek_sorted(self._order, after, matches, limit)
+        return [self._docs[self._slots[self._order[position][2]]] for position in positions]
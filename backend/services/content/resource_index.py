@@ -0,0 +1,183 @@
+"""
+學習資源關聯索引
+維護 (subject, topic) / 標籤 / 題目 -> 資源的對應，
+錯題相關資源依「明確連結 > 同單元 > 標籤重疊」排序，結果依題目快取
+"""
+
+import uuid
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# 排序權重
+LINK_SCORE = 100
+TOPIC_SCORE = 10
+TAG_SCORE = 1
+
+# 每題最多返回的相關資源數（快取保留完整排序，過濾後才截斷）
+MAX_RELATED = 50
+
+
+def resource_sort_key(resource: dict) -> Tuple[str, str, str]:
+    """學習資源排序鍵，與 MongoDB 複合索引 (subject, topic, resource_id) 一致"""
+    return (resource.get("subject") or "", resource.get("topic") or "", resource["resource_id"])
+
+
+class ResourceIndex:
+    """學習資源記憶體索引"""
+
+    _epoch = uuid.uuid4().hex[:8]
+
+    def __init__(self):
+        self._resources: Dict[str, dict] = {}
+        self._object_ids: Dict[Any, str] = {}
+        self._by_topic: Dict[Tuple[str, str], Set[str]] = {}
+        self._by_tag: Dict[str, Set[str]] = {}
+        self._by_question: Dict[str, Set[str]] = {}
+        self._order: List[Tuple[str, str, str]] = []
+        self._related: Dict[str, List[str]] = {}
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._resources)
+
+    @property
+    def generation(self) -> str:
+        """索引版本識別（ETag 用）"""
+        return f"{self._epoch}.{self.version}"
+
+    @staticmethod
+    def _postings(resource: dict):
+        """列出資源所屬的 (對照表名稱, 鍵)"""
+        subject, topic = resource.get("subject"), resource.get("topic")
+        if subject and topic:
+            yield "_by_topic", (subject, topic)
+        for tag in set(resource.get("tags") or ()):
+            yield "_by_tag", tag
+        for question_id in set(resource.get("question_ids") or ()):
+            yield "_by_question", question_id
+
+    def _link(self, resource: dict):
+        resource_id = resource["resource_id"]
+        for table, key in self._postings(resource):
+            getattr(self, table).setdefault(key, set()).add(resource_id)
+        insort(self._order, resource_sort_key(resource))
+
+    def _unlink(self, resource: dict):
+        resource_id = resource["resource_id"]
+        for table, key in self._postings(resource):
+            postings = getattr(self, table)
+            ids = postings.get(key)
+            if ids is not None:
+                ids.discard(resource_id)
+                if not ids:
+                    del postings[key]
+        key = resource_sort_key(resource)
+        position = bisect_left(self._order, key)
+        if position < len(self._order) and self._order[position] == key:
+            del self._order[position]
+
+    def _store(self, resource: dict) -> dict:
+        resource = dict(resource)
+        object_id = resource.pop("_id", None)
+        if object_id is not None:
+            self._object_ids[object_id] = resource["resource_id"]
+        return resource
+
+    def _changed(self):
+        # 資源異動很少，直接清空各題的排序結果
+        self._related.clear()
+        self.version += 1
+
+    def build(self, resources: Iterable[dict]):
+        """以整批資源重建索引"""
+        self._resources = {}
+        self._object_ids = {}
+        self._by_topic = {}
+        self._by_tag = {}
+        self._by_question = {}
+        self._order = []
+        for resource in resources:
+            stored = self._store(resource)
+            self._resources[stored["resource_id"]] = stored
+        for resource in self._resources.values():
+            for table, key in self._postings(resource):
+                getattr(self, table).setdefault(key, set()).add(resource["resource_id"])
+        self._order = sorted(resource_sort_key(resource) for resource in self._resources.values())
+        self._changed()
+
+    def upsert(self, resource: dict):
+        """新增或更新資源"""
+        previous = self._resources.get(resource["resource_id"])
+        if previous is not None:
+            self._unlink(previous)
+        stored = self._store(resource)
+        self._resources[stored["resource_id"]] = stored
+        self._link(stored)
+        self._changed()
+
+    def remove(self, resource_id: str) -> Optional[dict]:
+        """刪除資源"""
+        resource = self._resources.pop(resource_id, None)
+        if resource is None:
+            return None
+        self._unlink(resource)
+        self._changed()
+        return resource
+
+    def forget_question(self, question_id: str):
+        """題目異動時丟棄其排序結果"""
+        self._related.pop(question_id, None)
+
+    def forget_questions(self):
+        """題庫重建時丟棄所有排序結果"""
+        self._related.clear()
+
+    def resource_id_for(self, object_id: Any) -> Optional[str]:
+        """由 Mongo _id 取得 resource_id"""
+        return self._object_ids.get(object_id)
+
+    def object_ids(self) -> List[Any]:
+        """目前資源的 Mongo _id"""
+        # 同一資源重新建立時 _id 會改變，以最後一次對應為準
+        current = {resource_id: object_id for object_id, resource_id in self._object_ids.items()}
+        return [object_id for resource_id, object_id in current.items() if resource_id in self._resources]
+
+    def get(self, resource_id: str) -> Optional[dict]:
+        return self._resources.get(resource_id)
+
+    def related(self, question: dict) -> List[str]:
+        """題目的全部相關資源 ID（依關聯度排序，未截斷，由呼叫端過濾後取前 MAX_RELATED 筆）"""
+        question_id = question["question_id"]
+        ranked = self._related.get(question_id)
+        if ranked is not None:
+            return ranked
+
+        subject = question.get("subject")
+        scores: Dict[str, int] = {}
+        for resource_id in self._by_question.get(question_id, ()):
+            scores[resource_id] = LINK_SCORE
+        for resource_id in self._by_topic.get((subject, question.get("topic")), ()):
+            scores[resource_id] = scores.get(resource_id, 0) + TOPIC_SCORE
+        for tag in set(question.get("tags") or ()):
+            for resource_id in self._by_tag.get(tag, ()):
+                # 標籤相同但科目不同的資源不列入
+                resource_subject = self._resources[resource_id].get("subject")
+                if resource_subject and subject and resource_subject != subject:
+                    continue
+                scores[resource_id] = scores.get(resource_id, 0) + TAG_SCORE
+
+        ranked = sorted(scores, key=lambda resource_id: (-scores[resource_id], resource_id))
+        self._related[question_id] = ranked
+        return ranked
+
+    def candidates(self, subject: Optional[str] = None, topic: Optional[str] = None) -> List[dict]:
+        """依排序鍵列出資源；指定科目與單元時直接查表"""
+        if subject and topic:
+            ids = self._by_topic.get((subject, topic), ())
+            return sorted((self._resources[resource_id] for resource_id in ids), key=resource_sort_key)
+        return [self._resources[key[2]] for key in self._order]
+
+    @property
+    def order(self) -> List[Tuple[str, str, str]]:
+        """所有資源的排序鍵（已排序）"""
+        return self._order
@@ -0,0 +1,120 @@
+"""
+列表回應快取
+依「資料版本 + 正規化查詢字串」快取序列化後（可選壓縮）的回應內容，
+並以同一組鍵產生 ETag 支援 If-None-Match / 304
+"""
+
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli 為選用套件
+    brotli = None
+
+MIN_COMPRESS_SIZE = 1024
+
+
+def normalize_query(request: Request) -> str:
+    """排序後的查詢字串，讓參數順序不同的相同查詢共用快取"""
+    return urlencode(sorted(request.query_params.multi_items()))
+
+
+def make_etag(kind: str, version: str, query: str) -> str:
+    digest = hashlib.sha1(f"{kind}\0{version}\0{query}".encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """檢查 If-None-Match 是否符合（弱比較）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+class CachedBody:
+    """已序列化的回應內容"""
+
+    def __init__(self, etag: str, body: bytes, headers: Dict[str, str]):
+        self.etag = etag
+        self.body = body
+        self.headers = headers
+        self.gzip: Optional[bytes] = None
+        self.brotli: Optional[bytes] = None
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.gzip = gzip.compress(body, compresslevel=6)
+            if brotli is not None:
+                self.brotli = brotli.compress(body, quality=5)
+
+
+class ResponseCache:
+    """有界 LRU 回應快取，資料版本變動時該類別的項目全部失效"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], CachedBody]" = OrderedDict()
+        self._versions: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _invalidate_if_changed(self, kind: str, version: str):
+        if self._versions.get(kind) != version:
+            self._versions[kind] = version
+            for key in [key for key in self._entries if key[0] == kind]:
+                del self._entries[key]
+
+    def get(self, kind: str, version: str, query: str) -> Optional[CachedBody]:
+        self._invalidate_if_changed(kind, version)
+        entry = self._entries.get((kind, query))
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end((kind, query))
+        self.hits += 1
+        return entry
+
+    def put(self, kind: str, version: str, query: str, body: bytes, headers: Optional[Dict[str, str]] = None) -> CachedBody:
+        self._invalidate_if_changed(kind, version)
+        entry = CachedBody(make_etag(kind, version, query), body, headers or {})
+        self._entries[(kind, query)] = entry
+        self._entries.move_to_end((kind, query))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def cached_response(entry: CachedBody, request: Request) -> Response:
+    """依 Accept-Encoding 回傳快取內容"""
+    accept_encoding = request.headers.get("accept-encoding", "")
+    headers = {
+        **entry.headers,
+        "ETag": entry.etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+
+    body = entry.body
+    if entry.brotli is not None and "br" in accept_encoding:
+        body = entry.brotli
+        headers["Content-Encoding"] = "br"
+    elif entry.gzip is not None and "gzip" in accept_encoding:
+        body = entry.gzip
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,19 @@
+"""
+內容服務共用的 Pydantic 模型
+題目模型同時供 API 回應與批次匯入驗證使用，匯入子程序只需匯入本模組，不必載入服務主程式
+"""
+
+from typing import List
+
+from pydantic import BaseModel
+
+
+class QuestionResponse(BaseModel):
+    question_id: str
+    content: str
+    type: str
+    subject: str
+    grade: int
+    difficulty: str
+    topic: str
+    tags: List[str]
@@ -0,0 +1,277 @@
+"""
+題目全文檢索
+中文以字元二元組（單字詞則為單字）、英數以整詞切分，建立以題庫索引 slot 為鍵的倒排索引，
+以 BM25 排序；過濾條件沿用題庫點陣圖，題目異動時增量更新
+"""
+
+import heapq
+import math
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .question_index import iter_set_bits
+
+_TOKEN_PATTERN = re.compile(r"[㐀-䶿一-鿿豈-﫿]+|[a-z0-9]+")
+
+# BM25 參數
+K1 = 1.2
+B = 0.75
+
+# 單次查詢最多逐筆掃描的 posting 數；超過時常見詞只更新既有候選或改用高分前段
+# （有過濾條件且前段過濾後不足 limit 筆時，改為帶過濾條件掃描整個 posting 取前段）
+POSTING_BUDGET = 30000
+IMPACT_PREFIX = 5000
+
+# 過濾後題目數少於此值時改為逐題計分
+FILTER_SCAN_LIMIT = 3000
+
+
+def tokenize(text: str) -> List[str]:
+    """切詞：中文二元組、英數整詞（先做 NFKC 正規化，全形轉半形）"""
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", text).lower()):
+        if run[0] <= "z":
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def document_tokens(doc: dict) -> List[str]:
+    """題目的索引詞（題目內容與標籤）"""
+    tokens = tokenize(doc.get("content") or "")
+    for tag in doc.get("tags") or ():
+        tokens.extend(tokenize(tag))
+    return tokens
+
+
+def _allows(allowed: bytes, slot: int) -> bool:
+    """slot 是否在過濾點陣圖（little-endian 位元組）內"""
+    return (slot >> 3) < len(allowed) and bool(allowed[slot >> 3] >> (slot & 7) & 1)
+
+
+class _Postings:
+    """單一詞的 posting：依 slot 排序的 slot / 詞頻陣列"""
+
+    __slots__ = ("slots", "tfs", "version")
+
+    def __init__(self):
+        self.slots = array("I")
+        self.tfs = array("H")
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def add(self, slot: int, tf: int):
+        position = bisect_left(self.slots, slot)
+        if position < len(self.slots) and self.slots[position] == slot:
+            self.tfs[position] = min(tf, 65535)
+        else:
+            self.slots.insert(position, slot)
+            self.tfs.insert(position, min(tf, 65535))
+        self.version += 1
+
+    def discard(self, slot: int):
+        position = bisect_left(self.slots, slot)
+        if position < len(self.slots) and self.slots[position] == slot:
+            del self.slots[position]
+            del self.tfs[position]
+            self.version += 1
+
+    def tf(self, slot: int) -> int:
+        position = bisect_left(self.slots, slot)
+        if position < len(self.slots) and self.slots[position] == slot:
+            return self.tfs[position]
+        return 0
+
+
+class SearchIndex:
+    """BM25 倒排索引（slot 與 QuestionIndex 一致）"""
+
+    def __init__(self):
+        self._postings: Dict[str, _Postings] = {}
+        self._lengths = array("I")
+        self._docs = 0
+        self._total_length = 0
+        self._impacts: Dict[str, Tuple[int, List[Tuple[int, int]]]] = {}
+
+    def __len__(self) -> int:
+        return self._docs
+
+    def build(self, items: Iterable[Tuple[int, dict]]):
+        """以 (slot, 題目) 整批重建"""
+        self._postings = {}
+        self._lengths = array("I")
+        self._docs = 0
+        self._total_length = 0
+        self._impacts = {}
+        postings_map = self._postings
+        for slot, doc in sorted(items, key=itemgetter(0)):
+            tokens = document_tokens(doc)
+            self._set_length(slot, len(tokens))
+            # 依 slot 遞增處理，可直接附加；同詞重複出現時累加最後一筆的詞頻
+            for term in tokens:
+                postings = postings_map.get(term)
+                if postings is None:
+                    postings = postings_map[term] = _Postings()
+                slots = postings.slots
+                if slots and slots[-1] == slot:
+                    if postings.tfs[-1] < 65535:
+                        postings.tfs[-1] += 1
+                else:
+                    slots.append(slot)
+                    postings.tfs.append(1)
+
+        # 預先計算常見詞的高分前段，避免首次查詢延遲
+        for term, postings in postings_map.items():
+            if len(postings) > POSTING_BUDGET:
+                self._impact_prefix(term)
+
+    def _set_length(self, slot: int, length: int):
+        if slot >= len(self._lengths):
+            self._lengths.extend([0] * (slot + 1 - len(self._lengths)))
+        previous = self._lengths[slot]
+        if previous == 0 and length > 0:
+            self._docs += 1
+        elif previous > 0 and length == 0:
+            self._docs -= 1
+        self._total_length += length - previous
+        self._lengths[slot] = length
+
+    def update(self, slot: int, previous: Optional[dict], doc: dict):
+        """題目新增或更新（previous 為更新前內容）"""
+        if previous is not None:
+            self.remove(slot, previous)
+        tokens = document_tokens(doc)
+        self._set_length(slot, len(tokens))
+        for term, tf in Counter(tokens).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = _Postings()
+            postings.add(slot, tf)
+
+    def remove(self, slot: int, doc: dict):
+        """移除題目（需傳入原本內容以找出索引詞）"""
+        for term in set(document_tokens(doc)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.discard(slot)
+            if not postings:
+                del self._postings[term]
+                self._impacts.pop(term, None)
+        self._set_length(slot, 0)
+
+    def _scorer(self, term: str):
+        """返回該詞的 BM25 計分函式 (tf, 文件長度) -> 分數"""
+        df = len(self._postings[term])
+        idf = math.log(1 + (self._docs - df + 0.5) / (df + 0.5))
+        avgdl = self._total_length / self._docs if self._docs else 1.0
+        norm = K1 / avgdl * B
+        base = K1 * (1 - B)
+        factor = idf * (K1 + 1)
+
+        def score(tf: int, length: int) -> float:
+            return factor * tf / (tf + base + norm * length)
+
+        return score
+
+    def _impact_prefix(self, term: str) -> List[Tuple[int, int]]:
+        """常見詞中單詞分數最高的前段 (slot, tf)，依詞的版本快取"""
+        postings = self._postings[term]
+        cached = self._impacts.get(term)
+        if cached is not None and cached[0] == postings.version:
+            return cached[1]
+        lengths = self._lengths
+        # 同一詞內 BM25 分數隨 tf 遞增、隨文件長度遞減，以 tf / 長度排序即可
+        prefix = heapq.nlargest(
+            IMPACT_PREFIX,
+            zip(postings.slots, postings.tfs),
+            key=lambda item: item[1] / (lengths[item[0]] or 1),
+        )
+        self._impacts[term] = (postings.version, prefix)
+        return prefix
+
+    def _filtered_impact_prefix(self, term: str, allowed: bytes, limit: int) -> List[Tuple[int, int]]:
+        """常見詞在過濾條件內分數最高的前段
+
+        高分前段是全體題目中該詞分數最高者，過濾後仍有 limit 筆即為過濾範圍內的前 limit 名；
+        不足時前段之外仍可能有符合條件的題目，改為邊掃描 posting 邊過濾。
+        """
+        prefix = [(slot, tf) for slot, tf in self._impact_prefix(term) if _allows(allowed, slot)]
+        postings = self._postings[term]
+        if len(prefix) >= limit or len(postings) <= IMPACT_PREFIX:
+            return prefix
+        lengths = self._lengths
+        return heapq.nlargest(
+            IMPACT_PREFIX,
+            ((slot, tf) for slot, tf in zip(postings.slots, postings.tfs) if _allows(allowed, slot)),
+            key=lambda item: item[1] / (lengths[item[0]] or 1),
+        )
+
+    def search(self, query: str, bitmap: Optional[int] = None, limit: int = 20) -> List[Tuple[int, float]]:
+        """查詢，返回依分數排序的 (slot, score)
+
+        bitmap 為 QuestionIndex.query() 的過濾結果（None 表示不過濾）。
+        """
+        terms = [term for term in set(tokenize(query)) if term in self._postings]
+        if not terms or bitmap == 0 or limit <= 0:
+            return []
+        terms.sort(key=lambda term: len(self._postings[term]))
+        scorers = {term: self._scorer(term) for term in terms}
+        lengths = self._lengths
+
+        allowed = None
+        if bitmap is not None:
+            filtered = bitmap.bit_count()
+            if filtered <= FILTER_SCAN_LIMIT and filtered < sum(len(self._postings[t]) for t in terms):
+                # 過濾條件很嚴格：逐題計分
+                scores = []
+                for slot in iter_set_bits(bitmap):
+                    total = 0.0
+                    for term in terms:
+                        tf = self._postings[term].tf(slot)
+                        if tf:
+                            total += scorers[term](tf, lengths[slot])
+                    if total:
+                        scores.append((slot, total))
+                return heapq.nlargest(limit, scores, key=itemgetter(1))
+            allowed = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+
+        accumulators: Dict[int, float] = {}
+        budget = POSTING_BUDGET
+        for term in terms:
+            postings = self._postings[term]
+            score = scorers[term]
+            if len(postings) <= budget:
+                entries = zip(postings.slots, postings.tfs)
+            elif not accumulators:
+                entries = (
+                    self._impact_prefix(term) if allowed is None
+                    else self._filtered_impact_prefix(term, allowed, limit)
+                )
+            else:
+                # 常見詞只為既有候選加分
+                for slot in accumulators:
+                    tf = postings.tf(slot)
+                    if tf:
+                        accumulators[slot] += score(tf, lengths[slot])
+                continue
+
+            scanned = 0
+            for slot, tf in entries:
+                scanned += 1
+                if allowed is not None and not _allows(allowed, slot):
+                    continue
+                accumulators[slot] = accumulators.get(slot, 0.0) + score(tf, lengths[slot])
+            budget -= scanned
+
+        return heapq.nlargest(limit, accumulators.items(), key=itemgetter(1))
@@ -0,0 +1,202 @@
+"""
+串流上傳處理
+直接解析請求串流中的 multipart 內容並分塊寫入 UPLOAD_DIR，
+寫入同時計算 SHA-256，超過大小限制時立即中止，單一上傳的記憶體用量固定
+"""
+
+import hashlib
+import os
+import uuid
+from typing import Dict, List, Tuple
+
+import aiofiles
+import aiofiles.os
+import multipart
+from fastapi import HTTPException, Request, status
+from multipart.multipart import parse_options_header
+
+DEFAULT_MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+
+
+def parse_size_limits(raw: str) -> Dict[str, int]:
+    """解析 "video/mp4=524288000,video/avi=524288000" 格式的個別類型大小限制"""
+    limits = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        content_type, size = item.split("=", 1)
+        limits[content_type.strip().lower()] = int(size.strip())
+    return limits
+
+
+class UploadLimits:
+    """上傳類型與大小限制"""
+
+    def __init__(self, allowed_types: set, default_max_size: int, per_type: Dict[str, int]):
+        self.allowed_types = allowed_types
+        self.default_max_size = default_max_size
+        self.per_type = per_type
+
+    def max_size_for(self, content_type: str) -> int:
+        return self.per_type.get(content_type, self.default_max_size)
+
+    @property
+    def largest(self) -> int:
+        return max([self.default_max_size, *self.per_type.values()])
+
+
+class StoredUpload:
+    """已寫入暫存檔的上傳檔案"""
+
+    def __init__(self, temp_path: str, filename: str, content_type: str, size: int, sha256: str):
+        self.temp_path = temp_path
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self.sha256 = sha256
+
+
+def _size_label(size: int) -> str:
+    return f"{size // (1024 * 1024)}MB" if size >= 1024 * 1024 else f"{size} bytes"
+
+
+class _PartState:
+    def __init__(self):
+        self.header_field = b""
+        self.header_value = b""
+        self.headers: Dict[bytes, bytes] = {}
+
+
+async def receive_upload(
+    request: Request,
+    upload_dir: str,
+    limits: UploadLimits,
+    field_name: str = "file",
+) -> StoredUpload:
+    """串流接收 multipart 上傳中名為 field_name 的檔案欄位"""
+    content_type_header = request.headers.get("content-type", "")
+    media_type, params = parse_options_header(content_type_header)
+    if media_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Request must be multipart/form-data"
+        )
+
+    # 整個請求已超過最大限制時不必讀取內容
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limits.largest + 64 * 1024:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File size exceeds {_size_label(limits.largest)} limit"
+        )
+
+    temp_dir = os.path.join(upload_dir, "tmp")
+    await aiofiles.os.makedirs(temp_dir, exist_ok=True)
+
+    # 解析器的回呼是同步的，先收集事件再以非同步方式寫檔
+    events: List[Tuple[str, bytes]] = []
+    part = _PartState()
+
+    def on_part_begin():
+        nonlocal part
+        part = _PartState()
+
+    def on_header_field(data: bytes, start: int, end: int):
+        part.header_field += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        part.header_value += data[start:end]
+
+    def on_header_end():
+        part.headers[part.header_field.lower()] = part.header_value
+        part.header_field = b""
+        part.header_value = b""
+
+    def on_headers_finished():
+        events.append(("headers", b""))
+
+    def on_part_data(data: bytes, start: int, end: int):
+        events.append(("data", data[start:end]))
+
+    def on_part_end():
+        events.append(("end", b""))
+
+    parser = multipart.MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    temp_path = os.path.join(temp_dir, uuid.uuid4().hex)
+    digest = hashlib.sha256()
+    out = None
+    writing = False
+    done = False
+    size = 0
+    max_size = limits.default_max_size
+    filename = ""
+    file_type = ""
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+
+            for kind, data in events:
+                if kind == "headers":
+                    _, disposition = parse_options_header(part.headers.get(b"content-disposition", b""))
+                    writing = (
+                        not done
+                        and disposition.get(b"name", b"").decode("utf-8", "replace") == field_name
+                        and b"filename" in disposition
+                    )
+                    if not writing:
+                        continue
+
+                    filename = os.path.basename(disposition[b"filename"].decode("utf-8", "replace"))
+                    file_type = part.headers.get(b"content-type", b"application/octet-stream").decode("latin-1").lower()
+                    if file_type not in limits.allowed_types:
+                        raise HTTPException(
+                            status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"File type {file_type} not allowed"
+                        )
+                    max_size = limits.max_size_for(file_type)
+                    out = await aiofiles.open(temp_path, "wb")
+
+                elif kind == "data" and writing:
+                    size += len(data)
+                    if size > max_size:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"File size exceeds {_size_label(max_size)} limit"
+                        )
+                    digest.update(data)
+                    await out.write(data)
+
+                elif kind == "end" and writing:
+                    writing = False
+                    done = True
+            events.clear()
+
+        parser.finalize()
+    except BaseException:
+        if out is not None:
+            await out.close()
+            out = None
+        if os.path.exists(temp_path):
+            await aiofiles.os.remove(temp_path)
+        raise
+    finally:
+        if out is not None:
+            await out.close()
+
+    if not done:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Missing file field '{field_name}'"
+        )
+
+    return StoredUpload(temp_path, filename, file_type, size, digest.hexdigest())
@@ -0,0 +1,212 @@
+"""
+答案鍵查詢
+以 question_id 為鍵保存預先正規化的正確答案與解析，
+查詢順序：程序內快取（TTL）→ Redis 雜湊 → MongoDB questions → 模擬題庫；
+題庫版本（Redis question_bank:version）變動時程序內快取整批失效，Redis 雜湊依版本分開存放，
+偵測到版本變動時即刪除前一版本的雜湊
+"""
+
+import json
+import re
+import time
+import unicodedata
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from backend.shared.database.redis_client import QUESTION_BANK_VERSION_KEY
+
+_WHITESPACE = re.compile(r"\s+")
+
+ANSWER_KEY_HASH_PREFIX = "answer_keys:"
+
+ANSWER_KEY_PROJECTION = {
+    "_id": 0, "question_id": 1, "correct_answer": 1, "explanation": 1, "subject": 1, "topic": 1
+}
+
+
+def normalize_answer(answer: str) -> str:
+    """答案正規化：全形轉半形、去除前後空白、轉小寫、連續空白合併"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", answer).strip().lower())
+
+
+class AnswerKey:
+    """單一題目的答案鍵"""
+
+    __slots__ = ("question_id", "correct_answer", "normalized", "explanation", "subject", "topic")
+
+    def __init__(
+        self,
+        question_id: str,
+        correct_answer: str,
+        explanation: str = "",
+        subject: Optional[str] = None,
+        topic: Optional[str] = None,
+    ):
+        self.question_id = question_id
+        self.correct_answer = correct_answer
+        self.normalized = normalize_answer(correct_answer)
+        self.explanation = explanation or ""
+        self.subject = subject
+        self.topic = topic
+
+    @classmethod
+    def from_question(cls, question: dict) -> Optional["AnswerKey"]:
+        if not question.get("correct_answer"):
+            return None
+        return cls(
+            question["question_id"],
+            str(question["correct_answer"]),
+            question.get("explanation") or "",
+            question.get("subject"),
+            question.get("topic"),
+        )
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "question_id": self.question_id,
+            "correct_answer": self.correct_answer,
+            "explanation": self.explanation,
+            "subject": self.subject,
+            "topic": self.topic,
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "AnswerKey":
+        return cls(**json.loads(raw))
+
+    def is_correct(self, user_answer: str) -> bool:
+        return normalize_answer(user_answer) == self.normalized
+
+
+class AnswerKeyStore:
+    """答案鍵多層快取"""
+
+    def __init__(
+        self,
+        redis_client_getter: Callable,
+        collection_getter: Callable,
+        fallback_questions: Iterable[dict] = (),
+        ttl: float = 300.0,
+        miss_ttl: float = 30.0,
+        version_check_interval: float = 2.0,
+        redis_ttl: int = 86400,
+        max_entries: int = 100000,
+    ):
+        self._redis_client_getter = redis_client_getter
+        self._collection_getter = collection_getter
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.version_check_interval = version_check_interval
+        self.redis_ttl = redis_ttl
+        self.max_entries = max_entries
+        self._local: Dict[str, Tuple[Optional[AnswerKey], float]] = {}
+        self._version = "0"
+        self._version_checked_at = 0.0
+        self._fallback: Dict[str, AnswerKey] = {}
+        for question in fallback_questions:
+            key = AnswerKey.from_question(question)
+            if key is not None:
+                self._fallback[key.question_id] = key
+
+    def _redis(self):
+        try:
+            return self._redis_client_getter()
+        except Exception:
+            return None
+
+    def _collection(self):
+        try:
+            return self._collection_getter()
+        except Exception:
+            return None
+
+    def _refresh_version(self, now: float):
+        """定期檢查題庫版本，變動時清空程序內快取並刪除前一版本的 Redis 雜湊"""
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            version = client.get(QUESTION_BANK_VERSION_KEY) or "0"
+        except Exception:
+            return
+        if version != self._version:
+            previous, self._version = self._version, version
+            self._local.clear()
+            try:
+                client.delete(f"{ANSWER_KEY_HASH_PREFIX}{previous}")
+            except Exception:
+                pass
+
+    async def get(self, question_id: str) -> Optional[AnswerKey]:
+        return (await self.get_many([question_id])).get(question_id)
+
+    async def get_many(self, question_ids: List[str]) -> Dict[str, AnswerKey]:
+        """批次查詢答案鍵，找不到的題目不會出現在結果中"""
+        now = time.monotonic()
+        self._refresh_version(now)
+
+        found: Dict[str, AnswerKey] = {}
+        missing = []
+        for question_id in dict.fromkeys(question_ids):
+            entry = self._local.get(question_id)
+            if entry is not None and entry[1] > now:
+                if entry[0] is not None:
+                    found[question_id] = entry[0]
+            else:
+                missing.append(question_id)
+        if not missing:
+            return found
+
+        loaded: Dict[str, AnswerKey] = {}
+        redis_key = f"{ANSWER_KEY_HASH_PREFIX}{self._version}"
+        client = self._redis()
+        if client is not None:
+            try:
+                for question_id, raw in zip(missing, client.hmget(redis_key, missing)):
+                    if raw:
+                        loaded[question_id] = AnswerKey.from_json(raw)
+            except Exception:
+                client = None
+
+        remaining = [question_id for question_id in missing if question_id not in loaded]
+        from_source: Dict[str, AnswerKey] = {}
+        collection = self._collection() if remaining else None
+        if collection is not None:
+            try:
+                async for question in collection.find(
+                    {"question_id": {"$in": remaining}}, ANSWER_KEY_PROJECTION
+                ):
+                    key = AnswerKey.from_question(question)
+                    if key is not None:
+                        from_source[key.question_id] = key
+            except Exception as e:
+                print(f"答案鍵查詢 MongoDB 失敗: {e}")
+        for question_id in remaining:
+            if question_id not in from_source and question_id in self._fallback:
+                from_source[question_id] = self._fallback[question_id]
+
+        if from_source and client is not None:
+            try:
+                pipe = client.pipeline()
+                pipe.hset(redis_key, mapping={qid: key.to_json() for qid, key in from_source.items()})
+                pipe.expire(redis_key, self.redis_ttl)
+                pipe.execute()
+            except Exception:
+                pass
+        loaded.update(from_source)
+
+        for question_id in missing:
+            key = loaded.get(question_id)
+            self._local.pop(question_id, None)
+            self._local[question_id] = (key, now + (self.ttl if key is not None else self.miss_ttl))
+            if key is not None:
+                found[question_id] = key
+        # 超過上限時移除最早寫入的項目
+        while len(self._local) > self.max_entries:
+            del self._local[next(iter(self._local))]
+        return found
+
+    def stats(self) -> dict:
+        return {"version": self._version, "local_entries": len(self._local), "fallback": len(self._fallback)}
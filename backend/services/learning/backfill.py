@@ -0,0 +1,153 @@
+"""
+學習統計回填
+區間統計只計入帶有 subject / topic 的答題，這兩欄是後來才加入 answer_submissions 的，
+既有資料需要一次回填：
+
+1. 依 question_id 從 MongoDB questions（答案鍵）補上舊答題的 subject / topic
+2. 由 answer_submissions 重新彙總 daily_learning_rollups 與 weekly_learning_rollups
+   （--since 時只重建該日期起的統計）；重建期間鎖定兩張統計表，即時寫入會等待重建完成
+
+既有資料庫在執行前需先更新結構（新資料表由 create_all 建立）：
+
+    ALTER TABLE answer_submissions ADD COLUMN subject VARCHAR(50), ADD COLUMN topic VARCHAR(100);
+    CREATE INDEX ix_answer_submissions_user_submitted_at ON answer_submissions (user_id, submitted_at);
+    ALTER TABLE learning_progress ALTER COLUMN mastery_level TYPE NUMERIC(5,4);
+
+命令列：python -m backend.services.learning.backfill [--since 2024-01-01]
+"""
+
+import asyncio
+import time
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Date, bindparam, cast, delete, func, insert, select, text
+
+from backend.shared.database.postgresql import SessionLocal
+from backend.shared.models.learning import AnswerSubmission, DailyLearningRollup, WeeklyLearningRollup
+
+from .rollups import week_start
+
+QUESTION_BATCH_SIZE = 1000
+
+
+def _missing_question_ids(after: Optional[str], limit: int) -> List[str]:
+    """尚未填入 subject 的答題所屬題目（依 question_id 分頁）"""
+    table = AnswerSubmission.__table__
+    stmt = select(table.c.question_id).where(table.c.subject.is_(None)).distinct()
+    if after is not None:
+        stmt = stmt.where(table.c.question_id > after)
+    with SessionLocal() as db:
+        return list(db.execute(stmt.order_by(table.c.question_id).limit(limit)).scalars())
+
+
+def _fill_topics(topics: Dict[str, Tuple[str, str]]) -> int:
+    """寫入一批題目的 subject / topic，返回更新筆數"""
+    if not topics:
+        return 0
+    table = AnswerSubmission.__table__
+    stmt = (
+        table.update()
+        .where(table.c.question_id == bindparam("b_question_id"), table.c.subject.is_(None))
+        .values(subject=bindparam("b_subject"), topic=bindparam("b_topic"))
+    )
+    with SessionLocal() as db:
+        result = db.execute(stmt, [
+            {"b_question_id": question_id, "b_subject": subject, "b_topic": topic}
+            for question_id, (subject, topic) in topics.items()
+        ])
+        db.commit()
+        return result.rowcount
+
+
+async def backfill_submission_topics(collection, batch_size: int = QUESTION_BATCH_SIZE) -> Tuple[int, int]:
+    """依答案鍵補上舊答題的 subject / topic，返回 (更新筆數, 題庫中找不到的題目數)"""
+    updated = unknown = 0
+    after = None
+    while True:
+        question_ids = await asyncio.to_thread(_missing_question_ids, after, batch_size)
+        if not question_ids:
+            return updated, unknown
+        topics: Dict[str, Tuple[str, str]] = {}
+        async for question in collection.find(
+            {"question_id": {"$in": question_ids}}, {"_id": 0, "question_id": 1, "subject": 1, "topic": 1}
+        ):
+            if question.get("subject") and question.get("topic"):
+                topics[question["question_id"]] = (question["subject"], question["topic"])
+        updated += await asyncio.to_thread(_fill_topics, topics)
+        unknown += len(question_ids) - len(topics)
+        after = question_ids[-1]
+
+
+def rebuild_rollups(since: Optional[date] = None) -> Tuple[int, int]:
+    """由答題記錄重新彙總每日與每週統計（同步），返回 (每日列數, 每週列數)"""
+    submissions = AnswerSubmission.__table__.c
+    targets = (
+        (DailyLearningRollup, "day", cast(submissions.submitted_at, Date), since),
+        (WeeklyLearningRollup, "week_start", cast(func.date_trunc("week", submissions.submitted_at), Date),
+         week_start(since) if since else None),
+    )
+    rows = []
+    with SessionLocal() as db:
+        db.execute(text(
+            "LOCK TABLE daily_learning_rollups, weekly_learning_rollups IN SHARE ROW EXCLUSIVE MODE"
+        ))
+        for model, bucket_column, bucket, start in targets:
+            table = model.__table__
+            source = (
+                select(
+                    func.gen_random_uuid(),
+                    submissions.user_id,
+                    submissions.subject,
+                    submissions.topic,
+                    bucket,
+                    func.count(),
+                    func.count().filter(submissions.is_correct),
+                    func.coalesce(func.sum(submissions.time_spent), 0),
+                )
+                .where(submissions.subject.isnot(None), submissions.topic.isnot(None))
+                .group_by(submissions.user_id, submissions.subject, submissions.topic, bucket)
+            )
+            clear = delete(table)
+            if start is not None:
+                source = source.where(submissions.submitted_at >= datetime.combine(start, datetime.min.time()))
+                clear = clear.where(table.c[bucket_column] >= start)
+            db.execute(clear)
+            result = db.execute(insert(table).from_select(
+                ["id", "user_id", "subject", "topic", bucket_column, "attempts", "corrects", "time_spent_seconds"],
+                source,
+            ))
+            rows.append(result.rowcount)
+        db.commit()
+    return rows[0], rows[1]
+
+
+async def _main():
+    import argparse
+
+    from backend.shared.database.mongodb import mongodb_manager
+
+    parser = argparse.ArgumentParser(description="回填答題的科目／主題並重建每日、每週學習統計")
+    parser.add_argument("--since", type=date.fromisoformat,
+                        help="只重建此日期（YYYY-MM-DD，UTC）起的統計；每週統計從該週星期一起")
+    parser.add_argument("--skip-topics", action="store_true", help="略過 subject / topic 回填")
+    parser.add_argument("--batch-size", type=int, default=QUESTION_BATCH_SIZE)
+    args = parser.parse_args()
+
+    started = time.time()
+    if not args.skip_topics:
+        await mongodb_manager.connect()
+        try:
+            updated, unknown = await backfill_submission_topics(
+                mongodb_manager.get_collection("questions"), args.batch_size
+            )
+        finally:
+            await mongodb_manager.disconnect()
+        print(f"已回填 {updated} 筆答題的科目／主題，{unknown} 題在題庫中找不到（不計入統計）")
+
+    daily, weekly = await asyncio.to_thread(rebuild_rollups, args.since)
+    print(f"已重建 {daily} 筆每日統計、{weekly} 筆每週統計，{time.time() - started:.1f} 秒")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,323 @@
+"""
+能力與難度校準
+將 answer_submissions 讀為欄位式 NumPy 陣列，以向量化運算擬合每位學生的能力 θ 與每題難度 b
+（Rasch / 1PL：P(答對) = σ(θ - b)），結果寫回 student_abilities 與 MongoDB questions.irt_difficulty
+
+- rasch：全部作答載入記憶體，以 bincount 計算梯度與對角 Hessian，交替做 Newton 更新（JML），
+  加上 L2 先驗處理全對／全錯；1000 萬筆約需 90 MB 陣列
+- elo：依提交時間分塊串流，每塊以批次 Elo 更新，記憶體只與分塊大小及學生／題目數有關
+
+命令列：python -m backend.services.learning.calibration --method rasch
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from backend.shared.database.postgresql import SessionLocal
+from backend.shared.models.learning import AnswerSubmission, StudentAbility
+
+LOAD_CHUNK_SIZE = 100000
+WRITE_BATCH_SIZE = 5000
+MIN_RESPONSES = 5
+
+RASCH_MAX_ITER = 50
+RASCH_TOLERANCE = 1e-3
+RASCH_PRIOR = 0.1  # θ、b 的 L2 先驗強度（常態先驗的精確度）
+MAX_STEP = 1.0
+
+ELO_K = 0.4
+ELO_DECAY = 0.05  # K 隨作答數遞減：K / (1 + decay·n)
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(x, -30.0, 30.0)))
+
+
+class IdCodes:
+    """將 user_id / question_id 編為連續整數"""
+
+    def __init__(self):
+        self.codes: Dict = {}
+        self.ids: List = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def encode(self, values) -> np.ndarray:
+        codes = self.codes
+        ids = self.ids
+        result = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(ids)
+                ids.append(value)
+            result[i] = code
+        return result
+
+
+class ResponseChunk:
+    """一段作答記錄的欄位式陣列"""
+
+    __slots__ = ("users", "questions", "correct")
+
+    def __init__(self, users: np.ndarray, questions: np.ndarray, correct: np.ndarray):
+        self.users = users
+        self.questions = questions
+        self.correct = correct
+
+    def __len__(self) -> int:
+        return len(self.correct)
+
+
+def iter_response_chunks(
+    users: IdCodes,
+    questions: IdCodes,
+    chunk_size: int = LOAD_CHUNK_SIZE,
+    since: Optional[datetime] = None,
+) -> Iterator[ResponseChunk]:
+    """以伺服器端游標依提交時間分塊讀取作答記錄（同步）"""
+    stmt = select(AnswerSubmission.user_id, AnswerSubmission.question_id, AnswerSubmission.is_correct)
+    if since is not None:
+        stmt = stmt.where(AnswerSubmission.submitted_at >= since)
+    stmt = stmt.order_by(AnswerSubmission.submitted_at)
+
+    with SessionLocal() as db:
+        result = db.execute(stmt.execution_options(stream_results=True, yield_per=chunk_size))
+        for partition in result.tuples().partitions():
+            user_column, question_column, correct_column = zip(*partition)
+            yield ResponseChunk(
+                users.encode(user_column),
+                questions.encode(question_column),
+                np.fromiter(correct_column, dtype=np.int8, count=len(partition)),
+            )
+
+
+def load_responses(users: IdCodes, questions: IdCodes, chunk_size: int = LOAD_CHUNK_SIZE) -> ResponseChunk:
+    """載入全部作答記錄"""
+    chunks = list(iter_response_chunks(users, questions, chunk_size))
+    if not chunks:
+        empty = np.empty(0, dtype=np.int32)
+        return ResponseChunk(empty, empty, np.empty(0, dtype=np.int8))
+    return ResponseChunk(
+        np.concatenate([chunk.users for chunk in chunks]),
+        np.concatenate([chunk.questions for chunk in chunks]),
+        np.concatenate([chunk.correct for chunk in chunks]),
+    )
+
+
+class Calibration:
+    """校準結果"""
+
+    def __init__(
+        self,
+        method: str,
+        user_ids: List,
+        question_ids: List[str],
+        ability: np.ndarray,
+        difficulty: np.ndarray,
+        user_counts: np.ndarray,
+        question_counts: np.ndarray,
+        iterations: int = 0,
+    ):
+        self.method = method
+        self.user_ids = user_ids
+        self.question_ids = question_ids
+        self.ability = ability
+        self.difficulty = difficulty
+        self.user_counts = user_counts
+        self.question_counts = question_counts
+        self.iterations = iterations
+
+
+def fit_rasch(
+    responses: ResponseChunk,
+    n_users: int,
+    n_questions: int,
+    max_iter: int = RASCH_MAX_ITER,
+    tolerance: float = RASCH_TOLERANCE,
+    prior: float = RASCH_PRIOR,
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Rasch 模型聯合最大概似（加 L2 先驗），返回 (θ, b, 迭代次數)"""
+    users, questions = responses.users, responses.questions
+    y = responses.correct.astype(np.float64)
+    theta = np.zeros(n_users)
+    b = np.zeros(n_questions)
+
+    iteration = 0
+    for iteration in range(1, max_iter + 1):
+        p = _sigmoid(theta[users] - b[questions])
+        residual = y - p
+        weight = p * (1.0 - p)
+        step_theta = (np.bincount(users, residual, n_users) - prior * theta) / (
+            np.bincount(users, weight, n_users) + prior
+        )
+        theta += np.clip(step_theta, -MAX_STEP, MAX_STEP)
+
+        p = _sigmoid(theta[users] - b[questions])
+        residual = y - p
+        weight = p * (1.0 - p)
+        step_b = (-np.bincount(questions, residual, n_questions) - prior * b) / (
+            np.bincount(questions, weight, n_questions) + prior
+        )
+        b += np.clip(step_b, -MAX_STEP, MAX_STEP)
+
+        if max(np.abs(step_theta).max(initial=0.0), np.abs(step_b).max(initial=0.0)) < tolerance:
+            break
+    return theta, b, iteration
+
+
+def _grow(values: np.ndarray, size: int) -> np.ndarray:
+    if len(values) >= size:
+        return values
+    return np.concatenate([values, np.zeros(max(size, 2 * len(values)) - len(values), dtype=values.dtype)])
+
+
+def fit_elo(
+    chunks: Iterator[ResponseChunk],
+    users: IdCodes,
+    questions: IdCodes,
+    k: float = ELO_K,
+    decay: float = ELO_DECAY,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """分塊批次 Elo，返回 (θ, b, 學生作答數, 題目作答數)"""
+    theta = np.zeros(1024)
+    b = np.zeros(1024)
+    user_counts = np.zeros(1024, dtype=np.int64)
+    question_counts = np.zeros(1024, dtype=np.int64)
+
+    for chunk in chunks:
+        theta, user_counts = _grow(theta, len(users)), _grow(user_counts, len(users))
+        b, question_counts = _grow(b, len(questions)), _grow(question_counts, len(questions))
+        n_users, n_questions = len(theta), len(b)
+
+        residual = chunk.correct - _sigmoid(theta[chunk.users] - b[chunk.questions])
+        user_k = k / (1.0 + decay * user_counts)
+        question_k = k / (1.0 + decay * question_counts)
+        theta += np.clip(user_k * np.bincount(chunk.users, residual, n_users), -MAX_STEP, MAX_STEP)
+        b -= np.clip(question_k * np.bincount(chunk.questions, residual, n_questions), -MAX_STEP, MAX_STEP)
+        user_counts += np.bincount(chunk.users, minlength=n_users)
+        question_counts += np.bincount(chunk.questions, minlength=n_questions)
+
+    return (
+        theta[:len(users)], b[:len(questions)],
+        user_counts[:len(users)], question_counts[:len(questions)],
+    )
+
+
+def calibrate(method: str = "rasch", chunk_size: int = LOAD_CHUNK_SIZE) -> Calibration:
+    """讀取作答記錄並校準（同步，CPU 密集）"""
+    users, questions = IdCodes(), IdCodes()
+    if method == "elo":
+        theta, b, user_counts, question_counts = fit_elo(
+            iter_response_chunks(users, questions, chunk_size), users, questions
+        )
+        iterations = 1
+    else:
+        responses = load_responses(users, questions, chunk_size)
+        theta, b, iterations = fit_rasch(responses, len(users), len(questions))
+        user_counts = np.bincount(responses.users, minlength=len(users))
+        question_counts = np.bincount(responses.questions, minlength=len(questions))
+
+    # 以題目難度平均為 0 定錨
+    if len(b):
+        shift = b.mean()
+        b = b - shift
+        theta = theta - shift
+    return Calibration(method, users.ids, questions.ids, theta, b, user_counts, question_counts, iterations)
+
+
+def save_abilities(calibration: Calibration, min_responses: int = MIN_RESPONSES) -> int:
+    """寫入 student_abilities（同步），返回寫入筆數"""
+    now = datetime.utcnow()
+    rows = [
+        {
+            "user_id": user_id,
+            "ability": round(float(ability), 4),
+            "responses": int(count),
+            "method": calibration.method,
+            "calibrated_at": now,
+        }
+        for user_id, ability, count in zip(calibration.user_ids, calibration.ability, calibration.user_counts)
+        if count >= min_responses
+    ]
+    with SessionLocal() as db:
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            stmt = pg_insert(StudentAbility).values(rows[start:start + WRITE_BATCH_SIZE])
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["user_id"],
+                set_={
+                    "ability": stmt.excluded.ability,
+                    "responses": stmt.excluded.responses,
+                    "method": stmt.excluded.method,
+                    "calibrated_at": stmt.excluded.calibrated_at,
+                },
+            ))
+        db.commit()
+    return len(rows)
+
+
+async def save_difficulties(collection, calibration: Calibration, min_responses: int = MIN_RESPONSES) -> int:
+    """將題目難度寫回 questions.irt_difficulty，返回寫入筆數"""
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"question_id": question_id},
+            {"$set": {
+                "irt_difficulty": round(float(difficulty), 4),
+                "irt_responses": int(count),
+                "irt_calibrated_at": now,
+            }},
+        )
+        for question_id, difficulty, count in zip(
+            calibration.question_ids, calibration.difficulty, calibration.question_counts
+        )
+        if count >= min_responses
+    ]
+    for start in range(0, len(operations), WRITE_BATCH_SIZE):
+        await collection.bulk_write(operations[start:start + WRITE_BATCH_SIZE], ordered=False)
+    return len(operations)
+
+
+async def _main():
+    import argparse
+
+    from backend.shared.database.mongodb import mongodb_manager
+
+    parser = argparse.ArgumentParser(description="由作答記錄校準學生能力與題目難度")
+    parser.add_argument("--method", choices=("rasch", "elo"), default="rasch",
+                        help="rasch：全部載入記憶體；elo：分塊串流，記憶體固定")
+    parser.add_argument("--chunk-size", type=int, default=LOAD_CHUNK_SIZE)
+    parser.add_argument("--min-responses", type=int, default=MIN_RESPONSES,
+                        help="作答數少於此值的學生與題目不寫回")
+    args = parser.parse_args()
+
+    started = time.time()
+    calibration = await asyncio.to_thread(calibrate, args.method, args.chunk_size)
+    responses = int(calibration.question_counts.sum())
+    print(
+        f"校準完成：{responses} 筆作答，{len(calibration.user_ids)} 位學生，"
+        f"{len(calibration.question_ids)} 題，{calibration.iterations} 次迭代，"
+        f"{time.time() - started:.1f} 秒"
+    )
+
+    students = await asyncio.to_thread(save_abilities, calibration, args.min_responses)
+    await mongodb_manager.connect()
+    try:
+        questions = await save_difficulties(
+            mongodb_manager.get_collection("questions"), calibration, args.min_responses
+        )
+    finally:
+        await mongodb_manager.disconnect()
+    print(f"已寫回 {students} 位學生能力、{questions} 題難度")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
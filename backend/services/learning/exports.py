@@ -0,0 +1,80 @@
+"""
+答題記錄匯出
+以 PostgreSQL 伺服器端游標分批讀取 answer_submissions（可依 submitted_at 增量匯出），
+串流輸出 NDJSON，任何時候只保留一批資料在記憶體中；
+下次匯出的浮水印取本次範圍內最大的 submitted_at 減去安全重疊（涵蓋寫入緩衝延遲提交的記錄），
+相鄰兩次匯出可能重複同一筆記錄，匯入端依 id 去重
+
+命令列：python -m backend.services.learning.exports -o submissions.ndjson.gz --since 2024-01-01T00:00:00
+"""
+
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List, Optional
+
+from sqlalchemy import func, select
+from starlette.concurrency import iterate_in_threadpool
+
+from backend.shared.database.postgresql import SessionLocal
+from backend.shared.models.learning import AnswerSubmission
+from backend.shared.utils.ndjson import export_watermark, parse_since, write_ndjson
+
+EXPORT_BATCH_SIZE = 5000
+
+
+def submission_export_watermark(since: Optional[datetime] = None) -> Optional[datetime]:
+    """本次匯出範圍內最新的 submitted_at 減去安全重疊（同步，匯出開始前計算）"""
+    table = AnswerSubmission.__table__
+    stmt = select(func.max(table.c.submitted_at))
+    if since is not None:
+        stmt = stmt.where(table.c.submitted_at >= since)
+    with SessionLocal() as db:
+        latest = db.execute(stmt).scalar()
+    return export_watermark(latest, since)
+
+
+def _iter_submission_partitions(since: Optional[datetime], batch_size: int) -> Iterator[List[dict]]:
+    """以伺服器端游標逐批讀取（同步，於執行緒池中迭代）"""
+    table = AnswerSubmission.__table__
+    stmt = select(table)
+    if since is not None:
+        stmt = stmt.where(table.c.submitted_at >= since)
+
+    with SessionLocal() as db:
+        result = db.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+        for partition in result.mappings().partitions():
+            yield [dict(row) for row in partition]
+
+
+async def iter_submission_batches(
+    since: Optional[datetime] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[List[dict]]:
+    """逐批讀取答題記錄，since 指定時只匯出 submitted_at >= since 的記錄"""
+    async for batch in iterate_in_threadpool(_iter_submission_partitions(since, batch_size)):
+        yield batch
+
+
+async def _main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="匯出答題記錄（NDJSON）")
+    parser.add_argument("-o", "--output", required=True, help="輸出檔案，.gz 結尾時以 gzip 壓縮")
+    parser.add_argument("--since", help="只匯出此時間（ISO 8601）之後提交的記錄")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    since = parse_since(args.since) if args.since else None
+    watermark = submission_export_watermark(since)
+    count = await write_ndjson(
+        args.output,
+        iter_submission_batches(since, args.batch_size),
+        compress=args.output.endswith(".gz"),
+    )
+    print(f"已匯出 {count} 筆答題記錄")
+    if watermark is not None:
+        print(f"下次增量匯出可使用 --since {watermark.isoformat()}（與本次重疊，可能重複匯出部分記錄）")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -6,11 +6,34 @@
 
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+import asyncio
 import uuid
 import random
+import os
+
+from starlette.concurrency import run_in_threadpool
+
+from backend.shared.auth.dependencies import create_token_dependency
+from backend.shared.auth.revocation import RevocationFilter
+from backend.shared.auth.verifier import build_token_verifier
+from backend.shared.database.mongodb import mongodb_manager
+from backend.shared.database.redis_client import redis_manager
+from backend.shared.utils.ndjson import ndjson_stream, parse_since
+from backend.services.learning.answer_keys import AnswerKey, AnswerKeyStore
+from backend.services.learning.exports import iter_submission_batches, submission_export_watermark
+from backend.services.learning.persistence import GradedSubmission, load_progress, save_submissions
+from backend.services.learning.rollups import parse_range_bound, range_totals
+from backend.services.learning.sampling import (
+    SamplingPools, follow_question_bank, recent_questions, remember_questions
+)
+from backend.services.learning.sessions import SessionStore
+from backend.shared.vector.base import create_vector_index
+from backend.shared.vector.embeddings import EmbeddingCache, create_embedder, index_questions
+from backend.services.learning.submission_buffer import BufferFullError, SubmissionBuffer
 
 # 應用設定
 app = FastAPI(
@@ -28,6 +51,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 本地 Token 驗證（金鑰環 + 撤銷清單，不需呼叫認證服務）
+revocation_filter = RevocationFilter(redis_client_getter=lambda: redis_manager.client)
+token_verifier = build_token_verifier(
+    redis_client_getter=lambda: redis_manager.client,
+    is_revoked=revocation_filter.is_revoked,
+)
+verify_token = create_token_dependency(token_verifier)
+
 # Pydantic 模型
 class GenerateQuestionsRequest(BaseModel):
     subject: str
@@ -67,6 +98,35 @@ class SubmitAnswerResponse(BaseModel):
     feedback: str
 
 
+class AnswerItem(BaseModel):
+    question_id: str
+    user_answer: str
+    time_spent: Optional[int] = None
+
+
+class SubmitAnswersRequest(BaseModel):
+    session_id: str
+    answers: List[AnswerItem]
+
+
+class AnswerResult(BaseModel):
+    question_id: str
+    submission_id: Optional[str] = None
+    is_correct: bool
+    correct_answer: Optional[str] = None
+    explanation: Optional[str] = None
+    score: int
+    feedback: str
+
+
+class SubmitAnswersResponse(BaseModel):
+    session_id: str
+    total: int
+    correct: int
+    score: float
+    results: List[AnswerResult]
+
+
 class LearningProgressResponse(BaseModel):
     overall_progress: Dict[str, Any]
     subject_progress: List[Dict[str, Any]]
@@ -87,7 +147,8 @@ SAMPLE_QUESTIONS = {
                 "options": ["x=1", "x=2", "x=3", "x=4"],
                 "correct_answer": "x=2",
                 "explanation": "將 3 移到等號右邊得到 2x = 4，再除以 2 得到 x = 2",
-                "difficulty": "medium"
+                "difficulty": "medium",
+                "grade": 7
             },
             {
                 "question_id": "math_002",
@@ -95,7 +156,8 @@ SAMPLE_QUESTIONS = {
                 "type": "short_answer",
                 "correct_answer": "4x",
                 "explanation": "合併同類項：3x + 2x - x = (3+2-1)x = 4x",
-                "difficulty": "easy"
+                "difficulty": "easy",
+                "grade": 7
             }
         ],
         "geometry": [
@@ -105,22 +167,148 @@ SAMPLE_QUESTIONS = {
                 "type": "short_answer",
                 "correct_answer": "25π",
                 "explanation": "圓面積公式 A = πr²，所以 A = π × 5² = 25π",
-                "difficulty": "medium"
+                "difficulty": "medium",
+                "grade": 7
             }
         ]
     }
 }
 
 
+_sample_question_list = [
+    {**q, "subject": subject, "topic": topic}
+    for subject, subject_data in SAMPLE_QUESTIONS.items()
+    for topic, topic_questions in subject_data.items()
+    for q in topic_questions
+]
+
+# 答案鍵（程序內快取 → Redis → MongoDB → 模擬題庫）
+answer_keys = AnswerKeyStore(
+    redis_client_getter=lambda: redis_manager.client,
+    collection_getter=lambda: mongodb_manager.get_collection("questions"),
+    fallback_questions=_sample_question_list,
+    ttl=float(os.getenv("ANSWER_KEY_TTL_SECONDS", "300")),
+)
+
+# 出題抽樣池（無 MongoDB 時使用模擬題庫）
+sampling_pools = SamplingPools(fallback_questions=_sample_question_list)
+SAMPLING_REFRESH_SECONDS = float(os.getenv("SAMPLING_REFRESH_SECONDS", "5"))
+SAMPLING_REBUILD_SECONDS = float(os.getenv("SAMPLING_REBUILD_SECONDS", "3600"))
+_background_tasks: List[asyncio.Task] = []
+
+# 題目向量索引（VECTOR_BACKEND=local 為本機記憶體映射檔，milvus 為 Milvus 集合）
+vector_index = create_vector_index()
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./data/embedding_cache")
+EMBEDDING_REFRESH_SECONDS = float(os.getenv("EMBEDDING_REFRESH_SECONDS", "30"))
+
+
+async def keep_question_vectors(embedder, cache: EmbeddingCache):
+    """定期將抽樣池中新增或修改的題目向量化並寫入索引，刪除的題目自索引移除
+
+    自 MongoDB 首次整批載入後，另將索引與抽樣池對帳一次，移除服務停機期間刪除的題目
+    """
+    reconciled = False
+    while True:
+        questions, removed = sampling_pools.drain_changes()
+        if questions or removed:
+            try:
+                total, computed = await run_in_threadpool(
+                    index_questions, embedder, cache, vector_index, questions, removed
+                )
+                print(f"題目向量已更新：{total} 題，新計算 {computed} 題，移除 {len(removed)} 題")
+            except Exception as e:
+                sampling_pools.requeue_changes([question["question_id"] for question in questions], removed)
+                print(f"題目向量更新失敗: {e}")
+        if not reconciled and sampling_pools.loaded:
+            try:
+                indexed = await run_in_threadpool(vector_index.ids)
+                # 取完索引 ID 後才讀抽樣池，期間新增的題目不會被誤刪
+                stale = set(indexed) - sampling_pools.question_ids()
+                if stale:
+                    await run_in_threadpool(vector_index.remove, stale)
+                    print(f"題目向量對帳：移除 {len(stale)} 題已不在題庫的向量")
+                reconciled = True
+            except Exception as e:
+                print(f"題目向量對帳失敗: {e}")
+        await asyncio.sleep(EMBEDDING_REFRESH_SECONDS)
+
+# 練習會話快照（題目順序與答案鍵）
+session_store = SessionStore(
+    redis_client_getter=lambda: redis_manager.client,
+    ttl=int(os.getenv("LEARNING_SESSION_TTL_SECONDS", "86400")),
+)
+
+# 單題答題記錄的寫入緩衝（依筆數或時間批次寫入）
+submission_buffer = SubmissionBuffer(
+    writer=save_submissions,
+    max_batch=int(os.getenv("SUBMISSION_FLUSH_SIZE", "500")),
+    flush_interval=int(os.getenv("SUBMISSION_FLUSH_INTERVAL_MS", "500")) / 1000,
+    max_pending=int(os.getenv("SUBMISSION_BUFFER_SIZE", "10000")),
+    spill_path=os.getenv("SUBMISSION_SPILL_FILE") or None,
+    put_timeout=float(os.getenv("SUBMISSION_PUT_TIMEOUT_SECONDS", "2")),
+    shutdown_timeout=float(os.getenv("SUBMISSION_SHUTDOWN_TIMEOUT_SECONDS", "10")),
+)
+
+
+# 生命週期事件
+@app.on_event("startup")
+async def startup():
+    """連接 Redis / MongoDB 並啟動撤銷清單同步"""
+    try:
+        redis_manager.connect()
+    except Exception:
+        pass  # 無 Redis 時撤銷清單僅在本程序生效
+    revocation_filter.start()
+    
+    try:
+        await mongodb_manager.connect()
+        _background_tasks.append(asyncio.create_task(follow_question_bank(
+            sampling_pools,
+            lambda: redis_manager.client,
+            lambda: mongodb_manager.get_collection("questions"),
+            SAMPLING_REFRESH_SECONDS,
+            SAMPLING_REBUILD_SECONDS
+        )))
+    except Exception:
+        pass  # 無 MongoDB 時使用模擬題庫出題與批改
+    
+    try:
+        embedder = create_embedder()
+        cache = EmbeddingCache(EMBEDDING_CACHE_DIR, embedder.model_id, embedder.dim)
+        _background_tasks.append(asyncio.create_task(keep_question_vectors(embedder, cache)))
+    except Exception as e:
+        print(f"向量化模型初始化失敗，相似題目查詢停用: {e}")
+    
+    await submission_buffer.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """寫完緩衝中的答題記錄並關閉連接"""
+    for task in _background_tasks:
+        task.cancel()
+    await submission_buffer.stop()
+    try:
+        await run_in_threadpool(vector_index.save)
+    except Exception as e:
+        print(f"向量索引儲存失敗: {e}")
+    revocation_filter.stop()
+    redis_manager.disconnect()
+    await mongodb_manager.disconnect()
+
+
 # API 端點
 @app.post("/learning/generate-questions", response_model=GenerateQuestionsResponse)
-async def generate_questions(request: GenerateQuestionsRequest):
+async def generate_questions(
+    request: GenerateQuestionsRequest,
+    token_data: dict = Depends(verify_token)
+):
     """
     依需求生成題目 (US-002)
-    根據學科、年級、難度生成個人化題目
+    根據學科、年級、難度生成個人化題目；題目不重複，題庫不足時返回的題數可能少於 question_count
     """
     # 驗證輸入
-    if request.subject not in SAMPLE_QUESTIONS:
+    if not sampling_pools.has_subject(request.subject):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Subject '{request.subject}' not supported"
@@ -140,92 +328,160 @@ async def generate_questions(request: GenerateQuestionsRequest):
     
     # 生成會話 ID
     session_id = str(uuid.uuid4())
+    user_key = str(token_data.get("sub"))
     
-    # 從題庫選擇題目
-    questions = []
-    subject_data = SAMPLE_QUESTIONS[request.subject]
+    # 掌握度越低的主題權重越高
+    topic_weights: Dict[str, float] = {}
+    user_id = _token_user_id(token_data)
+    if user_id is not None:
+        try:
+            for row in await run_in_threadpool(load_progress, user_id, request.subject):
+                topic_weights[row["topic"]] = 1.5 - row["mastery_level"]
+        except Exception:
+            pass
     
-    for topic, topic_questions in subject_data.items():
-        if request.focus_areas and topic not in request.focus_areas:
-            continue
-        
-        for q in topic_questions:
-            if q["difficulty"] == request.difficulty and len(questions) < request.question_count:
-                question = Question(
-                    question_id=q["question_id"],
-                    content=q["content"],
-                    type=q["type"],
-                    options=q.get("options"),
-                    difficulty=q["difficulty"],
-                    subject_area=topic
-                )
-                questions.append(question)
+    # 從抽樣池選題（不重複，避開近期出過的題目；題目不足時以鄰近難度補足）
+    picked = sampling_pools.sample(
+        request.subject,
+        request.grade,
+        request.difficulty,
+        request.question_count,
+        topics=request.focus_areas,
+        topic_weights=topic_weights,
+        exclude=recent_questions(redis_manager.client, user_key)
+    )
+    if not picked:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No questions available for the requested grade and topics"
+        )
+    questions = [
+        Question(
+            question_id=q["question_id"],
+            content=q["content"],
+            type=q["type"],
+            options=q.get("options"),
+            difficulty=q["difficulty"],
+            subject_area=q["topic"]
+        )
+        for q in picked
+    ]
+    remember_questions(redis_manager.client, user_key, [q.question_id for q in questions])
     
-    # 如果題目不足，重複選擇
-    while len(questions) < request.question_count:
-        for topic, topic_questions in subject_data.items():
-            if len(questions) >= request.question_count:
-                break
-            for q in topic_questions:
-                if len(questions) >= request.question_count:
-                    break
-                question = Question(
-                    question_id=f"{q['question_id']}_{len(questions)}",
-                    content=q["content"],
-                    type=q["type"],
-                    options=q.get("options"),
-                    difficulty=q["difficulty"],
-                    subject_area=topic
-                )
-                questions.append(question)
+    # 預先取得答案鍵，連同題目順序存為會話快照
+    keys = await answer_keys.get_many([q.question_id for q in questions])
+    session_store.save(session_id, user_key, [
+        (q.question_id, keys[q.question_id])
+        for q in questions
+        if q.question_id in keys
+    ])
     
     return GenerateQuestionsResponse(
         session_id=session_id,
-        questions=questions[:request.question_count]
+        questions=questions
     )
 
 
+MAX_BATCH_ANSWERS = 200
+
+
+def _token_user_id(token_data: dict) -> Optional[uuid.UUID]:
+    """取得 Token 中的用戶 ID（模擬帳號不是 UUID，其答題只批改不寫入）"""
+    try:
+        return uuid.UUID(str(token_data.get("sub")))
+    except ValueError:
+        return None
+
+
+async def _session_answer_keys(
+    session_id: str,
+    question_ids: List[str],
+    token_data: dict
+) -> Dict[str, AnswerKey]:
+    """取得答案鍵：會話快照中的題目直接使用快照，其餘（或會話已過期）查詢答案鍵快取"""
+    snapshot = session_store.lookup(session_id, question_ids)
+    keys: Dict[str, AnswerKey] = {}
+    if snapshot is not None:
+        owner, keys = snapshot
+        if owner != str(token_data.get("sub")):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Session belongs to another user"
+            )
+    missing = [question_id for question_id in question_ids if question_id not in keys]
+    if missing:
+        keys.update(await answer_keys.get_many(missing))
+    return keys
+
+
+def _feedback(is_correct: bool, correct_answer: str) -> str:
+    """生成回饋"""
+    if is_correct:
+        return "回答正確！很好的表現。"
+    return f"回答錯誤。正確答案是 {correct_answer}。建議重新複習相關概念。"
+
+
 @app.post("/learning/submit-answer", response_model=SubmitAnswerResponse)
-async def submit_answer(request: SubmitAnswerRequest):
+async def submit_answer(
+    request: SubmitAnswerRequest,
+    token_data: dict = Depends(verify_token)
+):
     """
     提交答案並自動批改 (US-003)
     自動批改學生答案並提供回饋
     """
-    # 查找正確答案（模擬從題庫查詢）
-    correct_answer = None
-    explanation = None
-    
-    # 從模擬題庫中查找答案
-    for subject_data in SAMPLE_QUESTIONS.values():
-        for topic_questions in subject_data.values():
-            for q in topic_questions:
-                if q["question_id"] == request.question_id:
-                    correct_answer = q["correct_answer"]
-                    explanation = q["explanation"]
-                    break
-            if correct_answer:
-                break
-        if correct_answer:
-            break
-    
-    if not correct_answer:
+    # 查找答案鍵
+    user_id = _token_user_id(token_data)
+    answer_key = (
+        await _session_answer_keys(request.session_id, [request.question_id], token_data)
+    ).get(request.question_id)
+    if answer_key is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Question not found"
         )
+    correct_answer = answer_key.correct_answer
+    explanation = answer_key.explanation
     
     # 判斷答案是否正確
-    is_correct = request.user_answer.strip().lower() == correct_answer.lower()
+    is_correct = answer_key.is_correct(request.user_answer)
     score = 100 if is_correct else 0
     
     # 生成回饋
-    if is_correct:
-        feedback = "回答正確！很好的表現。"
-    else:
-        feedback = f"回答錯誤。正確答案是 {correct_answer}。建議重新複習相關概念。"
+    feedback = _feedback(is_correct, correct_answer)
+    
+    submission = GradedSubmission(
+        user_id=user_id,
+        question_id=answer_key.question_id,
+        session_id=request.session_id,
+        user_answer=request.user_answer,
+        correct_answer=correct_answer,
+        is_correct=is_correct,
+        score=score,
+        time_spent=request.time_spent,
+        feedback=feedback,
+        subject=answer_key.subject,
+        topic=answer_key.topic
+    )
+    
+    # 放入寫入緩衝（緩衝已滿時短暫等待，資料庫無法寫入而逾時則返回 503）
+    if user_id is not None:
+        try:
+            await submission_buffer.put(submission)
+        except BufferFullError as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Submission storage is busy, please retry later",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        except RuntimeError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Service is shutting down"
+            )
     
     return SubmitAnswerResponse(
-        submission_id=str(uuid.uuid4()),
+        submission_id=str(submission.id),
         is_correct=is_correct,
         correct_answer=correct_answer,
         explanation=explanation,
@@ -234,17 +490,136 @@ async def submit_answer(request: SubmitAnswerRequest):
     )
 
 
-@app.get("/learning/progress", response_model=LearningProgressResponse)
-async def get_learning_progress(
-    subject: Optional[str] = None,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+@app.post("/learning/submit-answers", response_model=SubmitAnswersResponse)
+async def submit_answers(
+    request: SubmitAnswersRequest,
+    token_data: dict = Depends(verify_token)
 ):
     """
-    查詢學習進度 (US-006)
-    返回學生的學習進度和統計資料
+    批次提交整個練習的答案 (US-003)
+    一次批改所有答案，答題記錄與學習進度在同一交易中寫入；找不到的題目不計分也不寫入
+    """
+    if not 1 <= len(request.answers) <= MAX_BATCH_ANSWERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Answers must contain between 1 and {MAX_BATCH_ANSWERS} items"
+        )
+    
+    user_id = _token_user_id(token_data)
+    keys = await _session_answer_keys(
+        request.session_id, [answer.question_id for answer in request.answers], token_data
+    )
+    
+    results = []
+    submissions = []
+    for answer in request.answers:
+        answer_key = keys.get(answer.question_id)
+        if answer_key is None:
+            results.append(AnswerResult(
+                question_id=answer.question_id,
+                is_correct=False,
+                score=0,
+                feedback="Question not found"
+            ))
+            continue
+        
+        is_correct = answer_key.is_correct(answer.user_answer)
+        submission = GradedSubmission(
+            user_id=user_id,
+            question_id=answer_key.question_id,
+            session_id=request.session_id,
+            user_answer=answer.user_answer,
+            correct_answer=answer_key.correct_answer,
+            is_correct=is_correct,
+            score=100 if is_correct else 0,
+            time_spent=answer.time_spent,
+            feedback=_feedback(is_correct, answer_key.correct_answer),
+            subject=answer_key.subject,
+            topic=answer_key.topic
+        )
+        submissions.append(submission)
+        results.append(AnswerResult(
+            question_id=answer.question_id,
+            submission_id=str(submission.id),
+            is_correct=is_correct,
+            correct_answer=answer_key.correct_answer,
+            explanation=answer_key.explanation,
+            score=submission.score,
+            feedback=submission.feedback
+        ))
+    
+    try:
+        if user_id is not None:
+            await run_in_threadpool(save_submissions, submissions)
+    except Exception as e:
+        print(f"答題記錄寫入失敗: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Failed to save submissions"
+        )
+    
+    correct = sum(1 for submission in submissions if submission.is_correct)
+    return SubmitAnswersResponse(
+        session_id=request.session_id,
+        total=len(request.answers),
+        correct=correct,
+        score=round(100 * correct / len(request.answers), 1),
+        results=results
+    )
+
+
+def _summarize_progress(rows: List[dict], totals: Dict[tuple, List[int]], ranged: bool):
+    """彙總為整體與各學科進度
+
+    掌握度取自 learning_progress（目前狀態）；作答數、答對數與學習時間取自區間統計，
+    指定區間時只列出區間內有作答的主題。
     """
-    # 模擬學習進度資料
+    if ranged:
+        rows = [
+            {**row, "total_questions": entry[0], "correct_answers": entry[1]}
+            for row in rows
+            for entry in [totals.get((row["subject"], row["topic"]))]
+            if entry is not None
+        ]
+    total = sum(row["total_questions"] or 0 for row in rows)
+    correct = sum(row["correct_answers"] or 0 for row in rows)
+    overall_progress = {
+        "total_questions": total,
+        "correct_answers": correct,
+        "accuracy_rate": round(correct / total, 4) if total else 0.0,
+        "study_time_minutes": round(sum(entry[2] for entry in totals.values()) / 60)
+    }
+    
+    subjects: Dict[str, List[dict]] = {}
+    for row in rows:
+        subjects.setdefault(row["subject"], []).append(row)
+    subject_progress = []
+    for subject_name, topics in subjects.items():
+        attempts = sum(topic["total_questions"] or 0 for topic in topics)
+        # 學科掌握度以各主題作答數加權
+        mastery = (
+            sum(topic["mastery_level"] * (topic["total_questions"] or 0) for topic in topics) / attempts
+            if attempts else 0.0
+        )
+        subject_progress.append({
+            "subject": subject_name,
+            "mastery_level": round(mastery, 2),
+            "topics": [
+                {
+                    "topic": topic["topic"],
+                    "mastery_level": topic["mastery_level"],
+                    "total_questions": topic["total_questions"],
+                    "correct_answers": topic["correct_answers"],
+                    "last_practiced": topic["last_practiced"]
+                }
+                for topic in topics
+            ]
+        })
+    return overall_progress, subject_progress
+
+
+def _mock_progress():
+    """模擬學習進度資料（模擬帳號或資料庫無法連線時使用）"""
     overall_progress = {
         "total_questions": 150,
         "correct_answers": 120,
@@ -270,6 +645,51 @@ async def get_learning_progress(
             ]
         }
     ]
+    return overall_progress, subject_progress
+
+
+@app.get("/learning/progress", response_model=LearningProgressResponse)
+async def get_learning_progress(
+    subject: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    token_data: dict = Depends(verify_token)
+):
+    """
+    查詢學習進度 (US-006)
+    返回學生的學習進度和統計資料（每個主題一列，由答題寫入時累加）；
+    start_date / end_date 可為日期（含當天）或 UTC 時間，區間統計取自每日／每週統計表
+    """
+    try:
+        start = parse_range_bound(start_date, is_end=False) if start_date else None
+        end = parse_range_bound(end_date, is_end=True) if end_date else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start_date and end_date must be ISO 8601 dates or datetimes"
+        )
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start_date must be before end_date"
+        )
+    
+    user_id = _token_user_id(token_data)
+    rows = None
+    if user_id is not None:
+        try:
+            rows = await run_in_threadpool(load_progress, user_id, subject)
+            totals = await run_in_threadpool(range_totals, user_id, start, end, subject)
+        except Exception as e:
+            rows = None
+            print(f"學習進度查詢失敗，使用模擬資料: {e}")
+    
+    if rows is None:
+        overall_progress, subject_progress = _mock_progress()
+    else:
+        overall_progress, subject_progress = _summarize_progress(
+            rows, totals, ranged=start is not None or end is not None
+        )
     
     # 如果指定學科，過濾結果
     if subject:
@@ -284,11 +704,13 @@ async def get_learning_progress(
 @app.get("/learning/similar-questions", response_model=SimilarQuestionsResponse)
 async def get_similar_questions(
     question_id: str,
-    count: int = 5
+    count: int = 5,
+    grade: Optional[int] = None,
+    token_data: dict = Depends(verify_token)
 ):
     """
     獲取相似題目 (US-005)
-    根據原題目找出相似的練習題
+    以題目向量在同學科內查詢最相似的題目，可再限定年級；題目尚未建立向量時返回 404
     """
     if not 1 <= count <= 20:
         raise HTTPException(
@@ -296,28 +718,101 @@ async def get_similar_questions(
             detail="Count must be between 1 and 20"
         )
     
-    # 模擬相似題目生成
-    similar_questions = []
+    try:
+        indexed = await run_in_threadpool(vector_index.get, question_id)
+    except Exception as e:
+        print(f"向量索引查詢失敗: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Vector index unavailable"
+        )
+    if indexed is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Question is not indexed"
+        )
+    vector, metadata = indexed
     
-    for i in range(count):
-        similar_question = {
-            "question_id": f"similar_{question_id}_{i+1}",
-            "content": f"類似題目 {i+1}：解方程式 {2+i}x + {3+i} = {7+i}",
-            "type": "multiple_choice",
-            "difficulty": "medium",
-            "similarity_score": 0.85 - (i * 0.05)
-        }
-        similar_questions.append(similar_question)
+    # 同學科內查詢，多取幾筆以扣除題庫中已不存在的題目
+    try:
+        hits = await run_in_threadpool(
+            vector_index.search, vector, count * 2, metadata.subject, grade, [question_id]
+        )
+    except Exception as e:
+        print(f"向量索引查詢失敗: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Vector index unavailable"
+        )
+    similar_questions = []
+    for hit in hits:
+        question = sampling_pools.get(hit.id)
+        if question is None:
+            continue
+        similar_questions.append({
+            "question_id": hit.id,
+            "content": question["content"],
+            "type": question["type"],
+            "difficulty": question["difficulty"],
+            "similarity_score": round(hit.score, 4)
+        })
+        if len(similar_questions) >= count:
+            break
     
     return SimilarQuestionsResponse(
         similar_questions=similar_questions
     )
 
 
+@app.get("/learning/export/submissions")
+async def export_submissions(
+    since: Optional[str] = None,
+    compress: bool = False,
+    token_data: dict = Depends(verify_token)
+):
+    """
+    串流匯出答題記錄（NDJSON，compress=true 時為 gzip）
+    since 為 ISO 8601 時間，只匯出之後提交的記錄；下次增量匯出的浮水印放在 X-Export-Watermark 標頭，
+    為本次最新 submitted_at 減去安全重疊，相鄰兩次匯出可能重複同一筆記錄（依 id 去重）
+    """
+    if token_data.get("role") not in ("teacher", "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only teachers can export submissions"
+        )
+    
+    try:
+        since_time = parse_since(since) if since else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid since timestamp"
+        )
+    
+    watermark = await run_in_threadpool(submission_export_watermark, since_time)
+    filename = "submissions.ndjson.gz" if compress else "submissions.ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if watermark is not None:
+        headers["X-Export-Watermark"] = watermark.isoformat()
+    return StreamingResponse(
+        ndjson_stream(iter_submission_batches(since_time), compress=compress),
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers=headers
+    )
+
+
 @app.get("/learning/health")
 async def health_check():
     """健康檢查端點"""
-    return {"status": "healthy", "service": "learning", "timestamp": datetime.utcnow().isoformat()}
+    return {
+        "status": "healthy",
+        "service": "learning",
+        "timestamp": datetime.utcnow().isoformat(),
+        "answer_keys": answer_keys.stats(),
+        "submission_buffer": submission_buffer.stats(),
+        "sampling_pools": sampling_pools.stats(),
+        "vector_index": vector_index.stats()
+    }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,207 @@
+"""
+答題記錄寫入
+將批改結果寫入 answer_submissions，並在同一交易中以 upsert 累加 learning_progress 與每日／每週統計；
+掌握度為答對與否的指數加權移動平均：每答一題 m ← (1-α)·m + α·x
+"""
+
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from backend.shared.database.postgresql import SessionLocal
+from backend.shared.models.learning import AnswerSubmission, LearningProgress
+
+from .rollups import apply_rollups
+
+# 掌握度的平滑係數（越大越偏重最近的作答）
+MASTERY_ALPHA = 0.2
+
+
+class GradedSubmission:
+    """已批改的答題（subject / topic 取自答案鍵，用於更新學習進度）"""
+
+    __slots__ = (
+        "id", "user_id", "question_id", "session_id", "user_answer", "correct_answer",
+        "is_correct", "score", "time_spent", "feedback", "submitted_at", "subject", "topic",
+    )
+
+    def __init__(
+        self,
+        user_id: uuid.UUID,
+        question_id: str,
+        session_id: Optional[str],
+        user_answer: str,
+        correct_answer: str,
+        is_correct: bool,
+        score: int,
+        time_spent: Optional[int] = None,
+        feedback: Optional[str] = None,
+        subject: Optional[str] = None,
+        topic: Optional[str] = None,
+        submitted_at: Optional[datetime] = None,
+        id: Optional[uuid.UUID] = None,
+    ):
+        self.id = id or uuid.uuid4()
+        self.user_id = user_id
+        self.question_id = question_id
+        self.session_id = session_id
+        self.user_answer = user_answer
+        self.correct_answer = correct_answer
+        self.is_correct = is_correct
+        self.score = score
+        self.time_spent = time_spent
+        self.feedback = feedback
+        self.subject = subject
+        self.topic = topic
+        self.submitted_at = submitted_at or datetime.utcnow()
+
+    def to_record(self) -> dict:
+        """可寫入 JSON 的完整內容（暫存檔用）"""
+        record = {name: getattr(self, name) for name in self.__slots__}
+        record["id"] = str(self.id)
+        record["user_id"] = str(self.user_id)
+        record["submitted_at"] = self.submitted_at.isoformat()
+        return record
+
+    @classmethod
+    def from_record(cls, record: dict) -> "GradedSubmission":
+        record = dict(record)
+        record["id"] = uuid.UUID(record["id"])
+        record["user_id"] = uuid.UUID(record["user_id"])
+        record["submitted_at"] = datetime.fromisoformat(record["submitted_at"])
+        return cls(**record)
+
+    def row(self) -> dict:
+        """answer_submissions 的欄位值"""
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "question_id": self.question_id,
+            "session_id": self.session_id,
+            "user_answer": self.user_answer,
+            "correct_answer": self.correct_answer,
+            "is_correct": self.is_correct,
+            "score": self.score,
+            "time_spent": self.time_spent,
+            "feedback": self.feedback,
+            "subject": self.subject,
+            "topic": self.topic,
+            "submitted_at": self.submitted_at,
+        }
+
+
+class ProgressDelta:
+    """單一 (user_id, subject, topic) 在一批答題中的變化"""
+
+    __slots__ = ("attempts", "correct", "last_practiced", "mastery_gain")
+
+    def __init__(self):
+        self.attempts = 0
+        self.correct = 0
+        self.last_practiced: Optional[datetime] = None
+        # 從 0 起算、依序套用本批答題後的加權平均；
+        # 既有掌握度 m 更新為 m·(1-α)^attempts + mastery_gain
+        self.mastery_gain = 0.0
+
+
+def progress_deltas(
+    submissions: Iterable[GradedSubmission],
+) -> Dict[Tuple[uuid.UUID, str, str], ProgressDelta]:
+    """依 (user_id, subject, topic) 彙總一批答題（依作答時間排序套用）"""
+    deltas: Dict[Tuple[uuid.UUID, str, str], ProgressDelta] = {}
+    for submission in sorted(submissions, key=lambda s: s.submitted_at):
+        if not submission.subject or not submission.topic:
+            continue
+        key = (submission.user_id, submission.subject, submission.topic)
+        delta = deltas.get(key)
+        if delta is None:
+            delta = deltas[key] = ProgressDelta()
+        delta.attempts += 1
+        delta.correct += 1 if submission.is_correct else 0
+        delta.last_practiced = submission.submitted_at
+        delta.mastery_gain = (1 - MASTERY_ALPHA) * delta.mastery_gain + (
+            MASTERY_ALPHA if submission.is_correct else 0.0
+        )
+    return deltas
+
+
+def _apply_progress(db, submissions: List[GradedSubmission]):
+    """以單一 INSERT ... ON CONFLICT DO UPDATE 累加學習進度
+
+    鍵依序排列，避免並行的批次以不同順序鎖定同一組列而死結。
+    """
+    deltas = progress_deltas(submissions)
+    if not deltas:
+        return
+    now = datetime.utcnow()
+    stmt = pg_insert(LearningProgress).values([
+        {
+            "id": uuid.uuid4(),
+            "user_id": user_id,
+            "subject": subject,
+            "topic": topic,
+            "total_questions": delta.attempts,
+            "correct_answers": delta.correct,
+            "mastery_level": delta.mastery_gain,
+            "last_practiced": delta.last_practiced,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for (user_id, subject, topic), delta in sorted(deltas.items(), key=lambda item: tuple(map(str, item[0])))
+    ])
+    excluded = stmt.excluded
+    table = LearningProgress.__table__.c
+    db.execute(stmt.on_conflict_do_update(
+        constraint="uq_learning_progress_user_subject_topic",
+        set_={
+            "total_questions": table.total_questions + excluded.total_questions,
+            "correct_answers": table.correct_answers + excluded.correct_answers,
+            "mastery_level": func.least(
+                1,
+                func.coalesce(table.mastery_level, 0)
+                * func.power(1 - MASTERY_ALPHA, excluded.total_questions)
+                + excluded.mastery_level,
+            ),
+            "last_practiced": func.greatest(table.last_practiced, excluded.last_practiced),
+            "updated_at": excluded.updated_at,
+        },
+    ))
+
+
+def save_submissions(submissions: List[GradedSubmission]):
+    """以單一交易寫入答題記錄與學習進度（同步，於執行緒池中呼叫）
+
+    答題以 id 去重（ON CONFLICT DO NOTHING），只有實際新增的答題會累加進度與統計，
+    重送暫存檔或重試已提交的批次不會重複計算。
+    """
+    if not submissions:
+        return
+    with SessionLocal() as db:
+        inserted = set(db.execute(
+            pg_insert(AnswerSubmission)
+            .values([submission.row() for submission in submissions])
+            .on_conflict_do_nothing(index_elements=["id"])
+            .returning(AnswerSubmission.id)
+        ).scalars())
+        if len(inserted) < len(submissions):
+            submissions = [submission for submission in submissions if submission.id in inserted]
+        _apply_progress(db, submissions)
+        apply_rollups(db, submissions)
+        db.commit()
+
+
+def load_progress(user_id: uuid.UUID, subject: Optional[str] = None) -> List[dict]:
+    """讀取用戶各主題的學習進度（同步，於執行緒池中呼叫）"""
+    query = select(LearningProgress).where(LearningProgress.user_id == user_id)
+    if subject:
+        query = query.where(LearningProgress.subject == subject)
+    with SessionLocal() as db:
+        return [
+            progress.to_dict()
+            for progress in db.execute(
+                query.order_by(LearningProgress.subject, LearningProgress.topic)
+            ).scalars()
+        ]
@@ -0,0 +1,190 @@
+"""
+學習統計區間查詢
+答題寫入時同步累加每日與每週統計（作答數、答對數、作答秒數）；
+查詢區間時整週取每週統計、零散整天取每日統計，只有不足一天的頭尾才掃描原始答題記錄，
+因此查詢一年與查詢一週的成本相近。日期一律以 UTC 計。
+統計只涵蓋帶有 subject / topic 的答題；既有資料以 python -m backend.services.learning.backfill 回填並重建
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Integer, and_, cast, func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from backend.shared.database.postgresql import SessionLocal
+from backend.shared.models.learning import AnswerSubmission, DailyLearningRollup, WeeklyLearningRollup
+from backend.shared.utils.ndjson import parse_since
+
+# (subject, topic) -> [作答數, 答對數, 作答秒數]
+RangeTotals = Dict[Tuple[str, str], List[int]]
+
+
+def week_start(day: date) -> date:
+    """該週星期一"""
+    return day - timedelta(days=day.weekday())
+
+
+def parse_range_bound(value: str, is_end: bool) -> datetime:
+    """解析區間端點；只有日期時 start 為當天 0 點，end 為隔天 0 點（即包含當天）"""
+    value = value.strip()
+    if len(value) == 10:
+        day = date.fromisoformat(value)
+        return datetime.combine(day + timedelta(days=1) if is_end else day, time.min)
+    return parse_since(value)
+
+
+def _bucket_counts(submissions: Iterable, bucket) -> Dict[tuple, List[int]]:
+    counts: Dict[tuple, List[int]] = {}
+    for submission in submissions:
+        if not submission.subject or not submission.topic:
+            continue
+        key = (submission.user_id, submission.subject, submission.topic, bucket(submission.submitted_at.date()))
+        entry = counts.setdefault(key, [0, 0, 0])
+        entry[0] += 1
+        entry[1] += 1 if submission.is_correct else 0
+        entry[2] += submission.time_spent or 0
+    return counts
+
+
+def _upsert_counts(db, model, bucket_column: str, constraint: str, counts: Dict[tuple, List[int]]):
+    if not counts:
+        return
+    stmt = pg_insert(model).values([
+        {
+            "user_id": user_id,
+            "subject": subject,
+            "topic": topic,
+            bucket_column: bucket,
+            "attempts": attempts,
+            "corrects": corrects,
+            "time_spent_seconds": seconds,
+        }
+        for (user_id, subject, topic, bucket), (attempts, corrects, seconds)
+        in sorted(counts.items(), key=lambda item: tuple(map(str, item[0])))
+    ])
+    table = model.__table__.c
+    db.execute(stmt.on_conflict_do_update(
+        constraint=constraint,
+        set_={
+            "attempts": table.attempts + stmt.excluded.attempts,
+            "corrects": table.corrects + stmt.excluded.corrects,
+            "time_spent_seconds": table.time_spent_seconds + stmt.excluded.time_spent_seconds,
+        },
+    ))
+
+
+def apply_rollups(db, submissions: List):
+    """累加一批答題的每日與每週統計（與答題記錄同一交易）"""
+    _upsert_counts(
+        db, DailyLearningRollup, "day", "uq_daily_learning_rollup",
+        _bucket_counts(submissions, lambda day: day),
+    )
+    _upsert_counts(
+        db, WeeklyLearningRollup, "week_start", "uq_weekly_learning_rollup",
+        _bucket_counts(submissions, week_start),
+    )
+
+
+def _ceil_day(moment: datetime) -> date:
+    day = moment.date()
+    return day if moment.time() == time.min else day + timedelta(days=1)
+
+
+def _plan(start: Optional[datetime], end: Optional[datetime]):
+    """將 [start, end) 拆為 (原始記錄區間, 每日統計區間, 每週統計區間)，None 表示不設限"""
+    first_day = _ceil_day(start) if start is not None else None
+    last_day = end.date() if end is not None else None  # 不含
+    if first_day is not None and last_day is not None and first_day >= last_day:
+        return [(start, end)], [], None
+
+    raw = []
+    if start is not None and datetime.combine(first_day, time.min) > start:
+        raw.append((start, datetime.combine(first_day, time.min)))
+    if end is not None and datetime.combine(last_day, time.min) < end:
+        raw.append((datetime.combine(last_day, time.min), end))
+
+    first_week = week_start(first_day + timedelta(days=6)) if first_day is not None else None
+    last_week = week_start(last_day) if last_day is not None else None
+    if first_week is not None and last_week is not None and first_week >= last_week:
+        return raw, [(first_day, last_day)], None
+
+    daily = []
+    if first_day is not None and first_day < first_week:
+        daily.append((first_day, first_week))
+    if last_day is not None and last_week < last_day:
+        daily.append((last_week, last_day))
+    return raw, daily, (first_week, last_week)
+
+
+def _between(column, low, high):
+    conditions = []
+    if low is not None:
+        conditions.append(column >= low)
+    if high is not None:
+        conditions.append(column < high)
+    return and_(*conditions) if conditions else None
+
+
+def _accumulate(totals: RangeTotals, rows):
+    for subject, topic, attempts, corrects, seconds in rows:
+        entry = totals.setdefault((subject, topic), [0, 0, 0])
+        entry[0] += attempts or 0
+        entry[1] += corrects or 0
+        entry[2] += seconds or 0
+
+
+def _rollup_query(model, bucket, ranges, user_id, subject):
+    query = (
+        select(
+            model.subject, model.topic,
+            func.sum(model.attempts), func.sum(model.corrects), func.sum(model.time_spent_seconds),
+        )
+        .where(model.user_id == user_id)
+        .group_by(model.subject, model.topic)
+    )
+    conditions = [condition for condition in (_between(bucket, low, high) for low, high in ranges) if condition is not None]
+    if conditions:
+        query = query.where(or_(*conditions))
+    if subject:
+        query = query.where(model.subject == subject)
+    return query
+
+
+def range_totals(
+    user_id,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    subject: Optional[str] = None,
+) -> RangeTotals:
+    """彙總 [start, end) 內各主題的作答統計（同步，於執行緒池中呼叫）"""
+    raw, daily, weekly = _plan(start, end)
+    totals: RangeTotals = {}
+    with SessionLocal() as db:
+        if weekly is not None:
+            _accumulate(totals, db.execute(
+                _rollup_query(WeeklyLearningRollup, WeeklyLearningRollup.week_start, [weekly], user_id, subject)
+            ))
+        if daily:
+            _accumulate(totals, db.execute(
+                _rollup_query(DailyLearningRollup, DailyLearningRollup.day, daily, user_id, subject)
+            ))
+        if raw:
+            query = (
+                select(
+                    AnswerSubmission.subject, AnswerSubmission.topic,
+                    func.count(), func.sum(cast(AnswerSubmission.is_correct, Integer)),
+                    func.sum(AnswerSubmission.time_spent),
+                )
+                .where(
+                    AnswerSubmission.user_id == user_id,
+                    AnswerSubmission.subject.isnot(None),
+                    AnswerSubmission.topic.isnot(None),
+                    or_(*(_between(AnswerSubmission.submitted_at, low, high) for low, high in raw)),
+                )
+                .group_by(AnswerSubmission.subject, AnswerSubmission.topic)
+            )
+            if subject:
+                query = query.where(AnswerSubmission.subject == subject)
+            _accumulate(totals, db.execute(query))
+    return totals
@@ -0,0 +1,315 @@
+"""
+出題抽樣池
+依 (subject, grade, difficulty, topic) 預先分池保存題目，出題時依主題權重不放回抽樣，
+每次出題成本為 O(k)，與題庫大小無關；近期出過的題目以拒絕抽樣避開（題目不足時才允許重複出現）。
+題庫版本（Redis question_bank:version）變動時只依 updated_at 載入異動的題目，並定期整批重建以反映刪除；
+新增、修改與刪除的題目另外記錄，供衍生資料（如題目向量）只處理異動部分
+"""
+
+import asyncio
+import random
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from backend.shared.database.redis_client import QUESTION_BANK_VERSION_KEY
+
+PoolKey = Tuple[str, int, str, str]  # (subject, grade, difficulty, topic)
+
+QUESTION_PROJECTION = {
+    "_id": 0, "question_id": 1, "content": 1, "type": 1, "options": 1,
+    "subject": 1, "grade": 1, "difficulty": 1, "topic": 1, "updated_at": 1,
+}
+
+# 指定難度題目不足時，依序以鄰近難度補足
+DIFFICULTY_FALLBACK = {
+    "easy": ("easy", "medium", "hard"),
+    "medium": ("medium", "easy", "hard"),
+    "hard": ("hard", "medium", "easy"),
+}
+
+RECENT_KEY_PREFIX = "recent_questions:"
+RECENT_LIMIT = 200
+RECENT_TTL_SECONDS = 7 * 86400
+MAX_REJECTIONS_PER_PICK = 8
+
+
+class Pool:
+    """單一抽樣池：陣列加索引，新增、更新、移除皆為 O(1)"""
+
+    __slots__ = ("items", "positions")
+
+    def __init__(self):
+        self.items: List[dict] = []
+        self.positions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def upsert(self, question: dict):
+        position = self.positions.get(question["question_id"])
+        if position is None:
+            self.positions[question["question_id"]] = len(self.items)
+            self.items.append(question)
+        else:
+            self.items[position] = question
+
+    def remove(self, question_id: str):
+        position = self.positions.pop(question_id, None)
+        if position is None:
+            return
+        last = self.items.pop()
+        if position < len(self.items):
+            self.items[position] = last
+            self.positions[last["question_id"]] = position
+
+
+def pool_key(question: dict) -> Optional[PoolKey]:
+    try:
+        return (question["subject"], int(question["grade"]), question["difficulty"], question["topic"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class SamplingPools:
+    """出題抽樣池集合"""
+
+    def __init__(self, fallback_questions: Iterable[dict] = ()):
+        self._pools: Dict[PoolKey, Pool] = {}
+        self._located: Dict[str, PoolKey] = {}
+        self._fallback = list(fallback_questions)
+        self._version: Optional[str] = None
+        self._watermark: Optional[datetime] = None
+        self._rebuilt_at = 0.0
+        self._changed: Dict[str, dict] = {}  # 上次 drain_changes() 後新增或修改的題目
+        self._removed: Set[str] = set()
+        self.build(self._fallback)
+
+    def build(self, questions: Iterable[dict]):
+        """整批重建；與重建前相同的題目不記為異動"""
+        previous_pools, previous_located = self._pools, self._located
+        self._pools = {}
+        self._located = {}
+        for question in questions:
+            key = previous_located.get(question["question_id"])
+            if key is not None:
+                pool = previous_pools[key]
+                if pool.items[pool.positions[question["question_id"]]] == question:
+                    self._place(question, key)
+                    continue
+            self.upsert(question)
+        for question_id in previous_located.keys() - self._located.keys():
+            self._changed.pop(question_id, None)
+            self._removed.add(question_id)
+
+    def _place(self, question: dict, key: PoolKey):
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = Pool()
+        pool.upsert(question)
+        self._located[question["question_id"]] = key
+
+    def upsert(self, question: dict):
+        key = pool_key(question)
+        if key is None:
+            return
+        if self.get(question["question_id"]) == question:
+            return
+        previous = self._located.get(question["question_id"])
+        if previous is not None and previous != key:
+            self._pools[previous].remove(question["question_id"])
+        self._place(question, key)
+        self._changed[question["question_id"]] = question
+        self._removed.discard(question["question_id"])
+
+    def remove(self, question_id: str):
+        key = self._located.pop(question_id, None)
+        if key is not None:
+            self._pools[key].remove(question_id)
+            self._changed.pop(question_id, None)
+            self._removed.add(question_id)
+
+    def drain_changes(self) -> Tuple[List[dict], List[str]]:
+        """取出上次呼叫後的異動：(新增或修改的題目, 刪除的題目 ID)"""
+        changed, removed = list(self._changed.values()), list(self._removed)
+        self._changed, self._removed = {}, set()
+        return changed, removed
+
+    def requeue_changes(self, question_ids: Iterable[str], removed_ids: Iterable[str]):
+        """處理失敗時放回異動；期間又有異動的題目以目前狀態為準"""
+        for question_id in question_ids:
+            question = self.get(question_id)
+            if question is not None:
+                self._changed.setdefault(question_id, question)
+        for question_id in removed_ids:
+            if question_id not in self._located:
+                self._removed.add(question_id)
+
+    @property
+    def loaded(self) -> bool:
+        """是否已自 MongoDB 整批載入過（否則為模擬題庫）"""
+        return self._watermark is not None
+
+    def question_ids(self) -> Set[str]:
+        return set(self._located)
+
+    def get(self, question_id: str) -> Optional[dict]:
+        key = self._located.get(question_id)
+        if key is None:
+            return None
+        pool = self._pools[key]
+        return pool.items[pool.positions[question_id]]
+
+    def has_subject(self, subject: str) -> bool:
+        return any(key[0] == subject and len(pool) for key, pool in self._pools.items())
+
+    def sample(
+        self,
+        subject: str,
+        grade: int,
+        difficulty: str,
+        count: int,
+        topics: Optional[List[str]] = None,
+        topic_weights: Optional[Dict[str, float]] = None,
+        exclude: Optional[Set[str]] = None,
+        rng: Optional[random.Random] = None,
+    ) -> List[dict]:
+        """不放回抽樣 count 題
+
+        topic_weights 為各主題的相對權重（未列出者為 1），exclude 中的題目只在所有鄰近難度都不足時才會選入。
+        """
+        rng = rng or random
+        exclude = exclude or set()
+        chosen: List[dict] = []
+        chosen_ids: Set[str] = set()
+
+        levels = []
+        for level in DIFFICULTY_FALLBACK.get(difficulty, (difficulty,)):
+            pools = [
+                (key[3], pool) for key, pool in self._pools.items()
+                if key[0] == subject and key[1] == grade and key[2] == level
+                and len(pool) and (not topics or key[3] in topics)
+            ]
+            if pools:
+                levels.append(pools)
+
+        # 先在所有難度中避開排除的題目，全部不足時才回頭允許重複
+        for allow_excluded in (False, True):
+            for pools in levels:
+                self._draw(
+                    pools, count, topic_weights or {}, exclude, allow_excluded, rng, chosen, chosen_ids
+                )
+                if len(chosen) >= count:
+                    return chosen
+        return chosen
+
+    @staticmethod
+    def _draw(pools, count, topic_weights, exclude, allow_excluded, rng, chosen, chosen_ids):
+        """依權重選池、池內均勻抽題；重複或排除的題目拒絕重抽，連續拒絕過多時移除該池"""
+        pools = list(pools)
+        weights = [max(topic_weights.get(topic, 1.0), 0.01) * len(pool) for topic, pool in pools]
+        rejections = [0] * len(pools)
+        while len(chosen) < count and pools:
+            index = rng.choices(range(len(pools)), weights)[0] if len(pools) > 1 else 0
+            pool = pools[index][1]
+            question = pool.items[rng.randrange(len(pool))]
+            question_id = question["question_id"]
+            if question_id in chosen_ids or (not allow_excluded and question_id in exclude):
+                rejections[index] += 1
+                if rejections[index] < MAX_REJECTIONS_PER_PICK:
+                    continue
+                # 拒絕過多時改為掃描該池剩餘可選的題目
+                remaining = [
+                    item for item in pool.items
+                    if item["question_id"] not in chosen_ids
+                    and (allow_excluded or item["question_id"] not in exclude)
+                ]
+                if not remaining:
+                    del pools[index], weights[index], rejections[index]
+                    continue
+                question = rng.choice(remaining)
+                question_id = question["question_id"]
+            rejections[index] = 0
+            chosen.append(question)
+            chosen_ids.add(question_id)
+
+    async def refresh(self, redis_client, collection, rebuild_interval: float):
+        """題庫版本變動時增量載入；超過 rebuild_interval 秒則整批重建"""
+        if collection is None:
+            return
+        version = None
+        if redis_client is not None:
+            try:
+                version = redis_client.get(QUESTION_BANK_VERSION_KEY) or "0"
+            except Exception:
+                version = None
+        now = time.monotonic()
+        full = self._watermark is None or now - self._rebuilt_at >= rebuild_interval
+        if not full and version is not None and version == self._version:
+            return
+
+        query = {} if full else {"updated_at": {"$gte": self._watermark}}
+        questions = []
+        watermark = self._watermark
+        async for question in collection.find(query, QUESTION_PROJECTION):
+            questions.append(question)
+            updated_at = question.get("updated_at")
+            if updated_at is not None and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+
+        if full:
+            if questions:
+                self.build(questions)  # 題庫為空時保留模擬題庫
+            self._rebuilt_at = now
+            self._watermark = watermark or datetime.utcnow()
+        else:
+            for question in questions:
+                self.upsert(question)
+            self._watermark = watermark
+        self._version = version
+
+    def stats(self) -> dict:
+        return {"pools": len(self._pools), "questions": len(self._located), "version": self._version}
+
+
+def recent_questions(redis_client, user_key: str) -> Set[str]:
+    """用戶近期出過的題目"""
+    if redis_client is None:
+        return set()
+    try:
+        return set(redis_client.lrange(f"{RECENT_KEY_PREFIX}{user_key}", 0, RECENT_LIMIT - 1))
+    except Exception:
+        return set()
+
+
+def remember_questions(redis_client, user_key: str, question_ids: List[str]):
+    """記錄本次出的題目（只保留最近 RECENT_LIMIT 題）"""
+    if redis_client is None or not question_ids:
+        return
+    key = f"{RECENT_KEY_PREFIX}{user_key}"
+    try:
+        pipe = redis_client.pipeline()
+        pipe.lpush(key, *question_ids)
+        pipe.ltrim(key, 0, RECENT_LIMIT - 1)
+        pipe.expire(key, RECENT_TTL_SECONDS)
+        pipe.execute()
+    except Exception:
+        pass
+
+
+async def follow_question_bank(
+    pools: SamplingPools,
+    redis_client_getter: Callable,
+    collection_getter: Callable,
+    interval: float,
+    rebuild_interval: float,
+):
+    """背景定期刷新抽樣池"""
+    while True:
+        try:
+            await pools.refresh(redis_client_getter(), collection_getter(), rebuild_interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"出題抽樣池刷新失敗: {e}")
+        await asyncio.sleep(interval)
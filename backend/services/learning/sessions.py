@@ -0,0 +1,72 @@
+"""
+練習會話快照
+生成題目時將會話存入 Redis 雜湊 learning_session:{session_id}（附 TTL）：
+owner 為建立者、questions 為依序排列的題目 ID、key:{question_id} 為該題答案鍵快照。
+會話內批改只需一次 HMGET，不必查詢題庫，服務重啟後快照仍然有效
+"""
+
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .answer_keys import AnswerKey
+
+SESSION_KEY_PREFIX = "learning_session:"
+
+
+class SessionStore:
+    """練習會話快照（Redis）"""
+
+    def __init__(self, redis_client_getter: Callable, ttl: int = 86400):
+        self._redis_client_getter = redis_client_getter
+        self.ttl = ttl
+
+    def _redis(self):
+        try:
+            return self._redis_client_getter()
+        except Exception:
+            return None
+
+    def save(self, session_id: str, owner: str, items: List[Tuple[str, AnswerKey]]) -> bool:
+        """儲存會話；Redis 無法使用時返回 False"""
+        client = self._redis()
+        if client is None:
+            return False
+        mapping = {
+            "owner": owner,
+            "questions": json.dumps([question_id for question_id, _ in items]),
+        }
+        for question_id, answer_key in items:
+            mapping[f"key:{question_id}"] = answer_key.to_json()
+        key = f"{SESSION_KEY_PREFIX}{session_id}"
+        try:
+            pipe = client.pipeline()
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+            return True
+        except Exception as e:
+            print(f"練習會話儲存失敗: {e}")
+            return False
+
+    def lookup(
+        self, session_id: str, question_ids: List[str]
+    ) -> Optional[Tuple[str, Dict[str, AnswerKey]]]:
+        """一次讀取建立者與指定題目的答案鍵；會話不存在或 Redis 無法使用時返回 None"""
+        client = self._redis()
+        if client is None:
+            return None
+        question_ids = list(dict.fromkeys(question_ids))
+        try:
+            owner, *raw_keys = client.hmget(
+                f"{SESSION_KEY_PREFIX}{session_id}",
+                ["owner", *(f"key:{question_id}" for question_id in question_ids)],
+            )
+        except Exception:
+            return None
+        if owner is None:
+            return None
+        return owner, {
+            question_id: AnswerKey.from_json(raw)
+            for question_id, raw in zip(question_ids, raw_keys)
+            if raw
+        }
@@ -0,0 +1,273 @@
+"""
+答題記錄寫入緩衝（write-behind）
+答題先放入有界佇列即返回，背景工作依筆數或時間門檻以多列 INSERT 批次寫入；
+佇列滿時 put() 最多等待 put_timeout 秒（背壓），逾時拋出 BufferFullError。
+關閉服務時寫完佇列；資料庫無法連線時不再重試：有暫存檔則留待下次啟動重送，
+沒有暫存檔則最多再重試 shutdown_timeout 秒，之後捨棄並計入 dropped。
+可選的本機暫存檔記錄尚未寫入資料庫的答題：每批確認寫入後切換到新的分段檔（{spill_path}.{序號}），
+已全部寫入的分段即刪除；程序異常結束後於啟動時重送殘留分段（寫入以 id 去重，已提交的答題不會重複）
+"""
+
+import asyncio
+import glob
+import json
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+from starlette.concurrency import run_in_threadpool
+
+from .persistence import GradedSubmission
+
+RETRY_DELAY_SECONDS = 1.0
+MAX_RETRY_DELAY_SECONDS = 30.0
+PUT_POLL_SECONDS = 0.05
+
+
+class BufferFullError(Exception):
+    """寫入緩衝已滿且在時限內未騰出空間（資料庫無法寫入）"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Submission buffer is full")
+        self.retry_after = retry_after
+
+
+class SubmissionBuffer:
+    """答題記錄寫入緩衝"""
+
+    def __init__(
+        self,
+        writer: Callable[[List[GradedSubmission]], None],
+        max_batch: int = 500,
+        flush_interval: float = 0.5,
+        max_pending: int = 10000,
+        spill_path: Optional[str] = None,
+        put_timeout: float = 2.0,
+        shutdown_timeout: float = 10.0,
+    ):
+        self.writer = writer
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.put_timeout = put_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self._stop_deadline = 0.0
+        self._stop_requested = asyncio.Event()  # 中斷重試的退避等待
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._replay: List[GradedSubmission] = []
+        # 暫存分段 [路徑, 筆數]，由舊到新；最後一個為目前附加中的分段
+        self._segments: Deque[list] = deque()
+        self._confirmed = 0  # 最舊分段中已確認寫入的筆數
+        self._next_segment = 0
+        self._spill = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    async def start(self):
+        """載入暫存分段中未寫入的答題並啟動背景寫入"""
+        if self.spill_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+            self._replay = self._load_spill()
+            if self._replay:
+                print(f"答題暫存檔中有 {len(self._replay)} 筆未確認寫入，將重新寫入（已寫入者略過）")
+            self._open_segment()
+        self._stopping = False
+        self._stop_requested.clear()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """寫完佇列中所有答題後停止（資料庫無法連線時不會無限等待）"""
+        self._stopping = True
+        self._stop_deadline = time.monotonic() + self.shutdown_timeout
+        self._stop_requested.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+            self._release_segments()
+
+    async def put(self, submission: GradedSubmission):
+        """加入答題；佇列已滿時最多等待 put_timeout 秒"""
+        if self._stopping:
+            raise RuntimeError("答題寫入緩衝已停止")
+        deadline = time.monotonic() + self.put_timeout
+        while self._queue.full():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise BufferFullError(retry_after=round(MAX_RETRY_DELAY_SECONDS))
+            await asyncio.sleep(min(PUT_POLL_SECONDS, remaining))
+        # 放入佇列與寫入暫存檔之間不可讓出執行權，兩者的順序才會一致
+        self._queue.put_nowait(submission)
+        if self._spill is not None:
+            self._spill.write(json.dumps(submission.to_record(), ensure_ascii=False) + "\n")
+            self._spill.flush()
+            self._segments[-1][1] += 1
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() + len(self._replay)
+
+    def _segment_paths(self) -> List[str]:
+        """殘留的暫存分段（含舊版單一暫存檔），由舊到新"""
+        paths = sorted(
+            (path for path in glob.glob(f"{glob.escape(self.spill_path)}.*") if path.rsplit(".", 1)[1].isdigit()),
+            key=lambda path: int(path.rsplit(".", 1)[1]),
+        )
+        if os.path.exists(self.spill_path):
+            paths.insert(0, self.spill_path)
+        return paths
+
+    def _load_spill(self) -> List[GradedSubmission]:
+        submissions = []
+        for path in self._segment_paths():
+            count = 0
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        submissions.append(GradedSubmission.from_record(json.loads(line)))
+                        count += 1
+                    except (ValueError, KeyError, TypeError):
+                        continue  # 寫到一半的最後一行
+            self._segments.append([path, count])
+            if path != self.spill_path:
+                self._next_segment = max(self._next_segment, int(path.rsplit(".", 1)[1]) + 1)
+        return submissions
+
+    def _open_segment(self):
+        path = f"{self.spill_path}.{self._next_segment}"
+        self._next_segment += 1
+        self._spill = open(path, "a", encoding="utf-8")
+        self._segments.append([path, 0])
+
+    def _rotate_spill(self):
+        """目前分段有資料時改寫新的分段，之後寫入確認時舊分段才能整檔刪除"""
+        if self._spill is not None and self._segments[-1][1]:
+            self._spill.close()
+            try:
+                self._open_segment()
+            except OSError:
+                self._spill = None
+                raise
+
+    def _release_segments(self):
+        """刪除已全部確認寫入的分段（附加中的分段除外）"""
+        while self._segments and self._confirmed >= self._segments[0][1]:
+            if self._spill is not None and len(self._segments) == 1:
+                break
+            path, count = self._segments.popleft()
+            self._confirmed -= count
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _confirm(self, count: int):
+        """一批答題已寫入（或已捨棄）：依先進先出順序推進暫存分段"""
+        if not self._segments:
+            return
+        self._rotate_spill()
+        self._confirmed += count
+        self._release_segments()
+
+    async def _next_batch(self) -> List[GradedSubmission]:
+        """湊滿 max_batch 筆或等到 flush_interval 為止"""
+        if self._replay:
+            batch, self._replay = self._replay[:self.max_batch], self._replay[self.max_batch:]
+            return batch
+
+        batch: List[GradedSubmission] = []
+        deadline = None
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            if self._stopping:
+                break
+            if deadline is None:
+                timeout = self.flush_interval if batch else 0.1
+            else:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                if batch:
+                    break
+                continue
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    async def _write(self, batch: List[GradedSubmission]) -> bool:
+        """寫入一批，返回是否已處理（寫入或捨棄）
+
+        連線錯誤時退避重試（期間佇列填滿即形成背壓）；停止中則不再重試：
+        有暫存檔時返回 False，答題留在暫存分段中；沒有暫存檔時重試到 shutdown_timeout 為止。
+        資料錯誤時改為逐筆寫入，只捨棄有問題的答題。
+        """
+        delay = RETRY_DELAY_SECONDS
+        while True:
+            try:
+                await run_in_threadpool(self.writer, batch)
+                self.written += len(batch)
+                return True
+            except (OperationalError, InterfaceError) as e:
+                self.failed_flushes += 1
+                if self._stopping:
+                    if self._spill is not None:
+                        print(f"答題記錄寫入失敗，未寫入的答題保留在暫存檔，下次啟動時重送: {e}")
+                        return False
+                    remaining = self._stop_deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.dropped += len(batch)
+                        print(f"答題記錄寫入失敗且已達關閉時限，捨棄 {len(batch)} 筆: {e}")
+                        return True
+                    delay = min(delay, remaining)
+                print(f"答題記錄寫入失敗，{delay:.0f} 秒後重試: {e}")
+                if self._stopping:
+                    await asyncio.sleep(delay)
+                else:
+                    try:
+                        await asyncio.wait_for(self._stop_requested.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                delay = min(delay * 2, MAX_RETRY_DELAY_SECONDS)
+            except Exception as e:
+                if len(batch) == 1:
+                    self.dropped += 1
+                    print(f"答題記錄無法寫入，已捨棄 {batch[0].id}: {e}")
+                    return True
+                for submission in batch:
+                    if not await self._write([submission]):
+                        return False
+                return True
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            if batch:
+                if not await self._write(batch):
+                    return
+                try:
+                    self._confirm(len(batch))
+                except OSError as e:
+                    print(f"答題暫存檔切換失敗: {e}")
+            elif self._stopping and self._queue.empty() and not self._replay:
+                return
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+            "spill_segments": len(self._segments),
+        }
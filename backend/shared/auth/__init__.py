@@ -0,0 +1 @@
+# 共用認證模組 
\ No newline at end of file
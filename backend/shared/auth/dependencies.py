@@ -0,0 +1,26 @@
+"""
+FastAPI 認證依賴
+"""
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from .verifier import InvalidTokenError, TokenVerifier
+
+
+def create_token_dependency(verifier: TokenVerifier):
+    """建立以本地驗證器檢查 Bearer Token 的依賴函數"""
+    security = HTTPBearer()
+
+    def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+        """驗證 JWT Token"""
+        try:
+            return verifier.verify(credentials.credentials)
+        except InvalidTokenError:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid authentication credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+    return verify_token
@@ -0,0 +1,155 @@
+"""
+JWT 驗證金鑰環
+依 kid 管理多把驗證金鑰，支援從檔案或 Redis 熱更新（金鑰輪替免重啟）
+
+金鑰環 JSON 格式：
+{
+    "keys": [
+        {"kid": "2026-10", "alg": "RS256", "key": "-----BEGIN PUBLIC KEY-----..."},
+        {"kid": "2026-07", "alg": "ES256", "key_file": "keys/2026-07.pub.pem"}
+    ]
+}
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from jose.constants import ALGORITHMS
+
+
+class KeyRingError(Exception):
+    """找不到可用的驗證金鑰"""
+
+
+def _parse_keyring(raw: str, base_dir: str = ".") -> Dict[str, Tuple[str, Any]]:
+    """解析金鑰環 JSON，略過不支援的演算法"""
+    data = json.loads(raw)
+    keys: Dict[str, Tuple[str, Any]] = {}
+
+    for entry in data.get("keys", []):
+        kid = entry.get("kid")
+        algorithm = entry.get("alg")
+        if not kid or algorithm not in ALGORITHMS.SUPPORTED:
+            print(f"略過不支援的金鑰: kid={kid}, alg={algorithm}")
+            continue
+
+        key = entry.get("key")
+        if key is None and entry.get("key_file"):
+            with open(os.path.join(base_dir, entry["key_file"]), encoding="utf-8") as f:
+                key = f.read()
+        if key is None:
+            continue
+
+        keys[kid] = (algorithm, key)
+
+    return keys
+
+
+class KeyRing:
+    """JWT 驗證金鑰環
+
+    沒有 kid 的 Token 使用預設金鑰（既有的 JWT_SECRET_KEY / JWT_ALGORITHM）；
+    帶有 kid 的 Token 從金鑰環查找，遇到未知 kid 時會立即重新載入一次。
+    """
+
+    def __init__(
+        self,
+        default_algorithm: Optional[str] = None,
+        default_key: Optional[Any] = None,
+        source_file: Optional[str] = None,
+        redis_key: Optional[str] = None,
+        redis_client_getter: Optional[Callable[[], Any]] = None,
+        refresh_interval: float = 30.0,
+    ):
+        self.default_algorithm = default_algorithm
+        self.default_key = default_key
+        self.source_file = source_file
+        self.redis_key = redis_key
+        self.redis_client_getter = redis_client_getter
+        self.refresh_interval = refresh_interval
+
+        self._keys: Dict[str, Tuple[str, Any]] = {}
+        self._static_keys: Dict[str, Tuple[str, Any]] = {}
+        self._file_keys: Dict[str, Tuple[str, Any]] = {}
+        self._redis_keys: Dict[str, Tuple[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0
+        self._file_mtime: Optional[float] = None
+        self._redis_raw: Optional[str] = None
+
+    def add_key(self, kid: str, algorithm: str, key: Any):
+        """手動加入金鑰"""
+        with self._lock:
+            self._static_keys[kid] = (algorithm, key)
+            self._keys[kid] = (algorithm, key)
+
+    def _load_from_file(self) -> Optional[Dict[str, Tuple[str, Any]]]:
+        mtime = os.path.getmtime(self.source_file)
+        if mtime == self._file_mtime:
+            return None
+        with open(self.source_file, encoding="utf-8") as f:
+            keys = _parse_keyring(f.read(), os.path.dirname(self.source_file))
+        self._file_mtime = mtime
+        return keys
+
+    def _load_from_redis(self) -> Optional[Dict[str, Tuple[str, Any]]]:
+        client = self.redis_client_getter() if self.redis_client_getter else None
+        if client is None:
+            return None
+        raw = client.get(self.redis_key)
+        if raw is None or raw == self._redis_raw:
+            return None
+        keys = _parse_keyring(raw)
+        self._redis_raw = raw
+        return keys
+
+    def refresh(self, force: bool = False):
+        """重新載入金鑰（僅在來源內容變動時替換）"""
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return
+        self._last_refresh = now
+
+        changed = False
+        try:
+            if self.source_file:
+                keys = self._load_from_file()
+                if keys is not None:
+                    self._file_keys = keys
+                    changed = True
+            if self.redis_key:
+                keys = self._load_from_redis()
+                if keys is not None:
+                    self._redis_keys = keys
+                    changed = True
+        except Exception as e:
+            # 載入失敗時沿用舊金鑰
+            print(f"金鑰環載入失敗: {e}")
+            return
+
+        if changed:
+            with self._lock:
+                self._keys = {**self._static_keys, **self._file_keys, **self._redis_keys}
+            print(f"金鑰環已更新，共 {len(self._keys)} 把金鑰")
+
+    def get(self, kid: Optional[str]) -> Tuple[str, Any]:
+        """取得 (演算法, 金鑰)"""
+        self.refresh()
+
+        if kid is None:
+            if self.default_key is None:
+                raise KeyRingError("Token has no key id")
+            return self.default_algorithm, self.default_key
+
+        entry = self._keys.get(kid)
+        if entry is None:
+            # 可能剛輪替，強制重新載入一次（受最短間隔限制）
+            if time.monotonic() - self._last_refresh >= 1.0:
+                self.refresh(force=True)
+                entry = self._keys.get(kid)
+        if entry is None:
+            raise KeyRingError(f"Unknown key id: {kid}")
+        return entry
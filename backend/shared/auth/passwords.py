@@ -0,0 +1,34 @@
+"""
+密碼雜湊工具
+供程序池子程序呼叫的 bcrypt 雜湊與驗證函數
+"""
+
+from typing import List, Optional
+
+from passlib.context import CryptContext
+
+# 每個子程序各自建立一次
+_pwd_context: Optional[CryptContext] = None
+
+
+def _get_context() -> CryptContext:
+    global _pwd_context
+    if _pwd_context is None:
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
+
+def hash_password(password: str) -> str:
+    """密碼加密"""
+    return _get_context().hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """驗證密碼"""
+    return _get_context().verify(plain_password, hashed_password)
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """批次密碼加密（減少程序間往返）"""
+    context = _get_context()
+    return [context.hash(password) for password in passwords]
@@ -0,0 +1,180 @@
+"""
+Token 撤銷清單
+撤銷的 jti 存放於 Redis，各 worker 以記憶體內 Bloom filter 過濾，
+只有命中 filter 的 Token 才需要到 Redis 做精確檢查
+"""
+
+import hashlib
+import math
+import threading
+import time
+from typing import Any, Callable, Optional, Set
+
+REVOKED_KEY_PREFIX = "auth:revoked:"
+REVOCATION_CHANNEL = "auth:revocations"
+
+
+class BloomFilter:
+    """固定大小的 Bloom filter（只增不減，需定期重建）"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = max(1, capacity)
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationFilter:
+    """Token 撤銷過濾器
+
+    - revoke(): 寫入 Redis（TTL = Token 剩餘有效期）並透過 pub/sub 通知所有 worker
+    - is_revoked(): Bloom filter 未命中直接放行，命中才查 Redis
+    - 背景執行緒訂閱撤銷頻道做增量同步，並定期重建以移除已過期的 jti
+    Redis 無法使用時退化為僅在本程序生效的精確集合。
+    """
+
+    def __init__(
+        self,
+        redis_client_getter: Callable[[], Any],
+        capacity: int = 100000,
+        error_rate: float = 0.001,
+        rebuild_interval: float = 3600.0,
+    ):
+        self.redis_client_getter = redis_client_getter
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._building: Optional[BloomFilter] = None
+        self._local: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.filter_hits = 0
+        self.exact_checks = 0
+
+    @property
+    def _client(self):
+        return self.redis_client_getter()
+
+    def start(self):
+        """載入既有撤銷清單並啟動同步執行緒"""
+        if self._client is None:
+            print("撤銷清單未連接 Redis，僅在本程序生效")
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sync_loop, name="revocation-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止同步執行緒"""
+        self._stop.set()
+
+    def _add_local(self, jti: str):
+        with self._lock:
+            self._bloom.add(jti)
+            if self._building is not None:
+                self._building.add(jti)
+
+    def rebuild(self):
+        """以 Redis 內尚未過期的 jti 重建 Bloom filter"""
+        client = self._client
+        if client is None:
+            return
+
+        # 容量取目前數量的兩倍，避免誤判率隨撤銷數增加而上升
+        fresh = BloomFilter(max(self.capacity, self._bloom.count * 2), self.error_rate)
+        with self._lock:
+            self._building = fresh
+        for key in client.scan_iter(match=f"{REVOKED_KEY_PREFIX}*", count=1000):
+            with self._lock:
+                fresh.add(key[len(REVOKED_KEY_PREFIX):])
+        with self._lock:
+            self._bloom, self._building = fresh, None
+
+    def _sync_loop(self):
+        """訂閱撤銷頻道；斷線時重新訂閱並重建"""
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                # 先訂閱再重建，避免重建期間遺漏新撤銷
+                pubsub.subscribe(REVOCATION_CHANNEL)
+                self.rebuild()
+                last_rebuild = time.monotonic()
+
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self._add_local(message["data"])
+                    if time.monotonic() - last_rebuild >= self.rebuild_interval:
+                        self.rebuild()
+                        last_rebuild = time.monotonic()
+            except Exception as e:
+                print(f"撤銷清單同步中斷，稍後重試: {e}")
+                self._stop.wait(5.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def revoke(self, jti: str, expires_at: Optional[float] = None):
+        """撤銷 jti，保存到 Token 過期為止"""
+        self._add_local(jti)
+        client = self._client
+        if client is None:
+            self._local.add(jti)
+            return
+
+        ttl = int(expires_at - time.time()) + 1 if expires_at else 86400
+        if ttl <= 0:
+            return
+        client.set(f"{REVOKED_KEY_PREFIX}{jti}", 1, ex=ttl)
+        client.publish(REVOCATION_CHANNEL, jti)
+
+    def is_revoked(self, payload: dict) -> bool:
+        """檢查 Token 是否已撤銷（可直接作為 TokenVerifier 的 is_revoked）"""
+        jti = payload.get("jti")
+        if not jti or jti not in self._bloom:
+            return False
+
+        self.filter_hits += 1
+        client = self._client
+        if client is None:
+            return jti in self._local
+
+        self.exact_checks += 1
+        try:
+            return bool(client.exists(f"{REVOKED_KEY_PREFIX}{jti}"))
+        except Exception as e:
+            # Redis 暫時無法使用時，以 filter 結果為準（寧可誤擋）
+            print(f"撤銷清單查詢失敗: {e}")
+            return True
+
+    def stats(self) -> dict:
+        """撤銷過濾器統計資料"""
+        return {
+            "filter_entries": self._bloom.count,
+            "filter_hits": self.filter_hits,
+            "exact_checks": self.exact_checks,
+        }
@@ -0,0 +1,90 @@
+"""
+本地 JWT 驗證
+各服務以金鑰環在本地驗證 Token，不需要呼叫認證服務
+"""
+
+import os
+from typing import Any, Callable, Optional
+
+from jose import JWTError, jwt
+
+from .keyring import KeyRing, KeyRingError
+from .token_cache import VerifiedTokenCache
+
+
+class InvalidTokenError(Exception):
+    """Token 無效、過期或已撤銷"""
+
+
+class TokenVerifier:
+    """JWT 驗證器
+
+    依 Token 標頭的 kid 從金鑰環取得金鑰並驗證簽章，
+    驗證結果寫入快取；撤銷檢查在每次呼叫都會執行。
+    """
+
+    def __init__(
+        self,
+        keyring: KeyRing,
+        cache: Optional[VerifiedTokenCache] = None,
+        is_revoked: Optional[Callable[[dict], bool]] = None,
+    ):
+        self.keyring = keyring
+        self.cache = cache
+        self.is_revoked = is_revoked
+
+    def _decode(self, token: str) -> dict:
+        try:
+            header = jwt.get_unverified_header(token)
+            algorithm, key = self.keyring.get(header.get("kid"))
+            # 演算法由金鑰決定，不信任 Token 標頭的 alg
+            payload = jwt.decode(token, key, algorithms=[algorithm])
+        except (JWTError, KeyRingError) as e:
+            raise InvalidTokenError(str(e))
+
+        if payload.get("sub") is None:
+            raise InvalidTokenError("Token has no subject")
+        return payload
+
+    def verify(self, token: str) -> dict:
+        """驗證 Token 並返回 payload"""
+        payload = self.cache.get(token) if self.cache is not None else None
+        if payload is None:
+            payload = self._decode(token)
+            if self.cache is not None:
+                self.cache.put(token, payload)
+
+        if self.is_revoked is not None and self.is_revoked(payload):
+            if self.cache is not None:
+                self.cache.discard(token)
+            raise InvalidTokenError("Token has been revoked")
+
+        return payload
+
+
+def build_token_verifier(
+    redis_client_getter: Optional[Callable[[], Any]] = None,
+    is_revoked: Optional[Callable[[dict], bool]] = None,
+) -> TokenVerifier:
+    """依環境變數建立驗證器
+
+    JWT_SECRET_KEY / JWT_ALGORITHM 作為無 kid Token 的預設金鑰（僅對稱式演算法）；
+    JWT_KEYRING_FILE、JWT_KEYRING_REDIS_KEY 提供可熱更新的非對稱公鑰。
+    """
+    algorithm = os.getenv("JWT_ALGORITHM", "HS256")
+    default_key = None
+    if algorithm.startswith("HS"):
+        default_key = os.getenv("JWT_SECRET_KEY", "your-secret-key-here")
+
+    keyring = KeyRing(
+        default_algorithm=algorithm,
+        default_key=default_key,
+        source_file=os.getenv("JWT_KEYRING_FILE") or None,
+        redis_key=os.getenv("JWT_KEYRING_REDIS_KEY") or None,
+        redis_client_getter=redis_client_getter,
+        refresh_interval=float(os.getenv("JWT_KEYRING_REFRESH_SECONDS", "30")),
+    )
+    keyring.refresh(force=True)
+
+    cache = VerifiedTokenCache(max_size=int(os.getenv("TOKEN_CACHE_SIZE", "10000")))
+    return TokenVerifier(keyring, cache=cache, is_revoked=is_revoked)
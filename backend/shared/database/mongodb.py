@@ -3,10 +3,24 @@ MongoDB 資料庫連接管理
 用於處理題庫、學習資源等非結構化資料
 """
 
+import asyncio
+import time
+from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional
+from pymongo.errors import OperationFailure
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional, Tuple
 from .config import db_settings
 
+# 單機 MongoDB 不支援 change stream 時的錯誤碼（$changeStream 僅支援 replica set / sharded cluster）
+CHANGE_STREAM_UNSUPPORTED_CODES = {40573, 40324}
+
+
+def change_streams_unsupported(error: Exception) -> bool:
+    """判斷錯誤是否表示此部署不支援 change stream（重試也不會成功）"""
+    if not isinstance(error, OperationFailure):
+        return False
+    return error.code in CHANGE_STREAM_UNSUPPORTED_CODES or "replica set" in str(error)
+
 
 class MongoDBManager:
     """MongoDB 連接管理器"""
@@ -26,6 +40,9 @@ class MongoDBManager:
             print("MongoDB 連接成功")
         except Exception as e:
             print(f"MongoDB 連接失敗: {e}")
+            self.client.close()
+            self.client = None
+            self.database = None
             raise
     
     async def disconnect(self):
@@ -35,22 +52,91 @@ class MongoDBManager:
     
     def get_collection(self, collection_name: str):
         """取得指定集合"""
-        if not self.database:
+        if self.database is None:
             raise RuntimeError("MongoDB 未連接")
         return self.database[collection_name]
     
+    async def watch_changes(self, collection_name: str) -> AsyncIterator[Tuple[str, Any, Optional[dict]]]:
+        """追蹤集合變更（需 replica set），產生 (操作, _id, 完整文件)"""
+        collection = self.get_collection(collection_name)
+        async with collection.watch(full_document="updateLookup") as stream:
+            async for change in stream:
+                operation = change["operationType"]
+                if operation in ("insert", "update", "replace"):
+                    document = change.get("fullDocument")
+                    if document is not None:
+                        yield "upsert", change["documentKey"]["_id"], document
+                elif operation == "delete":
+                    yield "delete", change["documentKey"]["_id"], None
+                elif operation in ("drop", "rename", "dropDatabase", "invalidate"):
+                    raise RuntimeError(f"集合 {collection_name} 已失效: {operation}")
+
+    async def poll_changes(
+        self,
+        collection_name: str,
+        known_ids: Callable[[], Iterable[Any]],
+        projection: Optional[dict] = None,
+        interval: float = 10,
+        reconcile_interval: float = 600,
+        overlap: float = 5,
+    ) -> AsyncIterator[Tuple[str, Any, Optional[dict]]]:
+        """以輪詢 updated_at 取代 change stream（單機部署用），產生與 watch_changes 相同的事件
+
+        每 interval 秒查詢 updated_at 晚於上次最大值減去 overlap 秒的文件（容許較晚提交的寫入），
+        同一版本只產生一次；每 reconcile_interval 秒比對 _id 清單，補上刪除與沒有 updated_at 的新文件。
+        """
+        collection = self.get_collection(collection_name)
+        if projection is not None:
+            projection = {**projection, "updated_at": 1}
+        watermark = datetime.utcnow() - timedelta(seconds=overlap)
+        seen: Dict[Any, datetime] = {}
+        reconciled_at = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            since = watermark - timedelta(seconds=overlap)
+            async for document in collection.find({"updated_at": {"$gte": since}}, projection):
+                updated_at = document["updated_at"]
+                if seen.get(document["_id"]) == updated_at:
+                    continue
+                seen[document["_id"]] = updated_at
+                watermark = max(watermark, updated_at)
+                yield "upsert", document["_id"], document
+            horizon = watermark - timedelta(seconds=2 * overlap)
+            seen = {object_id: updated_at for object_id, updated_at in seen.items() if updated_at >= horizon}
+
+            if time.monotonic() - reconciled_at < reconcile_interval:
+                continue
+            reconciled_at = time.monotonic()
+            present = {document["_id"] async for document in collection.find({}, {"_id": 1})}
+            known = set(known_ids())
+            for object_id in known - present:
+                yield "delete", object_id, None
+            added = list(present - known)
+            for start in range(0, len(added), 1000):
+                async for document in collection.find({"_id": {"$in": added[start:start + 1000]}}, projection):
+                    yield "upsert", document["_id"], document
+    
     async def create_indexes(self):
         """建立索引"""
         # 題目集合索引
         questions_collection = self.get_collection("questions")
         await questions_collection.create_index("question_id", unique=True)
-        await questions_collection.create_index([("subject", 1), ("grade", 1)])
+        # 以 question_id 結尾，同時支援 (subject, grade) 查詢與 keyset 分頁排序
+        await questions_collection.create_index([("subject", 1), ("grade", 1), ("question_id", 1)])
         await questions_collection.create_index([("difficulty", 1), ("topic", 1)])
+        await questions_collection.create_index("updated_at")
         
         # 學習資源集合索引
         resources_collection = self.get_collection("learning_resources")
         await resources_collection.create_index("resource_id", unique=True)
-        await resources_collection.create_index([("subject", 1), ("topic", 1)])
+        await resources_collection.create_index([("subject", 1), ("topic", 1), ("resource_id", 1)])
+        await resources_collection.create_index("question_ids")
+        await resources_collection.create_index("updated_at")  # 不支援 change stream 時輪詢用
+        
+        # 媒體檔案索引（media_objects 以 sha256 作為 _id）
+        media_files_collection = self.get_collection("media_files")
+        await media_files_collection.create_index("file_id", unique=True)
+        await media_files_collection.create_index("sha256")
 
 
 # 全域 MongoDB 管理器實例
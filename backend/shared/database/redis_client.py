@@ -8,6 +8,8 @@ from typing import Optional, Any
 import json
 from .config import db_settings
 
+QUESTION_BANK_VERSION_KEY = "question_bank:version"
+
 
 class RedisManager:
     """Redis 連接管理器"""
@@ -25,6 +27,7 @@ class RedisManager:
             print("Redis 連接成功")
         except Exception as e:
             print(f"Redis 連接失敗: {e}")
+            self.client = None
             raise
     
     def disconnect(self):
@@ -77,6 +80,20 @@ class RedisManager:
         """刪除用戶會話"""
         key = f"session:{session_id}"
         self.delete_cache(key)
+    
+    def get_question_bank_version(self) -> str:
+        """取得題庫版本（題目異動時遞增，供各服務的快取失效判斷）"""
+        if not self.client:
+            raise RuntimeError("Redis 未連接")
+        
+        return self.client.get(QUESTION_BANK_VERSION_KEY) or "0"
+    
+    def bump_question_bank_version(self) -> int:
+        """遞增題庫版本"""
+        if not self.client:
+            raise RuntimeError("Redis 未連接")
+        
+        return self.client.incr(QUESTION_BANK_VERSION_KEY)
 
 
 # 全域 Redis 管理器實例
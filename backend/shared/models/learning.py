@@ -3,7 +3,7 @@
 包含學習進度、答題記錄、AI 分析結果
 """
 
-from sqlalchemy import Column, String, Integer, DateTime, Boolean, Text, Numeric, ForeignKey
+from sqlalchemy import Column, String, Integer, Float, Date, DateTime, Boolean, Text, Numeric, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -15,12 +15,16 @@ from ..database.postgresql import Base
 class LearningProgress(Base):
     """學習進度表"""
     __tablename__ = "learning_progress"
+    __table_args__ = (
+        UniqueConstraint("user_id", "subject", "topic", name="uq_learning_progress_user_subject_topic"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     subject = Column(String(50), nullable=False)
     topic = Column(String(100), nullable=False)
-    mastery_level = Column(Numeric(3, 2), default=0.0)  # 掌握度 0-1
+    # 掌握度 0-1（答對率的指數加權移動平均）；保留四位小數，兩位時每次 ×0.8 的衰減會被四捨五入吃掉
+    mastery_level = Column(Numeric(5, 4), default=0.0)
     total_questions = Column(Integer, default=0)
     correct_answers = Column(Integer, default=0)
     last_practiced = Column(DateTime, nullable=True)
@@ -48,6 +52,9 @@ class LearningProgress(Base):
 class AnswerSubmission(Base):
     """答題記錄表"""
     __tablename__ = "answer_submissions"
+    __table_args__ = (
+        Index("ix_answer_submissions_user_submitted_at", "user_id", "submitted_at"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
@@ -59,7 +66,9 @@ class AnswerSubmission(Base):
     score = Column(Integer, default=0)  # 0-100
     time_spent = Column(Integer, nullable=True)  # 秒
     feedback = Column(Text, nullable=True)
-    submitted_at = Column(DateTime, default=datetime.utcnow)
+    subject = Column(String(50), nullable=True)  # 取自答案鍵，供區間統計
+    topic = Column(String(100), nullable=True)
+    submitted_at = Column(DateTime, default=datetime.utcnow, index=True)
     
     def __repr__(self):
         return f"<AnswerSubmission(user_id='{self.user_id}', question_id='{self.question_id}')>"
@@ -76,10 +85,75 @@ class AnswerSubmission(Base):
             "score": self.score,
             "time_spent": self.time_spent,
             "feedback": self.feedback,
+            "subject": self.subject,
+            "topic": self.topic,
             "submitted_at": self.submitted_at.isoformat() if self.submitted_at else None,
         }
 
 
+class DailyLearningRollup(Base):
+    """每日學習統計表（每個用戶、主題、日期一列，UTC 日期）"""
+    __tablename__ = "daily_learning_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "subject", "topic", "day", name="uq_daily_learning_rollup"),
+    )
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    subject = Column(String(50), nullable=False)
+    topic = Column(String(100), nullable=False)
+    day = Column(Date, nullable=False)
+    attempts = Column(Integer, default=0)
+    corrects = Column(Integer, default=0)
+    time_spent_seconds = Column(Integer, default=0)
+    
+    def __repr__(self):
+        return f"<DailyLearningRollup(user_id='{self.user_id}', topic='{self.topic}', day='{self.day}')>"
+
+
+class WeeklyLearningRollup(Base):
+    """每週學習統計表（week_start 為該週星期一，UTC 日期）"""
+    __tablename__ = "weekly_learning_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "subject", "topic", "week_start", name="uq_weekly_learning_rollup"),
+    )
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    subject = Column(String(50), nullable=False)
+    topic = Column(String(100), nullable=False)
+    week_start = Column(Date, nullable=False)
+    attempts = Column(Integer, default=0)
+    corrects = Column(Integer, default=0)
+    time_spent_seconds = Column(Integer, default=0)
+    
+    def __repr__(self):
+        return f"<WeeklyLearningRollup(user_id='{self.user_id}', topic='{self.topic}', week_start='{self.week_start}')>"
+
+
+class StudentAbility(Base):
+    """學生能力估計表（由作答記錄批次校準，Rasch 模型的 θ）"""
+    __tablename__ = "student_abilities"
+    
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    ability = Column(Float, nullable=False, default=0.0)
+    responses = Column(Integer, default=0)
+    method = Column(String(20), nullable=False)  # rasch, elo
+    calibrated_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<StudentAbility(user_id='{self.user_id}', ability={self.ability})>"
+    
+    def to_dict(self):
+        return {
+            "user_id": str(self.user_id),
+            "ability": self.ability,
+            "responses": self.responses,
+            "method": self.method,
+            "calibrated_at": self.calibrated_at.isoformat() if self.calibrated_at else None,
+        }
+
+
 class AIAnalysisResult(Base):
     """AI 分析結果表"""
     __tablename__ = "ai_analysis_results"
@@ -0,0 +1 @@
+# 共用工具模組 
\ No newline at end of file
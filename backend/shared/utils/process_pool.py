@@ -0,0 +1,113 @@
+"""
+有界程序池
+將 CPU 密集的工作移出事件迴圈，並限制排隊深度
+"""
+
+import asyncio
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# 監控指標（以程序池名稱區分）
+POOL_QUEUE_WAIT = Histogram(
+    "process_pool_queue_wait_seconds",
+    "工作從送出到開始執行的等待時間",
+    ["pool"],
+)
+POOL_RUN_TIME = Histogram(
+    "process_pool_run_seconds",
+    "工作在子程序中的執行時間",
+    ["pool"],
+)
+POOL_PENDING = Gauge(
+    "process_pool_pending_jobs",
+    "執行中與排隊中的工作數",
+    ["pool"],
+)
+POOL_REJECTED = Counter(
+    "process_pool_rejected_total",
+    "因佇列已滿而拒絕的工作數",
+    ["pool"],
+)
+
+
+class PoolSaturatedError(Exception):
+    """程序池佇列已滿"""
+
+    def __init__(self, pool_name: str, retry_after: int):
+        super().__init__(f"Process pool '{pool_name}' is saturated")
+        self.pool_name = pool_name
+        self.retry_after = retry_after
+
+
+def _timed_call(fn: Callable, args: tuple):
+    """在子程序中執行並記錄開始、結束時間"""
+    started = time.time()
+    result = fn(*args)
+    return started, time.time(), result
+
+
+class BoundedProcessPool:
+    """有界程序池
+
+    同時存在的工作數（執行中 + 排隊中）超過 max_workers + max_queue 時，
+    新工作會立即以 PoolSaturatedError 拒絕，而不是無限排隊。
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._avg_run_time = 0.0
+
+    def start(self):
+        """啟動子程序"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    def shutdown(self):
+        """關閉子程序"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _retry_after(self) -> int:
+        """依平均執行時間估算佇列清空所需秒數"""
+        estimate = self._avg_run_time * self._pending / self.max_workers
+        return max(1, math.ceil(estimate))
+
+    async def submit(self, fn: Callable, *args: Any) -> Any:
+        """送出工作並等待結果，fn 必須可被 pickle（模組層級函數）"""
+        if self._executor is None:
+            raise RuntimeError(f"Process pool '{self.name}' 未啟動")
+
+        if self._pending >= self.max_workers + self.max_queue:
+            POOL_REJECTED.labels(self.name).inc()
+            raise PoolSaturatedError(self.name, self._retry_after())
+
+        self._pending += 1
+        POOL_PENDING.labels(self.name).set(self._pending)
+        try:
+            loop = asyncio.get_running_loop()
+            submitted = time.time()
+            started, finished, result = await loop.run_in_executor(
+                self._executor, _timed_call, fn, args
+            )
+        finally:
+            self._pending -= 1
+            POOL_PENDING.labels(self.name).set(self._pending)
+
+        run_time = finished - started
+        POOL_QUEUE_WAIT.labels(self.name).observe(max(0.0, started - submitted))
+        POOL_RUN_TIME.labels(self.name).observe(run_time)
+        self._avg_run_time = 0.9 * self._avg_run_time + 0.1 * run_time if self._avg_run_time else run_time
+        return result
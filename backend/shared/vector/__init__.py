@@ -0,0 +1 @@
+# 向量索引模組
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+向量索引介面
+題目向量的新增、刪除與相似度查詢（內積，向量需先正規化即為餘弦相似度），
+可依 subject / grade 過濾；本機實作與 Milvus 實作共用此介面
+"""
+
+import os
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class SearchHit:
+    """查詢結果"""
+
+    __slots__ = ("id", "score")
+
+    def __init__(self, id: str, score: float):
+        self.id = id
+        self.score = score
+
+    def __repr__(self):
+        return f"<SearchHit(id='{self.id}', score={self.score:.4f})>"
+
+
+class VectorMetadata:
+    """向量附帶的過濾欄位"""
+
+    __slots__ = ("subject", "grade")
+
+    def __init__(self, subject: Optional[str] = None, grade: Optional[int] = None):
+        self.subject = subject
+        self.grade = grade
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """列向量 L2 正規化（float32）"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class VectorIndex(ABC):
+    """向量索引"""
+
+    @abstractmethod
+    def upsert(self, ids: Sequence[str], vectors: np.ndarray, metadata: Sequence[VectorMetadata]):
+        """新增或覆寫向量（vectors 為 len(ids) × dim）"""
+
+    @abstractmethod
+    def remove(self, ids: Iterable[str]):
+        """刪除向量"""
+
+    @abstractmethod
+    def ids(self) -> List[str]:
+        """列出所有已索引的 ID"""
+
+    @abstractmethod
+    def get(self, id: str) -> Optional[Tuple[np.ndarray, VectorMetadata]]:
+        """取得已索引的向量與過濾欄位，不存在時返回 None"""
+
+    @abstractmethod
+    def search(
+        self,
+        vector: np.ndarray,
+        k: int,
+        subject: Optional[str] = None,
+        grade: Optional[int] = None,
+        exclude: Iterable[str] = (),
+    ) -> List[SearchHit]:
+        """查詢最相似的 k 筆（依分數遞減）"""
+
+    def save(self):
+        """持久化（需要時）"""
+
+    def stats(self) -> dict:
+        return {}
+
+
+def create_vector_index(backend: Optional[str] = None, path: Optional[str] = None) -> VectorIndex:
+    """依 VECTOR_BACKEND 建立索引：local（預設，記憶體映射檔）或 milvus"""
+    backend = backend or os.getenv("VECTOR_BACKEND", "local")
+    if backend == "milvus":
+        from backend.shared.database.config import db_settings
+        from .milvus import MilvusVectorIndex
+
+        return MilvusVectorIndex(db_settings.milvus_host, db_settings.milvus_port, db_settings.milvus_collection_name)
+
+    from .local import LocalIVFIndex
+
+    return LocalIVFIndex(
+        path or os.getenv("VECTOR_INDEX_PATH", "./data/question_vectors"),
+        nprobe=int(os.getenv("VECTOR_NPROBE", "8")),
+    )
@@ -0,0 +1,224 @@
+"""
+文字向量化與快取
+Embedder 介面可替換模型：HashingEmbedder 為不需網路、結果固定的本機特徵雜湊模型，
+OpenAIEmbedder 呼叫 OpenAI embeddings API。
+EmbeddingCache 以 sha256(model_id + 文字) 為鍵，向量附加寫入記憶體映射檔，
+只有新增或修改過的文字需要重新計算
+"""
+
+import hashlib
+import math
+import os
+import re
+import unicodedata
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .base import VectorIndex, VectorMetadata, normalize
+
+DEFAULT_BATCH_SIZE = 256
+
+_TOKEN = re.compile(r"[㐀-鿿豈-﫿]+|[a-z0-9]+")
+_CJK = re.compile(r"[㐀-鿿豈-﫿]")
+
+
+class Embedder(ABC):
+    """文字向量化模型"""
+
+    model_id: str
+    dim: int
+    batch_size: int = DEFAULT_BATCH_SIZE
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """返回 len(texts) × dim 的 float32 陣列"""
+
+
+class HashingEmbedder(Embedder):
+    """特徵雜湊：中日韓文字取字元二元組、其他取單字，以 blake2b 映射到 dim 維並帶正負號"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.model_id = f"hashing-v1-{dim}"
+
+    @staticmethod
+    def tokens(text: str) -> List[str]:
+        tokens = []
+        for run in _TOKEN.findall(unicodedata.normalize("NFKC", text).lower()):
+            if _CJK.match(run):
+                tokens.extend(run if len(run) == 1 else (run[i:i + 2] for i in range(len(run) - 1)))
+            else:
+                tokens.append(run)
+        return tokens
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts: Dict[str, int] = {}
+            for token in self.tokens(text):
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+                sign = 1.0 if digest >> 63 else -1.0
+                vectors[row, digest % self.dim] += sign * (1.0 + math.log(count))
+        return normalize(vectors)
+
+
+class OpenAIEmbedder(Embedder):
+    """OpenAI embeddings API（需 OPENAI_API_KEY）"""
+
+    def __init__(self, model: str = "text-embedding-3-small", dim: int = 1536, batch_size: int = DEFAULT_BATCH_SIZE):
+        from openai import OpenAI
+
+        self._client = OpenAI()
+        self.model = model
+        self.dim = dim
+        self.batch_size = batch_size
+        self.model_id = f"openai:{model}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        response = self._client.embeddings.create(model=self.model, input=texts)
+        return normalize(np.array([item.embedding for item in response.data], dtype=np.float32))
+
+
+def create_embedder(spec: Optional[str] = None) -> Embedder:
+    """依 EMBEDDING_MODEL 建立模型：hashing（預設）或 openai:<模型名稱>"""
+    spec = spec or os.getenv("EMBEDDING_MODEL", "hashing")
+    if spec.startswith("openai:"):
+        return OpenAIEmbedder(spec.split(":", 1)[1], dim=int(os.getenv("EMBEDDING_DIM", "1536")))
+    return HashingEmbedder(dim=int(os.getenv("EMBEDDING_DIM", "256")))
+
+
+def content_key(model_id: str, text: str) -> str:
+    return hashlib.sha256(f"{model_id}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """向量快取（只附加）
+
+    {model}.f32 依序存放 float32 向量，{model}.keys 每行一個鍵，行號即列號；
+    先寫向量再寫鍵，異常中斷時以兩者較短者為準。
+    """
+
+    def __init__(self, directory: str, model_id: str, dim: int):
+        self.dim = dim
+        safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", model_id)
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, f"{safe_name}.f32")
+        self._keys_path = os.path.join(directory, f"{safe_name}.keys")
+        self._rows: Dict[str, int] = {}
+        self._mapped: Optional[np.ndarray] = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self._keys_path, "r", encoding="ascii") as f:
+                keys = [line.rstrip("\n") for line in f]
+        except FileNotFoundError:
+            keys = []
+        vector_rows = os.path.getsize(self._vectors_path) // (4 * self.dim) if os.path.exists(self._vectors_path) else 0
+        complete = min(len(keys), vector_rows)
+        while complete and len(keys[complete - 1]) != 64:
+            complete -= 1
+        # 截去寫到一半的尾端，之後的附加才能維持行號與列號一致
+        if vector_rows != complete:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(complete * 4 * self.dim)
+        if len(keys) != complete:
+            with open(self._keys_path, "w", encoding="ascii") as f:
+                f.writelines(f"{key}\n" for key in keys[:complete])
+        self._rows = {key: row for row, key in enumerate(keys[:complete])}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _vectors(self) -> np.ndarray:
+        if self._mapped is None or len(self._mapped) < len(self._rows):
+            self._mapped = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(len(self._rows), self.dim))
+        return self._mapped
+
+    def lookup(self, keys: Sequence[str]) -> Dict[str, int]:
+        """已快取的鍵與其列號"""
+        return {key: self._rows[key] for key in keys if key in self._rows}
+
+    def vectors(self, rows: Sequence[int]) -> np.ndarray:
+        if not len(rows):
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.asarray(self._vectors()[np.asarray(rows, dtype=np.int64)])
+
+    def append(self, keys: Sequence[str], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.shape != (len(keys), self.dim):
+            raise ValueError(f"Expected {len(keys)} x {self.dim} vectors, got {vectors.shape}")
+        with open(self._vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self._keys_path, "a", encoding="ascii") as f:
+            f.writelines(f"{key}\n" for key in keys)
+        start = len(self._rows)
+        for offset, key in enumerate(keys):
+            self._rows[key] = start + offset
+
+
+def embed_texts(embedder: Embedder, cache: EmbeddingCache, texts: Sequence[str]) -> Tuple[np.ndarray, int]:
+    """批次取得向量，只計算快取中沒有的文字；返回 (向量, 新計算筆數)"""
+    keys = [content_key(embedder.model_id, text) for text in texts]
+    missing: Dict[str, str] = {}
+    cached = cache.lookup(keys)
+    for key, text in zip(keys, texts):
+        if key not in cached:
+            missing.setdefault(key, text)
+
+    pending = list(missing.items())
+    for start in range(0, len(pending), embedder.batch_size):
+        batch = pending[start:start + embedder.batch_size]
+        cache.append([key for key, _ in batch], embedder.embed([text for _, text in batch]))
+
+    rows = cache.lookup(keys)
+    return cache.vectors([rows[key] for key in keys]), len(pending)
+
+
+def question_text(question: dict) -> str:
+    """用於向量化的題目文字（題幹加選項）"""
+    options = question.get("options") or []
+    return "\n".join([question.get("content") or "", *map(str, options)])
+
+
+def index_questions(
+    embedder: Embedder,
+    cache: EmbeddingCache,
+    index: VectorIndex,
+    questions: Iterable[dict],
+    removed: Iterable[str] = (),
+    batch_size: int = 10000,
+) -> Tuple[int, int]:
+    """將題目向量化並寫入索引、移除 removed 中的題目（同步），返回 (題目數, 新計算筆數)"""
+    total = computed = 0
+    batch: List[dict] = []
+
+    def flush():
+        nonlocal total, computed
+        vectors, new = embed_texts(embedder, cache, [question_text(question) for question in batch])
+        index.upsert(
+            [question["question_id"] for question in batch],
+            vectors,
+            [VectorMetadata(question.get("subject"), question.get("grade")) for question in batch],
+        )
+        total += len(batch)
+        computed += new
+
+    for question in questions:
+        batch.append(question)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    removed = list(removed)
+    if removed:
+        index.remove(removed)
+    index.save()
+    return total, computed
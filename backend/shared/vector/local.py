@@ -0,0 +1,410 @@
+"""
+本機向量索引（IVF-flat）
+向量以 float32 存於記憶體映射檔 vectors.npy（依容量倍增），過濾欄位與分群結果存於 index.npz / ids.json。
+資料量少於 brute_force_limit 時以 NumPy 分塊全量計算內積；超過後以球面 k-means 分為約 √n 群，
+查詢只計算最接近的 nprobe 群，過濾後結果不足時逐步擴大探查群數。
+分群在 save()（即索引工作）中進行，不在查詢路徑上；寫入與查詢以鎖互斥，分群計算本身不持有鎖
+"""
+
+import json
+import os
+import threading
+import uuid
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from .base import SearchHit, VectorIndex, VectorMetadata, normalize
+
+BRUTE_FORCE_LIMIT = 20000
+DEFAULT_NPROBE = 8
+SCAN_CHUNK_ROWS = 65536
+TRAIN_POINTS_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+RETRAIN_GROWTH = 4  # 資料量成長為訓練時的倍數後重新分群
+COMPACT_RATIO = 0.25  # 已刪除列超過此比例時於 save() 壓縮
+
+
+def _top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        rows, scores = rows[keep], scores[keep]
+    order = np.argsort(-scores, kind="stable")
+    return rows[order], scores[order]
+
+
+class LocalIVFIndex(VectorIndex):
+    """本機 IVF-flat 向量索引"""
+
+    def __init__(self, path: str, nprobe: int = DEFAULT_NPROBE, brute_force_limit: int = BRUTE_FORCE_LIMIT):
+        self.path = path
+        self.nprobe = nprobe
+        self.brute_force_limit = brute_force_limit
+        self.dim: Optional[int] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._count = 0
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._subject_names: List[str] = []
+        self._subject_codes: Dict[str, int] = {}
+        self._subjects = np.empty(0, dtype=np.int16)
+        self._grades = np.empty(0, dtype=np.int16)
+        self._alive = np.empty(0, dtype=bool)
+        self._assign = np.empty(0, dtype=np.int32)
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._trained_count = 0
+        self._layout = 0  # 列號重新編排（compact）時遞增
+        self._retrain_rows: Optional[List[np.ndarray]] = None  # 分群期間異動的列，完成後重新指派
+        self._lock = threading.RLock()
+        self._load()
+
+    # 檔案
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.npy")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "ids.json")
+
+    @property
+    def _arrays_path(self) -> str:
+        return os.path.join(self.path, "index.npz")
+
+    def _load(self):
+        try:
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self._vectors = np.load(self._vectors_path, mmap_mode="r+")
+            arrays = np.load(self._arrays_path)
+        except FileNotFoundError:
+            return
+        self.dim = meta["dim"]
+        self._count = meta["count"]
+        self._ids = meta["ids"]
+        self._subject_names = meta["subjects"]
+        self._subject_codes = {name: code for code, name in enumerate(self._subject_names)}
+        self._rows = {id: row for row, id in enumerate(self._ids) if id is not None}
+        capacity = len(self._vectors)
+        self._subjects = self._fit(arrays["subjects"], capacity, -1)
+        self._grades = self._fit(arrays["grades"], capacity, -1)
+        self._alive = self._fit(arrays["alive"], capacity, False)
+        self._assign = self._fit(arrays["assign"], capacity, -1)
+        if "centroids" in arrays.files:
+            self._centroids = arrays["centroids"]
+            self._trained_count = int(meta.get("trained_count", 0))
+
+    @staticmethod
+    def _fit(values: np.ndarray, size: int, fill) -> np.ndarray:
+        result = np.full(size, fill, dtype=values.dtype)
+        result[:min(size, len(values))] = values[:size]
+        return result
+
+    def save(self):
+        """需要時重新分群，再寫入過濾欄位與分群結果（向量已直接寫在記憶體映射檔中）"""
+        if self._vectors is None:
+            return
+        if self.needs_training():
+            self.train()
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        if self._count and self._count - len(self._rows) > COMPACT_RATIO * self._count:
+            self._compact()
+        self._vectors.flush()
+        arrays = {
+            "subjects": self._subjects[:self._count],
+            "grades": self._grades[:self._count],
+            "alive": self._alive[:self._count],
+            "assign": self._assign[:self._count],
+        }
+        if self._centroids is not None:
+            arrays["centroids"] = self._centroids
+        token = uuid.uuid4().hex
+        arrays_temp = f"{self._arrays_path}.{token}.tmp.npz"
+        np.savez(arrays_temp, **arrays)
+        os.replace(arrays_temp, self._arrays_path)
+        meta_temp = f"{self._meta_path}.{token}.tmp"
+        with open(meta_temp, "w", encoding="utf-8") as f:
+            json.dump({
+                "dim": self.dim,
+                "count": self._count,
+                "ids": self._ids[:self._count],
+                "subjects": self._subject_names,
+                "trained_count": self._trained_count,
+            }, f, ensure_ascii=False)
+        os.replace(meta_temp, self._meta_path)
+
+    def _reserve(self, rows: int):
+        """確保容量足夠；不足時以兩倍容量重建映射檔"""
+        capacity = 0 if self._vectors is None else len(self._vectors)
+        if self._count + rows <= capacity:
+            return
+        new_capacity = max(1024, capacity * 2, self._count + rows)
+        os.makedirs(self.path, exist_ok=True)
+        temp_path = f"{self._vectors_path}.{uuid.uuid4().hex}.tmp"
+        vectors = open_memmap(temp_path, mode="w+", dtype=np.float32, shape=(new_capacity, self.dim))
+        if self._count:
+            vectors[:self._count] = self._vectors[:self._count]
+        vectors.flush()
+        os.replace(temp_path, self._vectors_path)
+        self._vectors = vectors
+        self._subjects = self._fit(self._subjects, new_capacity, -1)
+        self._grades = self._fit(self._grades, new_capacity, -1)
+        self._alive = self._fit(self._alive, new_capacity, False)
+        self._assign = self._fit(self._assign, new_capacity, -1)
+
+    def compact(self):
+        """移除已刪除的列並重建映射檔"""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        live = np.flatnonzero(self._alive[:self._count])
+        os.makedirs(self.path, exist_ok=True)
+        temp_path = f"{self._vectors_path}.{uuid.uuid4().hex}.tmp"
+        capacity = max(1024, len(live) * 2)
+        vectors = open_memmap(temp_path, mode="w+", dtype=np.float32, shape=(capacity, self.dim))
+        for start in range(0, len(live), SCAN_CHUNK_ROWS):
+            rows = live[start:start + SCAN_CHUNK_ROWS]
+            vectors[start:start + len(rows)] = self._vectors[rows]
+        vectors.flush()
+        os.replace(temp_path, self._vectors_path)
+        self._vectors = vectors
+        self._subjects = self._fit(self._subjects[live], capacity, -1)
+        self._grades = self._fit(self._grades[live], capacity, -1)
+        self._alive = self._fit(self._alive[live], capacity, False)
+        self._assign = self._fit(self._assign[live], capacity, -1)
+        self._ids = [self._ids[row] for row in live]
+        self._rows = {id: row for row, id in enumerate(self._ids)}
+        self._count = len(live)
+        self._lists = None
+        self._layout += 1
+
+    # 寫入
+    def upsert(self, ids: Sequence[str], vectors: np.ndarray, metadata: Sequence[VectorMetadata]):
+        if not len(ids):
+            return
+        vectors = normalize(vectors)
+        with self._lock:
+            self._upsert(ids, vectors, metadata)
+
+    def _upsert(self, ids: Sequence[str], vectors: np.ndarray, metadata: Sequence[VectorMetadata]):
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+        new_ids = [id for id in dict.fromkeys(ids) if id not in self._rows]
+        self._reserve(len(new_ids))
+        for id in new_ids:
+            self._rows[id] = self._count
+            if self._count < len(self._ids):
+                self._ids[self._count] = id
+            else:
+                self._ids.append(id)
+            self._count += 1
+
+        rows = np.fromiter((self._rows[id] for id in ids), dtype=np.int64, count=len(ids))
+        self._vectors[rows] = vectors
+        self._subjects[rows] = [self._subject_code(item.subject) for item in metadata]
+        self._grades[rows] = [item.grade if item.grade is not None else -1 for item in metadata]
+        self._alive[rows] = True
+        if self._retrain_rows is not None:
+            self._retrain_rows.append(rows)
+        if self._centroids is not None:
+            self._assign[rows] = self._nearest(vectors, self._centroids)
+            self._lists = None
+
+    def _subject_code(self, subject: Optional[str]) -> int:
+        if subject is None:
+            return -1
+        code = self._subject_codes.get(subject)
+        if code is None:
+            code = self._subject_codes[subject] = len(self._subject_names)
+            self._subject_names.append(subject)
+        return code
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for id in ids:
+                row = self._rows.pop(id, None)
+                if row is not None:
+                    self._alive[row] = False
+                    self._ids[row] = None
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._rows)
+
+    def get(self, id: str) -> Optional[Tuple[np.ndarray, VectorMetadata]]:
+        with self._lock:
+            row = self._rows.get(id)
+            if row is None:
+                return None
+            subject = int(self._subjects[row])
+            grade = int(self._grades[row])
+            return np.array(self._vectors[row]), VectorMetadata(
+                self._subject_names[subject] if subject >= 0 else None,
+                grade if grade >= 0 else None,
+            )
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # 分群
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        result = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), SCAN_CHUNK_ROWS):
+            chunk = np.asarray(vectors[start:start + SCAN_CHUNK_ROWS])
+            result[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return result
+
+    def needs_training(self) -> bool:
+        """資料量達到分群門檻且尚未分群，或已成長為上次分群時的 RETRAIN_GROWTH 倍"""
+        live = len(self._rows)
+        return live >= self.brute_force_limit and (
+            self._centroids is None or live > RETRAIN_GROWTH * self._trained_count
+        )
+
+    def train(self, nlist: Optional[int] = None, seed: int = 0):
+        """以球面 k-means 分群並重新指派所有向量
+
+        取樣與指派在鎖外以當下的列數計算，期間的寫入照常進行並記錄異動的列，完成時於鎖內補指派。
+        """
+        with self._lock:
+            live = np.flatnonzero(self._alive[:self._count])
+            if len(live) < self.brute_force_limit:
+                self._centroids = None
+                self._lists = None
+                return
+            vectors, count, layout = self._vectors, self._count, self._layout
+            self._retrain_rows = []
+
+        try:
+            nlist = nlist or int(min(4096, max(16, np.sqrt(len(live)))))
+            rng = np.random.default_rng(seed)
+            sample_rows = np.sort(rng.choice(live, min(len(live), nlist * TRAIN_POINTS_PER_LIST), replace=False))
+            sample = np.asarray(vectors[sample_rows])
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+            for _ in range(KMEANS_ITERATIONS):
+                assign = np.argmax(sample @ centroids.T, axis=1)
+                order = np.argsort(assign, kind="stable")
+                clusters, starts = np.unique(assign[order], return_index=True)
+                centroids[clusters] = normalize(np.add.reduceat(sample[order], starts, axis=0))
+
+            assign = self._nearest(vectors[:count], centroids)
+        except BaseException:
+            with self._lock:
+                self._retrain_rows = None
+            raise
+
+        with self._lock:
+            if layout != self._layout:
+                # 分群期間壓縮過，列號已變動
+                self._assign[:self._count] = self._nearest(self._vectors[:self._count], centroids)
+            else:
+                self._assign[:count] = assign
+                changed = [np.arange(count, self._count, dtype=np.int64), *self._retrain_rows]
+                rows = np.unique(np.concatenate(changed))
+                if len(rows):
+                    self._assign[rows] = self._nearest(self._vectors[rows], centroids)
+            self._retrain_rows = None
+            self._centroids = centroids
+            self._lists = None
+            self._trained_count = len(live)
+
+    def _inverted_lists(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._lists is None:
+            assign = self._assign[:self._count]
+            order = np.argsort(assign, kind="stable")
+            offsets = np.searchsorted(assign[order], np.arange(len(self._centroids) + 1))
+            self._lists = (order, offsets)
+        return self._lists
+
+    # 查詢
+    def _filter(self, rows: np.ndarray, subject_code: Optional[int], grade: Optional[int], excluded: np.ndarray):
+        mask = self._alive[rows]
+        if subject_code is not None:
+            mask &= self._subjects[rows] == subject_code
+        if grade is not None:
+            mask &= self._grades[rows] == grade
+        if len(excluded):
+            mask &= ~np.isin(rows, excluded)
+        return rows[mask]
+
+    def search(
+        self,
+        vector: np.ndarray,
+        k: int,
+        subject: Optional[str] = None,
+        grade: Optional[int] = None,
+        exclude: Iterable[str] = (),
+    ) -> List[SearchHit]:
+        query = normalize(vector).reshape(-1)
+        with self._lock:
+            return self._search(query, k, subject, grade, exclude)
+
+    def _search(
+        self,
+        query: np.ndarray,
+        k: int,
+        subject: Optional[str],
+        grade: Optional[int],
+        exclude: Iterable[str],
+    ) -> List[SearchHit]:
+        if self._vectors is None or k <= 0:
+            return []
+        subject_code = None
+        if subject is not None:
+            subject_code = self._subject_codes.get(subject)
+            if subject_code is None:
+                return []
+        excluded = np.array([self._rows[id] for id in exclude if id in self._rows], dtype=np.int64)
+
+        # 尚未分群（索引工作還沒執行 save）時以全量計算，結果仍然正確
+        if self._centroids is None:
+            rows_found, scores_found = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            for start in range(0, self._count, SCAN_CHUNK_ROWS):
+                rows = self._filter(
+                    np.arange(start, min(start + SCAN_CHUNK_ROWS, self._count)), subject_code, grade, excluded
+                )
+                if len(rows):
+                    rows_found, scores_found = _top_k(
+                        np.concatenate([rows_found, rows]),
+                        np.concatenate([scores_found, self._vectors[rows] @ query]),
+                        k,
+                    )
+        else:
+            order, offsets = self._inverted_lists()
+            ranked_lists = np.argsort(-(self._centroids @ query))
+            probe = self.nprobe
+            while True:
+                lists = ranked_lists[:probe]
+                rows = self._filter(
+                    np.concatenate([order[offsets[cluster]:offsets[cluster + 1]] for cluster in lists]),
+                    subject_code, grade, excluded,
+                )
+                if len(rows) >= k or probe >= len(ranked_lists):
+                    break
+                probe *= 4
+            rows_found, scores_found = _top_k(rows, self._vectors[rows] @ query, k)
+
+        return [
+            SearchHit(self._ids[row], float(score))
+            for row, score in zip(rows_found.tolist(), scores_found.tolist())
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "local",
+                "vectors": len(self._rows),
+                "dim": self.dim,
+                "lists": 0 if self._centroids is None else len(self._centroids),
+            }
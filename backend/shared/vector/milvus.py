@@ -0,0 +1,148 @@
+"""
+Milvus 向量索引
+與本機索引相同的介面；pymilvus 於第一次使用時才匯入並連線，集合於第一次寫入時依向量維度建立
+（question_id 主鍵、subject、grade、embedding，IVF_FLAT / 內積）
+"""
+
+import json
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .base import SearchHit, VectorIndex, VectorMetadata, normalize
+
+DEFAULT_NLIST = 1024
+DEFAULT_NPROBE = 16
+ID_BATCH_SIZE = 1000
+
+
+def _quote(value: str) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+class MilvusVectorIndex(VectorIndex):
+    """Milvus 向量索引"""
+
+    def __init__(self, host: str, port: int, collection_name: str, nprobe: int = DEFAULT_NPROBE):
+        self.host = host
+        self.port = port
+        self.collection_name = collection_name
+        self.nprobe = nprobe
+        self._collection = None
+
+    def _connect(self, dim: Optional[int] = None):
+        """取得集合；不存在時若給定 dim 則建立，否則返回 None"""
+        if self._collection is not None:
+            return self._collection
+        from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, connections, utility
+
+        connections.connect(alias="default", host=self.host, port=str(self.port))
+        if not utility.has_collection(self.collection_name):
+            if dim is None:
+                return None
+            schema = CollectionSchema([
+                FieldSchema("question_id", DataType.VARCHAR, is_primary=True, max_length=100),
+                FieldSchema("subject", DataType.VARCHAR, max_length=50),
+                FieldSchema("grade", DataType.INT64),
+                FieldSchema("embedding", DataType.FLOAT_VECTOR, dim=dim),
+            ], description="question embeddings")
+            collection = Collection(self.collection_name, schema)
+            collection.create_index("embedding", {
+                "index_type": "IVF_FLAT", "metric_type": "IP", "params": {"nlist": DEFAULT_NLIST}
+            })
+        else:
+            collection = Collection(self.collection_name)
+        collection.load()
+        self._collection = collection
+        return collection
+
+    def upsert(self, ids: Sequence[str], vectors: np.ndarray, metadata: Sequence[VectorMetadata]):
+        if not len(ids):
+            return
+        vectors = normalize(vectors)
+        collection = self._connect(vectors.shape[1])
+        collection.upsert([
+            list(ids),
+            [item.subject or "" for item in metadata],
+            [item.grade if item.grade is not None else -1 for item in metadata],
+            vectors.tolist(),
+        ])
+
+    def remove(self, ids: Iterable[str]):
+        ids = list(ids)
+        collection = self._connect()
+        if collection is None or not ids:
+            return
+        collection.delete(f"question_id in [{', '.join(map(_quote, ids))}]")
+
+    def ids(self) -> List[str]:
+        collection = self._connect()
+        if collection is None:
+            return []
+        # query 單次筆數有上限，以迭代器分批取出
+        iterator = collection.query_iterator(
+            batch_size=ID_BATCH_SIZE, expr='question_id != ""', output_fields=["question_id"]
+        )
+        ids = []
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    return ids
+                ids.extend(row["question_id"] for row in rows)
+        finally:
+            iterator.close()
+
+    def get(self, id: str) -> Optional[Tuple[np.ndarray, VectorMetadata]]:
+        collection = self._connect()
+        if collection is None:
+            return None
+        rows = collection.query(
+            f"question_id == {_quote(id)}", output_fields=["subject", "grade", "embedding"]
+        )
+        if not rows:
+            return None
+        row = rows[0]
+        return np.asarray(row["embedding"], dtype=np.float32), VectorMetadata(
+            row["subject"] or None,
+            row["grade"] if row["grade"] >= 0 else None,
+        )
+
+    def search(
+        self,
+        vector: np.ndarray,
+        k: int,
+        subject: Optional[str] = None,
+        grade: Optional[int] = None,
+        exclude: Iterable[str] = (),
+    ) -> List[SearchHit]:
+        collection = self._connect()
+        if collection is None or k <= 0:
+            return []
+        conditions = []
+        if subject is not None:
+            conditions.append(f"subject == {_quote(subject)}")
+        if grade is not None:
+            conditions.append(f"grade == {int(grade)}")
+        exclude = list(exclude)
+        if exclude:
+            conditions.append(f"question_id not in [{', '.join(map(_quote, exclude))}]")
+        results = collection.search(
+            [normalize(vector).reshape(-1).tolist()],
+            "embedding",
+            {"metric_type": "IP", "params": {"nprobe": self.nprobe}},
+            limit=k,
+            expr=" && ".join(conditions) or None,
+        )
+        return [SearchHit(hit.id, float(hit.distance)) for hit in results[0]]
+
+    def save(self):
+        if self._collection is not None:
+            self._collection.flush()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "milvus",
+            "collection": self.collection_name,
+            "vectors": self._collection.num_entities if self._collection is not None else None,
+        }
@@ -123,9 +123,15 @@ const authAPI = {
         return apiClient.get('auth', '/auth/profile');
     },
 
-    // 登出
-    logout() {
-        apiClient.clearToken();
+    // 登出（撤銷伺服器端 Token）
+    async logout() {
+        try {
+            if (apiClient.token) {
+                await apiClient.post('auth', '/auth/logout', {});
+            }
+        } finally {
+            apiClient.clearToken();
+        }
     }
 };
 
@@ -141,6 +147,14 @@ const learningAPI = {
         return apiClient.post('learning', '/learning/submit-answer', answerData);
     },
 
+    // 批次提交整個練習的答案
+    async submitAnswers(sessionId, answers) {
+        return apiClient.post('learning', '/learning/submit-answers', {
+            session_id: sessionId,
+            answers: answers
+        });
+    },
+
     // 獲取學習進度
     async getProgress(params = {}) {
         const queryString = new URLSearchParams(params).toString();
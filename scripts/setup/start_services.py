@@ -79,10 +79,16 @@ def start_service(service_name, config):
         "--reload"
     ]
     
+    # 讓服務可以匯入 backend.shared 共用模組
+    env = os.environ.copy()
+    project_root = str(Path.cwd())
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [project_root, env.get('PYTHONPATH')]))
+    
     try:
         process = subprocess.Popen(
             cmd,
             cwd=service_path,
+            env=env,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE
         )